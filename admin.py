@@ -0,0 +1,150 @@
+# Админка Flask-Admin. Импортируется только из create_app, когда включён компонент admin,
+# поэтому воркеры только с API не загружают flask_admin и не строят представления.
+
+from datetime import date, timedelta
+
+from flask import flash
+from flask_admin import Admin
+from flask_admin.actions import action
+from flask_admin.contrib.sqla import ModelView
+from sqlalchemy import text
+from sqlalchemy.orm import defer, joinedload, load_only, selectinload
+from wtforms import SelectMultipleField
+
+import schedule
+
+
+class EstimatedCountModelView(ModelView):
+    """Список, где общее число строк без поиска и фильтров берётся из статистики Postgres, а не из count(*).
+
+    count(*) по большой таблице - полный проход на каждую страницу списка; для пейджера хватает оценки
+    pg_class.reltuples, которую обновляют ANALYZE и autovacuum. На таблицах меньше estimated_count_threshold
+    строк, с поиском или фильтрами число по-прежнему точное.
+    """
+
+    estimated_count_threshold = 100000
+
+    def estimated_count(self):
+        if self.session.get_bind().dialect.name != 'postgresql':
+            return None
+        estimate = self.session.execute(
+            text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)'),
+            {'table': self.model.__table__.name}
+        ).scalar()
+        # -1 - таблицу ещё не анализировали
+        return estimate if estimate is not None and estimate >= self.estimated_count_threshold else None
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        count = None if search or filters else self.estimated_count()
+        if count is None:
+            return super().get_list(page, sort_column, sort_desc, search, filters, execute, page_size)
+
+        # То же, что ModelView.get_list без поиска и фильтров, но без запроса count(*)
+        query = self.get_query()
+        for join in self._auto_joins:
+            query = query.options(joinedload(join))
+        query, _ = self._apply_sorting(query, {}, sort_column, sort_desc)
+        query = self._apply_pagination(query, page, page_size)
+        return count, query.all() if execute else query
+
+
+class UserModelView(EstimatedCountModelView):
+    # info - произвольный JSON, в списке его не показываем и не загружаем
+    column_exclude_list = ('info',)
+
+    def get_query(self):
+        return super().get_query().options(defer(self.model.info))
+
+
+class OfficeModelView(ModelView):
+    # row_version заполняет база (версии данных для ETag)
+    column_exclude_list = ('row_version',)
+    form_excluded_columns = ('row_version',)
+
+
+class EventModelView(EstimatedCountModelView):
+    column_exclude_list = ('row_version',)
+    # Тренер выбирается из списка; имя в events.coach заполняется само
+    form_columns = ['date', 'time', 'coach_profile', 'office_id', 'max_participants']
+    column_labels = {'coach_profile': 'Coach'}
+
+
+class ScheduleTemplateModelView(ModelView):
+    """Шаблоны расписания; события по ним создаёт schedule.py из cron или действие «Создать события»."""
+    column_list = ('office', 'coach_profile', 'weekdays', 'time', 'max_participants', 'starts_on', 'ends_on')
+    form_columns = ['office', 'coach_profile', 'weekdays', 'time', 'max_participants', 'starts_on', 'ends_on']
+    column_labels = {'coach_profile': 'Coach'}
+    column_formatters = {'weekdays': lambda view, context, model, name: schedule.format_weekdays(model.weekdays)}
+    form_overrides = {'weekdays': SelectMultipleField}
+    form_args = {'weekdays': {'choices': schedule.WEEKDAYS, 'coerce': int}}
+
+    def __init__(self, model, session, materialize, **kwargs):
+        self.materialize = materialize
+        super().__init__(model, session, **kwargs)
+
+    @action('materialize', 'Создать события', 'Создать события по выбранным шаблонам на горизонт вперёд?')
+    def action_materialize(self, ids):
+        today = date.today()
+        created = self.materialize(today, today + timedelta(days=schedule.SCHEDULE_HORIZON_DAYS),
+                                   [int(template_id) for template_id in ids], self.session)
+        self.session.commit()
+        flash(f'Создано событий: {created}', 'success')
+
+
+class EventRegistrationModelView(EstimatedCountModelView):
+    column_list = ('id', 'user', 'event.office', 'event.coach', 'event.date', 'event.time')
+    column_sortable_list = (
+    'id', ('user', 'user.name'), ('event.office', 'event.office.name'), ('event.coach', 'event.coach'),
+    ('event.date', 'event.date'), ('event.time', 'event.time'))
+
+    column_labels = {
+        'user': 'User Name',
+        'event.office': 'Office Name',
+        'event.coach': 'Coach',
+        'event.date': 'Date',
+        'event.time': 'Time'
+    }
+
+    def _user_formatter(view, context, model, name):
+        if model.user:
+            return model.user.name
+        return ''
+
+    def _office_formatter(view, context, model, name):
+        if model.event and model.event.office:
+            return model.event.office.name
+        return ''
+
+    column_formatters = {
+        'user': _user_formatter,
+        'event.office': _office_formatter,
+    }
+
+    # Пользователи, события и офисы страницы догружаются тремя запросами WHERE id IN (...), а не отдельным SELECT
+    # на каждую строку. Не JOIN в запросе записей: с JOIN Postgres при сортировке сортирует широкие строки всей таблицы
+    def scaffold_auto_joins(self):
+        return []
+
+    def get_query(self):
+        registration = self.model
+        user = registration.user.property.mapper.class_
+        event = registration.event.property.mapper.class_
+        return super().get_query().options(
+            selectinload(registration.user).load_only(user.id, user.name),
+            selectinload(registration.event).selectinload(event.office),
+        )
+
+
+def init_admin(app, db, models):
+    """Админка для приложения; models - модуль с моделями (User, EventRegistration, Office, Event, ScheduleTemplate)."""
+    # Создание экземпляра административного интерфейса (свой на каждое приложение)
+    admin = Admin(app, name='MyApp Admin', template_mode='bootstrap3')
+
+    # Добавление моделей в административный интерфейс
+    admin.add_view(UserModelView(models.User, db.session))
+    admin.add_view(EventRegistrationModelView(models.EventRegistration, db.session, name='Заявки на йогу'))
+    admin.add_view(OfficeModelView(models.Office, db.session))
+    admin.add_view(EventModelView(models.Event, db.session))
+    admin.add_view(ScheduleTemplateModelView(models.ScheduleTemplate, db.session, models.materialize_schedule,
+                                             name='Шаблоны расписания'))
+    return admin
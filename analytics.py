@@ -0,0 +1,166 @@
+# Сводка посещаемости attendance_daily: строка на (офис, тренер, день) - число занятий, мест, записей и отмен.
+# Запись и отмена записи меняют её в той же транзакции (app._update_attendance_rollup), правки расписания
+# пересчитывают затронутые строки, а сверка по расписанию из cron исправляет всё, что разошлось:
+#
+#   python analytics.py reconcile --date-from 2026-10-01 --date-to 2026-12-31
+#
+# Отчёты /analytics/attendance читают только сводку и не трогают event_registration.
+import argparse
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+# Прибавляет изменения мест по событиям (event_id -> +n/-n) к строкам их (офис, тренер, день).
+# Отрицательное изменение - отмена записи. Строки обновляются в порядке ключа, чтобы параллельные
+# транзакции не взаимоблокировались.
+_APPLY_DELTAS_SQL = '''
+INSERT INTO attendance_daily AS a (office_id, coach, date, registrations, cancellations, updated_at)
+SELECT e.office_id, e.coach, e.date, sum(d.delta), sum(greatest(-d.delta, 0)), now()
+FROM unnest(CAST(:event_ids AS integer[]), CAST(:deltas AS integer[])) AS d (event_id, delta)
+JOIN events e ON e.id = d.event_id
+GROUP BY e.office_id, e.coach, e.date
+ORDER BY e.office_id, e.coach, e.date
+ON CONFLICT (office_id, coach, date) DO UPDATE SET
+    registrations = a.registrations + EXCLUDED.registrations,
+    cancellations = a.cancellations + EXCLUDED.cancellations,
+    updated_at = EXCLUDED.updated_at
+'''
+
+# Пересчитывает занятия, места и записи строк из keys по events и event_registration. Отмены из базы
+# не восстановить (запись удаляется), поэтому их счётчик не трогаем. Строка, у которой не осталось занятий,
+# остаётся с нулями, а новую пустую не создаём.
+_REFRESH_SQL = '''
+WITH keys AS ({keys}),
+fresh AS (
+    SELECT k.office_id, k.coach, k.date, count(e.id) AS events,
+           coalesce(sum(e.max_participants), 0) AS capacity, coalesce(sum(r.registrations), 0) AS registrations
+    FROM keys k
+    LEFT JOIN events e ON e.office_id = k.office_id AND e.coach = k.coach
+                      AND e.starts_at >= k.date AND e.starts_at < k.date + 1
+    LEFT JOIN LATERAL (SELECT count(*) AS registrations FROM event_registration WHERE event_id = e.id) r ON true
+    GROUP BY k.office_id, k.coach, k.date
+)
+INSERT INTO attendance_daily AS a (office_id, coach, date, events, capacity, registrations, updated_at)
+SELECT office_id, coach, date, events, capacity, registrations, now() FROM fresh f
+WHERE f.events > 0 OR EXISTS (SELECT 1 FROM attendance_daily x
+                              WHERE (x.office_id, x.coach, x.date) = (f.office_id, f.coach, f.date))
+ORDER BY office_id, coach, date
+ON CONFLICT (office_id, coach, date) DO UPDATE SET
+    events = EXCLUDED.events,
+    capacity = EXCLUDED.capacity,
+    registrations = EXCLUDED.registrations,
+    updated_at = EXCLUDED.updated_at
+WHERE (a.events, a.capacity, a.registrations) IS DISTINCT FROM (EXCLUDED.events, EXCLUDED.capacity, EXCLUDED.registrations)
+'''
+
+_KEYS_FROM_LIST = '''
+    SELECT DISTINCT * FROM unnest(CAST(:office_ids AS integer[]), CAST(:coaches AS text[]),
+                                  CAST(:dates AS date[])) AS k (office_id, coach, date)
+'''
+
+# Все строки дня: по событиям и те, что уже есть в сводке (у них могли пропасть занятия)
+_KEYS_FOR_DAY = '''
+    SELECT office_id, coach, date FROM events WHERE starts_at >= :day AND starts_at < CAST(:day AS date) + 1
+    UNION
+    SELECT office_id, coach, date FROM attendance_daily WHERE date = :day
+'''
+
+
+def apply_seat_deltas(connection, deltas):
+    """Изменения мест по событиям {event_id: delta} - в сводку; вызывается до коммита транзакции записи."""
+    deltas = {event_id: delta for event_id, delta in deltas.items() if delta}
+    if deltas:
+        connection.execute(text(_APPLY_DELTAS_SQL),
+                           {'event_ids': list(deltas), 'deltas': list(deltas.values())})
+
+
+def refresh_keys(connection, keys):
+    """Пересчёт строк (office_id, coach, date) после правок расписания. Возвращает число изменённых строк."""
+    keys = sorted(keys)
+    if not keys:
+        return 0
+    office_ids, coaches, dates = (list(column) for column in zip(*keys))
+    return connection.execute(text(_REFRESH_SQL.format(keys=_KEYS_FROM_LIST)),
+                              {'office_ids': office_ids, 'coaches': coaches, 'dates': dates}).rowcount
+
+
+def reconcile(session, date_from, date_to):
+    """Сверяет сводку с events и event_registration за дни с date_from по date_to; коммит на каждый день.
+
+    Перед пересчётом дня его события блокируются FOR SHARE: запись на них подождёт коммита сверки, а записи,
+    закоммиченные раньше, пересчёт уже увидит - поэтому изменение не потеряется и не учтётся дважды.
+    Возвращает число исправленных строк.
+    """
+    fixed = 0
+    day = date_from
+    while day <= date_to:
+        session.execute(text('SELECT id FROM events WHERE starts_at >= :day AND starts_at < CAST(:day AS date) + 1 '
+                             'ORDER BY id FOR SHARE'), {'day': day})
+        fixed += session.execute(text(_REFRESH_SQL.format(keys=_KEYS_FOR_DAY)), {'day': day}).rowcount
+        session.commit()
+        day += timedelta(days=1)
+    return fixed
+
+
+# Группировки отчёта: имя параметра group_by -> (выражение по строке сводки, поле ответа)
+GROUPINGS = {
+    'office': ('a.office_id', 'office_id'),
+    'coach': ('a.coach', 'coach'),
+    'weekday': ('CAST(extract(isodow FROM a.date) AS integer)', 'weekday'),
+    'date': ('a.date', 'date'),
+    'week': ('CAST(date_trunc(\'week\', a.date) AS date)', 'week'),
+}
+
+
+def attendance(session, date_from, date_to, group_by, office_id=None):
+    """Заполняемость и отмены за период по группам group_by (имена из GROUPINGS), только из сводки."""
+    expressions = [GROUPINGS[name][0] for name in group_by]
+    fields = [GROUPINGS[name][1] for name in group_by]
+    positions = ', '.join(str(i) for i in range(1, len(expressions) + 1))
+    rows = session.execute(text(f'''
+        SELECT {', '.join(expressions)}, sum(a.events), sum(a.capacity), sum(a.registrations), sum(a.cancellations)
+        FROM attendance_daily a
+        WHERE a.date >= :date_from AND a.date <= :date_to
+          AND (CAST(:office_id AS integer) IS NULL OR a.office_id = :office_id)
+        GROUP BY {positions}
+        ORDER BY {positions}
+    '''), {'date_from': date_from, 'date_to': date_to, 'office_id': office_id})
+
+    result = []
+    for row in rows:
+        events, capacity, registrations, cancellations = (int(value) for value in row[len(fields):])
+        item = dict(zip(fields, row))
+        item.update({
+            'events': events,
+            'capacity': capacity,
+            'registrations': registrations,
+            'cancellations': cancellations,
+            'fill_rate': round(registrations / capacity, 4) if capacity else None,
+            # Доля отменённых среди всех когда-либо сделанных записей
+            'cancellation_rate': (round(cancellations / (registrations + cancellations), 4)
+                                  if registrations + cancellations else None),
+        })
+        result.append(item)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сводка посещаемости attendance_daily')
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('reconcile', help='сверить сводку с записями за период')
+    today = date.today()
+    command.add_argument('--date-from', type=date.fromisoformat, default=today - timedelta(days=30))
+    command.add_argument('--date-to', type=date.fromisoformat, default=today + timedelta(days=90))
+    args = parser.parse_args()
+
+    from app import create_app, db
+
+    app = create_app(components=[])
+    with app.app_context():
+        fixed = reconcile(db.session, args.date_from, args.date_to)
+    print(f'{args.date_from} - {args.date_to}: исправлено строк: {fixed}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
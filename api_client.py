@@ -0,0 +1,275 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Методы, которые безопасно повторить: повтор не создаст вторую запись
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+# Ответы, после которых имеет смысл повторить запрос
+RETRY_STATUSES = frozenset({502, 503, 504})
+# Сколько последних GET-ответов с ETag помним для условных запросов
+VALIDATOR_CACHE_SIZE = 1000
+
+# Сжатые ответы API (COMPRESS_RESPONSES на сервере); br requests и aiohttp распаковывают, только если есть brotli
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'br, gzip'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip'
+
+
+class EndpointStats:
+    def __init__(self, window=1000):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)  # последние длительности для перцентилей
+
+    def observe(self, elapsed, error=False):
+        self.count += 1
+        self.errors += int(error)
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.recent.append(elapsed)
+
+    def to_dict(self):
+        recent = sorted(self.recent)
+
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(len(recent) * p))] * 1000 if recent else 0.0
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': percentile(0.50),
+            'p99_ms': percentile(0.99),
+            'max_ms': self.max * 1000,
+        }
+
+
+class _ApiStatsMixin:
+    def _init_stats(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._validators = OrderedDict()  # (путь, параметры) -> (ETag, ответ)
+        self.not_modified = 0
+
+    def stats(self):
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+    def _endpoint_stats(self, key):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = EndpointStats()
+            return stats
+
+    def _observe(self, stats, elapsed, error=False):
+        with self._lock:
+            stats.observe(elapsed, error)
+
+    def _count_retry(self, stats):
+        with self._lock:
+            stats.retries += 1
+
+    def _backoff_delay(self, attempt):
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    # Условные GET: если у нас есть ответ с ETag, отправляем If-None-Match,
+    # и на 304 возвращаем сохранённый ответ - сервер не строит и не передаёт тело заново
+
+    @staticmethod
+    def _validator_key(method, path, kwargs):
+        if method != 'GET' or 'headers' in kwargs:
+            return None
+        params = kwargs.get('params') or {}
+        return path, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+    def _cached_validator(self, key, kwargs):
+        with self._lock:
+            entry = self._validators.get(key)
+            if entry is not None:
+                self._validators.move_to_end(key)
+        if entry is not None:
+            kwargs['headers'] = {'If-None-Match': entry[0]}
+        return entry
+
+    def _revalidated(self, key, entry, response, etag):
+        """Ответ для вызывающего кода: сохранённый при 304, иначе новый (и запоминает его ETag)."""
+        if entry is not None and response.status_code == 304:
+            with self._lock:
+                self.not_modified += 1
+            return entry[1]
+        with self._lock:
+            if etag and response.status_code == 200:
+                self._validators[key] = (etag, response)
+                self._validators.move_to_end(key)
+                while len(self._validators) > VALIDATOR_CACHE_SIZE:
+                    self._validators.popitem(last=False)
+            else:
+                self._validators.pop(key, None)
+        return response
+
+
+class ApiClient(_ApiStatsMixin):
+    """Клиент API бота: одна сессия с пулом keep-alive соединений на все вызовы.
+
+    У каждого запроса есть таймаут. Идемпотентные запросы повторяются при сетевых ошибках
+    и 502/503/504 с экспоненциальной задержкой и случайным разбросом (full jitter).
+    GET-ответы с ETag запоминаются, и следующий такой же GET отправляется с If-None-Match.
+    По каждому эндпоинту копится статистика задержек, см. stats().
+    """
+
+    def __init__(self, base_url, api_key, timeout=(3.05, 10), retries=2, backoff=0.2, pool_size=20):
+        self.base_url = base_url.rstrip('/') if base_url else ''
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'X-API-KEY': api_key or '', 'Accept-Encoding': ACCEPT_ENCODING})
+
+        self._init_stats()
+
+    def request(self, method, path, name=None, **kwargs):
+        """Выполняет запрос к API. name - ключ статистики, по умолчанию путь (передавайте шаблон для путей с id)."""
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeout)
+        attempts = 1 + (self.retries if method in IDEMPOTENT_METHODS else 0)
+        stats = self._endpoint_stats(f'{method} {name or path}')
+        key = self._validator_key(method, path, kwargs)
+        cached = self._cached_validator(key, kwargs) if key else None
+
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, self.base_url + path, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._observe(stats, time.perf_counter() - started, error=True)
+                if attempt + 1 == attempts:
+                    raise
+            else:
+                failed = response.status_code in RETRY_STATUSES
+                self._observe(stats, time.perf_counter() - started, error=failed or response.status_code >= 500)
+                if not failed or attempt + 1 == attempts:
+                    if key:
+                        return self._revalidated(key, cached, response, response.headers.get('ETag'))
+                    return response
+            self._count_retry(stats)
+            time.sleep(self._backoff_delay(attempt))
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class ApiResponse:
+    """Прочитанный ответ AsyncApiClient с тем же интерфейсом, что нужен боту от requests.Response."""
+
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncApiClient(_ApiStatsMixin):
+    """Неблокирующий вариант ApiClient на aiohttp для асинхронного бота (bot_async.py).
+
+    Политика та же: общий пул соединений, таймауты, повторы идемпотентных запросов, условные GET, статистика.
+    Сессия создаётся при первом запросе, потому что aiohttp требует запущенный event loop.
+    """
+
+    def __init__(self, base_url, api_key, timeout=(3.05, 10), retries=2, backoff=0.2, pool_size=100):
+        self.base_url = base_url.rstrip('/') if base_url else ''
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.headers = {'X-API-KEY': api_key or '', 'Accept-Encoding': ACCEPT_ENCODING}
+        self._session = None
+        self._init_stats()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1]),
+            )
+        return self._session
+
+    async def request(self, method, path, name=None, **kwargs):
+        import aiohttp
+
+        method = method.upper()
+        attempts = 1 + (self.retries if method in IDEMPOTENT_METHODS else 0)
+        stats = self._endpoint_stats(f'{method} {name or path}')
+        key = self._validator_key(method, path, kwargs)
+        cached = self._cached_validator(key, kwargs) if key else None
+        session = self._get_session()
+
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                async with session.request(method, self.base_url + path, **kwargs) as raw:
+                    response = ApiResponse(raw.status, await raw.read(), raw.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self._observe(stats, time.perf_counter() - started, error=True)
+                if attempt + 1 == attempts:
+                    raise
+            else:
+                failed = response.status_code in RETRY_STATUSES
+                self._observe(stats, time.perf_counter() - started, error=failed or response.status_code >= 500)
+                if not failed or attempt + 1 == attempts:
+                    if key:
+                        return self._revalidated(key, cached, response, response.headers.get('ETag'))
+                    return response
+            self._count_retry(stats)
+            await asyncio.sleep(self._backoff_delay(attempt))
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request('PUT', path, **kwargs)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
@@ -1,28 +1,156 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, current_app, request, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from flasgger import Swagger
-from swagger import swagger_template  # Подключаем swagger_template
 import os
+import sys
 from dotenv import load_dotenv
+from json_provider import make_json_provider, dumps_bytes
 
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-
-swagger = Swagger(app, template=swagger_template)
-
+db = SQLAlchemy()
+
+# Все эндпоинты API; приложение собирает create_app
+api = Blueprint('api', __name__)
+
+
+def db_pool_options():
+    """Настройки пула соединений SQLAlchemy для одного процесса.
+
+    Все воркеры вместе держат не больше DB_MAX_CONNECTIONS соединений с Postgres, и одному
+    воркеру не нужно больше соединений, чем у него потоков. Если бюджета не хватает даже на
+    одно соединение на воркер, приложение не запускается.
+    """
+    workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    threads = int(os.environ.get('WEB_THREADS', 8))
+    budget = int(os.environ.get('DB_MAX_CONNECTIONS', 20))
+    if budget < workers:
+        raise ValueError(f'DB_MAX_CONNECTIONS={budget} меньше WEB_CONCURRENCY={workers}: '
+                         'каждому воркеру нужно хотя бы одно соединение с Postgres')
+    return {
+        'pool_size': min(threads, budget // workers),
+        'max_overflow': 0,
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        # Соединение, которое Postgres или сеть успели закрыть, заменяется до выдачи запросу
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
 
-app.secret_key = os.environ.get('SECRET_KEY')
 
+# Необязательные части приложения; API есть всегда
+COMPONENTS = ('swagger', 'admin')
+
+
+def app_components():
+    """Компоненты из APP_COMPONENTS через запятую (по умолчанию все); пустая строка - только API."""
+    value = os.environ.get('APP_COMPONENTS', ','.join(COMPONENTS))
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def create_app(components=None):
+    """Приложение с API и включёнными компонентами (swagger, admin); None - из APP_COMPONENTS.
+
+    Flasgger, swagger_template и Flask-Admin импортируются только для включённых компонентов.
+    """
+    components = set(app_components() if components is None else components)
+    unknown = components - set(COMPONENTS)
+    if unknown:
+        raise ValueError(f"Неизвестные компоненты: {', '.join(sorted(unknown))}")
+
+    app = Flask(__name__)
+    CORS(app)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if (app.config['SQLALCHEMY_DATABASE_URI'] or '').startswith('postgresql'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_pool_options()
+    app.secret_key = os.environ.get('SECRET_KEY')
+    app.json = make_json_provider(app, os.environ.get('JSON_PROVIDER', 'orjson'))
+
+    db.init_app(app)
+    app.register_blueprint(api)
+    if os.environ.get('COMPRESS_RESPONSES', '0') == '1':
+        from compression import ResponseCompressor
+        ResponseCompressor(min_size=int(os.environ.get('COMPRESS_MIN_SIZE', 1024)),
+                           gzip_level=int(os.environ.get('COMPRESS_GZIP_LEVEL', 5)),
+                           brotli_quality=int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))).init_app(app)
+    if 'swagger' in components:
+        init_swagger(app)
+    if 'admin' in components:
+        from admin import init_admin
+        # Модели берём из этого модуля: при запуске python app.py он называется __main__, а не app
+        init_admin(app, db, sys.modules[__name__])
+    return app
+
+
+def init_swagger(app):
+    """Swagger UI на /apidocs/ и спецификация на /apispec_1.json, собранная и сжатая один раз при запуске."""
+    from flasgger import Swagger
+    from swagger import swagger_template
+    from swagger_spec import PrecompressedSpec, spec_drift
+
+    swagger = Swagger(app, template=swagger_template)
+    with app.test_request_context():
+        spec = swagger.get_apispecs('apispec_1')
+    drift = spec_drift(spec, app, api.name)
+    if drift:
+        raise RuntimeError('swagger.py не совпадает с маршрутами API: ' + '; '.join(drift))
+    app.extensions['apispec'] = precompressed = PrecompressedSpec(spec)
+    app.view_functions['flasgger.apispec_1'] = precompressed.response
+    return swagger
+
+
+def warm_up(app):
+    """Открывает соединения пула и загружает кэши до первого запроса (вызывается из gunicorn.conf.py)."""
+    with app.app_context():
+        engine = db.engine
+        # Держим все соединения разом, иначе пул выдавал бы одно и то же
+        connections = [engine.connect() for _ in range(getattr(engine.pool, 'size', lambda: 1)())]
+        for connection in connections:
+            connection.execute(text('SELECT 1'))
+            connection.close()
+        upcoming_events(version=data_version('events', 'offices'))
+        coach_directory.reload(load_coaches, data_version('coaches'))
+        db.session.remove()
+
+
+def shut_down(app):
+    """Закрывает соединения пула, когда воркер завершается."""
+    with app.app_context():
+        db.engine.dispose()
+
+import base64
+import hashlib
+from datetime import date, datetime, timedelta
 from functools import wraps
+from collections import Counter
+from sqlalchemy import DDL, update, delete, select, tuple_, values, column, text, true, event as sa_event
+from sqlalchemy.orm import object_session
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from user_cache import UserCache, UserRef
+from events_snapshot import EventsSnapshot, SnapshotEvent
+from coach_directory import CoachDirectory, CoachRef
+from single_flight import SingleFlight
+import exports
+import analytics
+import schedule
 
 API_KEY = os.environ.get('API_KEY')
 
+# Кэш telegram_id -> (id, office, role), чтобы горячие эндпоинты не читали строку пользователя целиком
+user_cache = UserCache(maxsize=int(os.environ.get('USER_CACHE_SIZE', 10000)),
+                       ttl=float(os.environ.get('USER_CACHE_TTL', 300)))
+
+# Общий для всех пользователей снимок ближайших событий для /upcoming_events и /available_events
+events_snapshot = EventsSnapshot(ttl=float(os.environ.get('EVENTS_SNAPSHOT_TTL', 10)),
+                                 per_office=int(os.environ.get('EVENTS_SNAPSHOT_PER_OFFICE', 100)))
+
+# Справочник тренеров для описаний в списках событий
+coach_directory = CoachDirectory(ttl=float(os.environ.get('COACH_CACHE_TTL', 300)))
+
+# Одинаковые одновременные запросы на чтение (например, когда сотни людей открыли бота после анонса)
+# выполняются в базе один раз, остальные ждут результат не дольше QUERY_COALESCE_TIMEOUT секунд
+query_coalescer = SingleFlight(timeout=float(os.environ.get('QUERY_COALESCE_TIMEOUT', 5)))
+
 def require_api_key(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -38,7 +166,7 @@ class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
-    telegram_id = db.Column(db.BigInteger)
+    telegram_id = db.Column(db.BigInteger, index=True)
     employee_id = db.Column(db.String(255))
     role = db.Column(db.String(50), nullable=False)
     info = db.Column(db.JSON)
@@ -48,6 +176,11 @@ class User(db.Model):
 
 class EventRegistration(db.Model):
     __tablename__ = 'event_registration'
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'user_id', name='uq_event_registration_event_user'),
+        # Записи одного пользователя (уникальный ключ начинается с event_id и тут не помогает)
+        db.Index('ix_event_registration_user_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -57,11 +190,22 @@ class EventRegistration(db.Model):
     user = db.relationship('User', backref='registrations', lazy=True)
     event = db.relationship('Event', backref='registrations', lazy=True)
 
+# Номер изменения строки для версий данных (ETag, см. data_version): новое значение общей последовательности
+# при вставке (DEFAULT) и при каждом изменении строки (триггер bump_row_version). В отличие от xmin номер
+# не переполняется и не идёт по кругу
+data_version_seq = db.Sequence('data_version_seq', metadata=db.metadata)
+
+
+def row_version_column():
+    return db.Column(db.BigInteger, nullable=False, server_default=data_version_seq.next_value())
+
+
 class Office(db.Model):
     __tablename__ = 'offices'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     address = db.Column(db.Text, nullable=False)
+    row_version = row_version_column()
 
     # Опционально, если вы хотите использовать обратную связь от офисов к событиям
     events = db.relationship('Event', backref='office', lazy=True)
@@ -71,15 +215,36 @@ class Event(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     time = db.Column(db.Time, nullable=False)
+    # Имя тренера для отображения; его заполняет coach_profile (см. _copy_coach_name)
     coach = db.Column(db.String(255), nullable=False)
+    coach_id = db.Column(db.Integer, db.ForeignKey('coaches.id', ondelete='SET NULL'), nullable=True, index=True)
     office_id = db.Column(db.Integer, db.ForeignKey('offices.id'), nullable=False)
     max_participants = db.Column(db.Integer, nullable=False)
+    # Денормализованный счётчик записей, его меняет условный UPDATE в reserve_seat/release_seat
+    registered_participants = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Начало события, его считает сама база из date и time (в том числе при правках из админки)
+    starts_at = db.Column(db.DateTime, db.Computed('date + time', persisted=True))
+    row_version = row_version_column()
+
+    __table_args__ = (
+        # Предстоящие события офиса и предстоящие события всех офисов
+        db.Index('ix_events_office_id_starts_at', 'office_id', 'starts_at'),
+        db.Index('ix_events_starts_at', 'starts_at'),
+        # Одно занятие в офисе в одно время; на нём же ON CONFLICT DO NOTHING в schedule.py
+        db.UniqueConstraint('office_id', 'date', 'time', name='uq_events_office_date_time'),
+    )
+
+    coach_profile = db.relationship('Coach', lazy=True)
 
 class Coach(db.Model):
     __tablename__ = 'coaches'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
+    row_version = row_version_column()
+
+    def __str__(self):
+        return self.name
 
     def to_dict(self):
         return {
@@ -89,13 +254,338 @@ class Coach(db.Model):
         }
 
 
-@app.route('/users', methods=['POST'])
+# Триггер для баз, созданных через db.create_all(); в существующих его создаёт migrations/009_row_version.sql
+sa_event.listen(db.metadata, 'before_create', DDL('''
+CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.row_version := nextval('data_version_seq');
+    RETURN NEW;
+END
+$$'''))
+for _table in (Office.__table__, Event.__table__, Coach.__table__):
+    sa_event.listen(_table, 'after_create', DDL(
+        'CREATE TRIGGER %(table)s_row_version BEFORE UPDATE ON %(table)s FOR EACH ROW '
+        'EXECUTE FUNCTION bump_row_version()'))
+
+
+class AttendanceDaily(db.Model):
+    """Сводка посещаемости по (офис, тренер, день); её ведёт _update_attendance_rollup, см. analytics.py."""
+    __tablename__ = 'attendance_daily'
+    office_id = db.Column(db.Integer, db.ForeignKey('offices.id'), primary_key=True)
+    coach = db.Column(db.String(255), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    events = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    capacity = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    registrations = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Отмены копятся с момента создания сводки: удалённые записи в базе не остаются
+    cancellations = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+
+    __table_args__ = (
+        # Отчёты за период по всем офисам
+        db.Index('ix_attendance_daily_date', 'date'),
+    )
+
+
+class Reminder(db.Model):
+    """Напоминание о занятии для записи: due_at - когда напомнить. Удаляется вместе с записью."""
+    __tablename__ = 'reminders'
+    registration_id = db.Column(db.Integer, db.ForeignKey('event_registration.id', ondelete='CASCADE'),
+                                primary_key=True)
+    # Очередь по времени: за тик читаются только наступившие напоминания
+    due_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class ScheduleTemplate(db.Model):
+    """Повторяющееся занятие: по дням недели weekdays (1 - понедельник) с starts_on по ends_on; см. schedule.py."""
+    __tablename__ = 'schedule_templates'
+    id = db.Column(db.Integer, primary_key=True)
+    office_id = db.Column(db.Integer, db.ForeignKey('offices.id'), nullable=False)
+    coach_id = db.Column(db.Integer, db.ForeignKey('coaches.id', ondelete='CASCADE'), nullable=False)
+    weekdays = db.Column(ARRAY(db.SmallInteger), nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    max_participants = db.Column(db.Integer, nullable=False)
+    starts_on = db.Column(db.Date, nullable=False, server_default=db.func.current_date())
+    # Без даты окончания шаблон продлевается на горизонт при каждом запуске
+    ends_on = db.Column(db.Date, nullable=True)
+
+    __table_args__ = (
+        db.CheckConstraint("weekdays <@ '{1,2,3,4,5,6,7}' AND cardinality(weekdays) > 0",
+                           name='ck_schedule_templates_weekdays'),
+    )
+
+    office = db.relationship('Office', lazy=True)
+    coach_profile = db.relationship('Coach', lazy=True)
+
+    def __str__(self):
+        return f'{schedule.format_weekdays(self.weekdays)} {self.time:%H:%M}'
+
+
+# Записи, созданные или удалённые через ORM (например, в админке), тоже должны двигать счётчик мест
+def _shift_registered_participants(connection, event_id, delta):
+    events = Event.__table__
+    connection.execute(
+        update(events).where(events.c.id == event_id).values(
+            registered_participants=events.c.registered_participants + delta
+        )
+    )
+
+
+@sa_event.listens_for(EventRegistration, 'after_insert')
+def _registration_inserted(mapper, connection, target):
+    _shift_registered_participants(connection, target.event_id, 1)
+    schedule_reminders(connection, registration_ids=[target.id])
+    note_seat_changes({target.event_id: 1}, object_session(target))
+
+
+@sa_event.listens_for(EventRegistration, 'after_delete')
+def _registration_deleted(mapper, connection, target):
+    _shift_registered_participants(connection, target.event_id, -1)
+    note_seat_changes({target.event_id: -1}, object_session(target))
+
+
+@sa_event.listens_for(EventRegistration, 'after_update')
+def _registration_moved(mapper, connection, target):
+    history = db.inspect(target).attrs.event_id.history
+    if history.deleted and history.added:
+        _shift_registered_participants(connection, history.deleted[0], -1)
+        _shift_registered_participants(connection, history.added[0], 1)
+        schedule_reminders(connection, registration_ids=[target.id])
+        note_seat_changes({history.deleted[0]: -1, history.added[0]: 1}, object_session(target))
+
+
+# Напоминания за REMINDER_LEAD_MINUTES до начала занятия; 0 - не напоминать
+REMINDER_LEAD = timedelta(minutes=int(os.environ.get('REMINDER_LEAD_MINUTES', 60)))
+
+
+def schedule_reminders(connection, registration_ids=None, event_id=None, now=None):
+    """Ставит (или переносит) напоминания для записей registration_ids или всех записей события event_id.
+
+    Запись, для которой время напоминания уже прошло (записались меньше чем за REMINDER_LEAD до начала),
+    напоминания не получает. Отмена записи удаляет напоминание сама (ON DELETE CASCADE).
+    """
+    reminders = Reminder.__table__
+    registrations = EventRegistration.__table__
+    events = Event.__table__
+    if event_id is not None:
+        # Событие перенесли: старые напоминания его записей больше не верны
+        connection.execute(delete(reminders).where(
+            reminders.c.registration_id.in_(select(registrations.c.id).where(registrations.c.event_id == event_id))))
+    if not REMINDER_LEAD:
+        return
+    due_at = events.c.starts_at - REMINDER_LEAD
+    due = select(registrations.c.id, due_at).join_from(
+        registrations, events, registrations.c.event_id == events.c.id
+    ).where(
+        due_at > (now or datetime.now()),
+        registrations.c.id.in_(registration_ids) if event_id is None else registrations.c.event_id == event_id
+    )
+    statement = pg_insert(reminders).from_select(['registration_id', 'due_at'], due)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[reminders.c.registration_id], set_={'due_at': statement.excluded.due_at}))
+
+
+@sa_event.listens_for(Event, 'after_update')
+def _event_rescheduled(mapper, connection, target):
+    state = db.inspect(target)
+    if state.attrs.date.history.has_changes() or state.attrs.time.history.has_changes():
+        schedule_reminders(connection, event_id=target.id)
+
+
+# Снимок событий меняется только после коммита: до него изменения транзакции копятся в session.info
+def note_seat_changes(deltas, session=None):
+    session = session or db.session()
+    # Ключи снимка событий - целые id; "5" из JSON молча не совпал бы ни с одним событием
+    session.info.setdefault('seat_deltas', Counter()).update(
+        {int(event_id): delta for event_id, delta in deltas.items()})
+
+
+@sa_event.listens_for(Event, 'after_insert')
+@sa_event.listens_for(Event, 'after_update')
+@sa_event.listens_for(Event, 'after_delete')
+@sa_event.listens_for(Office, 'after_insert')
+@sa_event.listens_for(Office, 'after_update')
+@sa_event.listens_for(Office, 'after_delete')
+def _schedule_changed(mapper, connection, target):
+    object_session(target).info['schedule_changed'] = True
+
+
+# Строки сводки посещаемости, которые надо пересчитать до коммита: прежний и новый (офис, тренер, день) события
+def note_rollup_keys(keys, session=None):
+    session = session or db.session()
+    session.info.setdefault('rollup_keys', set()).update(keys)
+
+
+@sa_event.listens_for(Event, 'after_insert')
+@sa_event.listens_for(Event, 'after_update')
+@sa_event.listens_for(Event, 'after_delete')
+def _event_rollup_changed(mapper, connection, target):
+    state = db.inspect(target)
+    current = (target.office_id, target.coach, target.date)
+    previous = tuple(
+        getattr(state.attrs, name).history.deleted[0] if getattr(state.attrs, name).history.deleted else value
+        for name, value in zip(('office_id', 'coach', 'date'), current)
+    )
+    note_rollup_keys({current, previous}, object_session(target))
+
+
+@sa_event.listens_for(Coach, 'after_insert')
+@sa_event.listens_for(Coach, 'after_update')
+@sa_event.listens_for(Coach, 'after_delete')
+def _coaches_changed(mapper, connection, target):
+    object_session(target).info['coaches_changed'] = True
+
+
+# Имя тренера в events.coach повторяет coaches.name: его показывают /user_events и админка
+@sa_event.listens_for(Event, 'before_insert')
+@sa_event.listens_for(Event, 'before_update')
+def _copy_coach_name(mapper, connection, target):
+    if target.coach_profile is not None:
+        target.coach = target.coach_profile.name
+    elif target.coach is None:
+        target.coach = ''
+
+
+@sa_event.listens_for(Coach, 'after_update')
+def _rename_coach_events(mapper, connection, target):
+    history = db.inspect(target).attrs.name.history
+    if history.has_changes():
+        events = Event.__table__
+        renamed = connection.execute(
+            update(events).where(events.c.coach_id == target.id).values(coach=target.name)
+            .returning(events.c.office_id, events.c.date)
+        ).all()
+        # Занятия переезжают в строки сводки с новым именем; отмены остаются за старым
+        old_name = history.deleted[0] if history.deleted else None
+        note_rollup_keys({(office_id, name, day) for office_id, day in renamed for name in (old_name, target.name)
+                          if name is not None}, object_session(target))
+
+
+# Сводка посещаемости меняется в той же транзакции, что и записи, прямо перед COMMIT: строка сводки
+# блокируется только на время коммита, а не всего запроса
+@sa_event.listens_for(db.session, 'before_commit')
+def _update_attendance_rollup(session):
+    # Изменения мест из ORM-слушателей появляются при flush, поэтому сначала он
+    session.flush()
+    deltas = session.info.get('seat_deltas')
+    keys = session.info.pop('rollup_keys', None)
+    if deltas or keys:
+        connection = session.connection()
+        analytics.apply_seat_deltas(connection, deltas or {})
+        analytics.refresh_keys(connection, keys or ())
+
+
+# Записи и отмены записи меняют версию данных событий, и снимок перечитается сам (см. EventsSnapshot)
+@sa_event.listens_for(db.session, 'after_commit')
+def _apply_snapshot_changes(session):
+    session.info.pop('seat_deltas', None)
+    if session.info.pop('coaches_changed', False):
+        coach_directory.invalidate()
+    if session.info.pop('schedule_changed', False):
+        events_snapshot.invalidate()
+
+
+@sa_event.listens_for(db.session, 'after_rollback')
+def _discard_snapshot_changes(session):
+    session.info.pop('seat_deltas', None)
+    session.info.pop('schedule_changed', None)
+    session.info.pop('coaches_changed', None)
+    session.info.pop('rollup_keys', None)
+
+
+def materialize_schedule(date_from, date_to, template_ids=None, session=None):
+    """События по шаблонам за дни с date_from по date_to без уже существующих; возвращает, сколько создано.
+
+    Вставка мимо ORM, поэтому сводку посещаемости и снимок событий отмечаем сами. Коммит - за вызывающим.
+    """
+    session = session or db.session()
+    created = schedule.materialize(session.connection(), date_from, date_to, template_ids)
+    if created:
+        note_rollup_keys(created, session)
+        session.info['schedule_changed'] = True
+    return len(created)
+
+
+def load_coaches():
+    return [CoachRef(*row) for row in db.session.query(Coach.id, Coach.name, Coach.description)]
+
+
+def get_coach(coach_id):
+    """CoachRef тренера из справочника или None."""
+    return coach_directory.get(coach_id, load_coaches)
+
+
+def get_user_ref(telegram_id):
+    """UserRef пользователя по telegram_id (из кэша, если есть) или None."""
+    def load(key):
+        row = db.session.query(User.id, User.office, User.role).filter(User.telegram_id == key).first()
+        return UserRef(*row) if row else None
+    return user_cache.get(telegram_id, load)
+
+
+# Правки пользователя в обход API (например, из админки) сбрасывают запись кэша
+@sa_event.listens_for(User, 'after_update')
+@sa_event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    user_cache.invalidate(target.telegram_id)
+    # Если в админке поменяли сам telegram_id, прежний ключ тоже больше не годится
+    for telegram_id in db.inspect(target).attrs.telegram_id.history.deleted:
+        user_cache.invalidate(telegram_id)
+
+
+# Версии данных для ETag: число строк и сумма row_version. Любая запись, отмена записи или правка в админке
+# даёт строке новый row_version, вставка добавляет строку со свежим номером, удаление уменьшает число строк,
+# поэтому версия меняется на каждое закоммиченное изменение - в каком бы порядке ни коммитились транзакции
+# (наибольший номер такого не гарантирует). Считается проходом по индексу без тяжёлых JOIN.
+_DATA_VERSION_SQL = {
+    'events': "SELECT count(*) || ':' || coalesce(sum(row_version), 0) FROM events "
+              "WHERE starts_at >= LOCALTIMESTAMP",
+    'offices': "SELECT count(*) || ':' || coalesce(sum(row_version), 0) FROM offices",
+    'coaches': "SELECT count(*) || ':' || coalesce(sum(row_version), 0) FROM coaches",
+}
+
+
+def data_versions(*tables):
+    """Версии данных нескольких таблиц одним запросом, по строке на таблицу."""
+    # Не объединяется через query_coalescer: запрос, начатый до коммита клиента, вернул бы ему прежнюю версию,
+    # и сразу после своей записи клиент получил бы 304 со старыми данными
+    return tuple(db.session.execute(
+        text('SELECT ' + ', '.join(f'({_DATA_VERSION_SQL[t]})' for t in tables))).one())
+
+
+def data_version(*tables):
+    """Версия данных нескольких таблиц одной строкой."""
+    return '/'.join(data_versions(*tables))
+
+
+def conditional_json(version, build):
+    """Отвечает 304, если у клиента актуальная версия, иначе jsonify(build()) с ETag.
+
+    build() возвращает данные ответа или пару (данные, заголовки).
+    Версию нужно получить до того, как строится ответ: тогда при гонке с записью ответ будет
+    новее своего ETag, и клиент просто получит лишний 200, а не устаревшие данные.
+    """
+    etag = hashlib.sha1(version.encode()).hexdigest()
+    # Слабое сравнение: сжатый ответ (compression.py) уходит со слабым ETag
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        result = build()
+        payload, headers = result if isinstance(result, tuple) else (result, {})
+        response = jsonify(payload)
+        response.headers.update(headers)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api.route('/users', methods=['POST'])
 @require_api_key
 def create_user():
     data = request.get_json()
 
     # Проверяем, существует ли уже пользователь с таким telegram_id
-    existing_user = User.query.filter_by(telegram_id=data['telegram_id']).first()
+    existing_user = get_user_ref(data['telegram_id'])
     if existing_user:
         return jsonify({
                            'error': 'Пользователь уже зарегистрирован'}), 409  # Код 409 Conflict для ситуаций, когда возникает конфликт данных
@@ -112,12 +602,13 @@ def create_user():
     db.session.add(user)
     try:
         db.session.commit()
+        user_cache.put(user.telegram_id, UserRef(user.id, user.office, user.role))
         return jsonify({'message': 'User created successfully'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify(
             {'error': str(e)}), 500  # В случае ошибки при сохранении возвращаем код 500 и информацию об ошибке
-@app.route('/users/info/<int:telegram_id>', methods=['GET', 'PUT']) # чтение и рпедактирование поля info
+@api.route('/users/info/<int:telegram_id>', methods=['GET', 'PUT']) # чтение и рпедактирование поля info
 def user_info(telegram_id):
     user = User.query.filter_by(telegram_id=telegram_id).first()
     if not user:
@@ -136,17 +627,18 @@ def user_info(telegram_id):
                 user.info = {}
             user.info.update(new_info)
             db.session.commit()
+            user_cache.put(telegram_id, UserRef(user.id, user.office, user.role))
             return jsonify({'message': 'Информация пользователя успешно обновлена'}), 200
         else:
             return jsonify({'error': 'Некорректные данные для поля info'}), 400
 
-@app.route('/users/is_registered/<int:telegram_id>', methods=['GET']) # проверка что пользователь зарегистрирован
+@api.route('/users/is_registered/<int:telegram_id>', methods=['GET']) # проверка что пользователь зарегистрирован
 def is_user_registered(telegram_id):
-    user = User.query.filter_by(telegram_id=telegram_id).first()
+    user = get_user_ref(telegram_id)
     return jsonify({'is_registered': user is not None}), 200
 
 
-@app.route('/users/update_by_telegram_id', methods=['PUT'])
+@api.route('/users/update_by_telegram_id', methods=['PUT'])
 @require_api_key
 def update_user_by_telegram_id():
     data = request.get_json()
@@ -170,55 +662,113 @@ def update_user_by_telegram_id():
     # Сохраняем изменения
     try:
         db.session.commit()
+        user_cache.put(telegram_id, UserRef(user.id, user.office, user.role))
         return jsonify({'message': 'Данные пользователя успешно обновлены'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/coaches', methods=['GET'])
+@api.route('/coaches', methods=['GET'])
 def get_coaches():
-    coaches = Coach.query.all()
-    return jsonify([coach.to_dict() for coach in coaches]), 200
+    if wants_ndjson():
+        return ndjson_response(Coach.query.order_by(Coach.id), Coach.to_dict)
+    return conditional_json(data_version('coaches'), lambda: [coach.to_dict() for coach in Coach.query.all()])
+
+
+def _registration_error(event_id, user_id, now):
+    # Выясняем, почему условный UPDATE не занял место - это редкий путь, поэтому лишний SELECT здесь не страшен
+    event = db.session.get(Event, event_id)
+    if not event:
+        return 'События не существует', 404
+    if EventRegistration.query.filter_by(user_id=user_id, event_id=event_id).first():
+        return 'Пользователь уже зарегистрировался на это событие', 400
+    if now >= datetime.combine(event.date, event.time):
+        return 'Нельзя зарегистрироваться на событие, которое уже закончилось', 400
+    return 'На это событие все места уже заняты', 400
+
+
+def reserve_seat(event_id, user_id):
+    """Занимает место на событии и создаёт запись. Возвращает None или (ошибка, код). Коммит - на вызывающем."""
+    now = datetime.now()
+
+    # Один условный UPDATE и проверяет, и занимает место: блокируется только строка события, продать лишнее место нельзя
+    reserved = db.session.execute(
+        update(Event).where(
+            Event.id == event_id,
+            Event.registered_participants < Event.max_participants,
+            Event.starts_at > now
+        ).values(
+            registered_participants=Event.registered_participants + 1
+        ).returning(Event.id).execution_options(synchronize_session=False)
+    ).first()
+    if reserved is None:
+        return _registration_error(event_id, user_id, now)
+
+    # Повторную запись отсекает уникальный ключ (event_id, user_id)
+    inserted = db.session.execute(
+        pg_insert(EventRegistration).values(event_id=event_id, user_id=user_id)
+        .on_conflict_do_nothing(constraint='uq_event_registration_event_user')
+        .returning(EventRegistration.id)
+    ).first()
+    if inserted is None:
+        return 'Пользователь уже зарегистрировался на это событие', 400
+    schedule_reminders(db.session.connection(), registration_ids=[inserted.id], now=now)
+    note_seat_changes({event_id: 1})
+    return None
+
+
+def release_seat(event_id, user_id):
+    """Удаляет запись и освобождает место. Возвращает None или (ошибка, код). Коммит - на вызывающем."""
+    deleted = db.session.execute(
+        delete(EventRegistration).where(
+            EventRegistration.event_id == event_id,
+            EventRegistration.user_id == user_id
+        ).returning(EventRegistration.id).execution_options(synchronize_session=False)
+    ).first()
+    if deleted is None:
+        return 'Вы не подписаны на это событие', 404
+
+    db.session.execute(
+        update(Event).where(Event.id == event_id).values(
+            registered_participants=Event.registered_participants - 1
+        ).execution_options(synchronize_session=False)
+    )
+    note_seat_changes({event_id: -1})
+    return None
+
+
+def parse_event_id(value):
+    """event_id из JSON как int: число или строка с числом (так его присылает бот); None, если это не id."""
+    # bool - подкласс int, но true вместо id - ошибка клиента
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
 
 
-@app.route('/event_registrations', methods=['POST']) # Регистрация пользователя на событие
+@api.route('/event_registrations', methods=['POST']) # Регистрация пользователя на событие
 @require_api_key
 def create_event_registration():
     data = request.get_json()
-    event_id = data.get('event_id')
+    event_id = parse_event_id(data.get('event_id'))
     telegram_id = data.get('telegram_id')
-
-    # Проверяем, существует ли событие
-    event = Event.query.get(event_id)
-    if not event:
-        return jsonify({'error': 'События не существует'}), 404
+    if event_id is None:
+        return jsonify({'error': 'Некорректный формат ID события. Ожидается целое число.'}), 400
 
     # Проверяем, существует ли пользователь по telegram_id
-    user = User.query.filter_by(telegram_id=telegram_id).first()
+    user = get_user_ref(telegram_id)
     if not user:
         return jsonify({'error': 'Пользователя не существует'}), 404
 
-    # Проверяем, записан ли пользователь уже на это конкретное событие
-    existing_registration = EventRegistration.query.filter_by(user_id=user.id, event_id=event_id).first()
-    if existing_registration:
-        return jsonify({'error': 'Пользователь уже зарегистрировался на это событие'}), 400
-
-    # Проверяем, есть ли свободные места на событии
-    registered_count = EventRegistration.query.filter_by(event_id=event_id).count()
-    if registered_count >= event.max_participants:
-        return jsonify({'error': 'На это событие все места уже заняты'}), 400
-
-    # Проверяем, не закончилось ли уже событие
-    now = datetime.now()
-    event_datetime = datetime.combine(event.date, event.time)
-    if now >= event_datetime:
-        return jsonify({'error': 'Нельзя зарегистрироваться на событие, которое уже закончилось'}), 400
-
-    # Создаем запись на событие
-    event_registration = EventRegistration(event_id=event_id, user_id=user.id)
-    db.session.add(event_registration)
     try:
+        error = reserve_seat(event_id, user.id)
+        if error:
+            db.session.rollback()
+            message, status = error
+            return jsonify({'error': message}), status
         db.session.commit()
         return jsonify({'message': 'Вы успешно зарегистрированы на событие'}), 201
     except Exception as e:
@@ -227,75 +777,442 @@ def create_event_registration():
 
 
 
-@app.route('/event_registrations/delete', methods=['POST'])
+@api.route('/event_registrations/delete', methods=['POST'])
 @require_api_key
 def delete_event_registration():
     data = request.get_json()
-    event_id = data.get('event_id')
+    event_id = parse_event_id(data.get('event_id'))
     telegram_id = data.get('telegram_id')
+    if event_id is None:
+        return jsonify({'error': 'Некорректный формат ID события. Ожидается целое число.'}), 400
 
     # Находим пользователя по telegram_id
-    user = User.query.filter_by(telegram_id=telegram_id).first()
+    user = get_user_ref(telegram_id)
 
     if not user:
         return jsonify({'error': 'Пользователь не найден'}), 404
 
-    # Ищем запись на событие по event_id и user_id
-    event_registration = EventRegistration.query.filter_by(event_id=event_id, user_id=user.id).first()
+    try:
+        error = release_seat(event_id, user.id)
+        if error:
+            db.session.rollback()
+            message, status = error
+            return jsonify({'error': message}), status
+        db.session.commit()
+        return jsonify({'message': 'Регистрация на событие удалена'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+# Пакетная запись и отмена записи: для HR-выгрузок и админов, тысячи пар (telegram_id, event_id) за запрос
+
+MAX_BULK_ITEMS = int(os.environ.get('MAX_BULK_ITEMS', 10000))
+BULK_INSERT_CHUNK = 1000
+
+
+def _bulk_item_is_valid(item):
+    return (isinstance(item, dict)
+            and type(item.get('telegram_id')) is int
+            and type(item.get('event_id')) is int)
+
+
+def _bulk_result(item, status, message=None, error=None):
+    result = {
+        'telegram_id': item.get('telegram_id') if isinstance(item, dict) else None,
+        'event_id': item.get('event_id') if isinstance(item, dict) else None,
+        'status': status,
+    }
+    if message:
+        result['message'] = message
+    if error:
+        result['error'] = error
+    return result
+
+
+def _bulk_items(data):
+    items = data.get('items', []) if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return None, ('Ожидается список items из объектов {telegram_id, event_id}', 400)
+    if len(items) > MAX_BULK_ITEMS:
+        return None, (f'Не больше {MAX_BULK_ITEMS} элементов за запрос', 413)
+    return items, None
+
+
+def _resolve_user_ids(items):
+    # Все пользователи пакета - одним запросом
+    telegram_ids = {item['telegram_id'] for item in items if _bulk_item_is_valid(item)}
+    if not telegram_ids:
+        return {}
+    return dict(db.session.query(User.telegram_id, User.id).filter(User.telegram_id.in_(telegram_ids)).all())
+
+
+def _shift_event_counters(deltas):
+    # Счётчики нескольких событий одним UPDATE ... FROM (VALUES ...)
+    deltas = {event_id: delta for event_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    shifts = values(column('event_id', db.Integer), column('delta', db.Integer), name='shifts').data(
+        list(deltas.items()))
+    db.session.execute(
+        update(Event).where(Event.id == shifts.c.event_id).values(
+            registered_participants=Event.registered_participants + shifts.c.delta
+        ).execution_options(synchronize_session=False)
+    )
+    note_seat_changes(deltas)
 
-    # Если запись на событие не найдена, возвращаем ошибку
-    if not event_registration:
-        return jsonify({'error': 'Вы не подписаны на это событие'}), 404
 
-    # Удаляем запись на событие
-    db.session.delete(event_registration)
+@api.route('/event_registrations/bulk', methods=['POST'])
+@require_api_key
+def bulk_create_event_registrations():
+    items, error = _bulk_items(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+
+    now = datetime.now()
     try:
+        user_ids = _resolve_user_ids(items)
+        event_ids = sorted({item['event_id'] for item in items if _bulk_item_is_valid(item)})
+
+        # Блокируем строки событий пакета (по порядку id, чтобы параллельные пакеты не взаимоблокировались):
+        # одиночные записи на эти события подождут, и места можно считать здесь, без гонок
+        events = {
+            event.id: event for event in db.session.query(
+                Event.id, Event.starts_at, Event.max_participants, Event.registered_participants
+            ).filter(Event.id.in_(event_ids)).order_by(Event.id).with_for_update().all()
+        } if event_ids else {}
+        taken = {event_id: event.registered_participants for event_id, event in events.items()}
+
+        existing = set()
+        if events and user_ids:
+            existing = set(db.session.query(EventRegistration.event_id, EventRegistration.user_id).filter(
+                EventRegistration.event_id.in_(list(events)),
+                EventRegistration.user_id.in_(set(user_ids.values()))
+            ).all())
+
+        results = []
+        pending = []  # (индекс в results, event_id, user_id)
+        for item in items:
+            if not _bulk_item_is_valid(item):
+                results.append(_bulk_result(item, 400, error='Нужны целые telegram_id и event_id'))
+                continue
+            user_id = user_ids.get(item['telegram_id'])
+            event = events.get(item['event_id'])
+            if user_id is None:
+                results.append(_bulk_result(item, 404, error='Пользователя не существует'))
+            elif event is None:
+                results.append(_bulk_result(item, 404, error='События не существует'))
+            elif (event.id, user_id) in existing:
+                results.append(_bulk_result(item, 400, error='Пользователь уже зарегистрировался на это событие'))
+            elif now >= event.starts_at:
+                results.append(_bulk_result(item, 400, error='Нельзя зарегистрироваться на событие, которое уже закончилось'))
+            elif taken[event.id] >= event.max_participants:
+                results.append(_bulk_result(item, 400, error='На это событие все места уже заняты'))
+            else:
+                existing.add((event.id, user_id))
+                taken[event.id] += 1
+                pending.append((len(results), event.id, user_id))
+                results.append(None)
+
+        # Многострочные INSERT; RETURNING показывает, какие строки действительно вставились
+        inserted = set()
+        for start in range(0, len(pending), BULK_INSERT_CHUNK):
+            chunk = pending[start:start + BULK_INSERT_CHUNK]
+            rows = db.session.execute(
+                pg_insert(EventRegistration).values([
+                    {'event_id': event_id, 'user_id': user_id} for _, event_id, user_id in chunk
+                ]).on_conflict_do_nothing(constraint='uq_event_registration_event_user')
+                .returning(EventRegistration.id, EventRegistration.event_id, EventRegistration.user_id)
+            ).all()
+            inserted.update((row.event_id, row.user_id) for row in rows)
+            if rows:
+                schedule_reminders(db.session.connection(), registration_ids=[row.id for row in rows], now=now)
+
+        deltas = Counter()
+        for index, event_id, user_id in pending:
+            item = items[index]
+            if (event_id, user_id) in inserted:
+                deltas[event_id] += 1
+                results[index] = _bulk_result(item, 201, message='Вы успешно зарегистрированы на событие')
+            else:
+                results[index] = _bulk_result(item, 400, error='Пользователь уже зарегистрировался на это событие')
+        _shift_event_counters(deltas)
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    created = sum(deltas.values())
+    return jsonify({'created': created, 'failed': len(items) - created, 'results': results}), 200
+
+
+@api.route('/event_registrations/bulk_delete', methods=['POST'])
+@require_api_key
+def bulk_delete_event_registrations():
+    data = request.get_json(silent=True)
+    items, error = _bulk_items(data)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+
+    # event_ids - отменить занятие целиком: удалить все записи на эти события
+    cancel_event_ids = data.get('event_ids', []) if isinstance(data, dict) else []
+    if not isinstance(cancel_event_ids, list) or not all(type(event_id) is int for event_id in cancel_event_ids):
+        return jsonify({'error': 'event_ids должен быть списком целых чисел'}), 400
+
+    try:
+        user_ids = _resolve_user_ids(items)
+        pairs = {
+            (item['event_id'], user_ids[item['telegram_id']])
+            for item in items if _bulk_item_is_valid(item) and item['telegram_id'] in user_ids
+        }
+
+        deleted = []
+        if pairs:
+            deleted += db.session.execute(
+                delete(EventRegistration).where(
+                    tuple_(EventRegistration.event_id, EventRegistration.user_id).in_(pairs)
+                ).returning(EventRegistration.event_id, EventRegistration.user_id)
+                .execution_options(synchronize_session=False)
+            ).tuples().all()
+        if cancel_event_ids:
+            deleted += db.session.execute(
+                delete(EventRegistration).where(
+                    EventRegistration.event_id.in_(cancel_event_ids)
+                ).returning(EventRegistration.event_id, EventRegistration.user_id)
+                .execution_options(synchronize_session=False)
+            ).tuples().all()
+
+        _shift_event_counters({event_id: -count for event_id, count in Counter(e for e, _ in deleted).items()})
         db.session.commit()
-        return jsonify({'message': 'Регистрация на событие удалена'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+    deleted_pairs = set(deleted)
+    results = []
+    for item in items:
+        if not _bulk_item_is_valid(item):
+            results.append(_bulk_result(item, 400, error='Нужны целые telegram_id и event_id'))
+        elif item['telegram_id'] not in user_ids:
+            results.append(_bulk_result(item, 404, error='Пользователь не найден'))
+        elif (item['event_id'], user_ids[item['telegram_id']]) in deleted_pairs:
+            results.append(_bulk_result(item, 200, message='Регистрация на событие удалена'))
+        else:
+            results.append(_bulk_result(item, 404, error='Вы не подписаны на это событие'))
+
+    return jsonify({'deleted': len(deleted), 'results': results}), 200
+
+
+from sqlalchemy.sql import func
+
+# Постраничный вывод событий по ключу (starts_at, id): следующая страница - события после последнего
+# показанного, поэтому любая страница стоит как первая, в отличие от OFFSET.
+# Курсоры отдаются в заголовках X-Next-Cursor и X-Prev-Cursor, тело ответа остаётся списком событий.
+
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 50))
+_CURSOR_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(event):
+    """Непрозрачный курсор по событию из ответа (dict с datetime и event_id)."""
+    starts_at = datetime.strptime(event['datetime'], '%Y-%m-%d %H:%M:%S')
+    key = f"{int((starts_at - _CURSOR_EPOCH).total_seconds())}:{event['event_id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Ключ (starts_at, id) из курсора; ValueError, если курсор испорчен."""
+    try:
+        seconds, event_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split(':')
+        event_id = int(event_id)
+        # id за пределами integer дошёл бы до Postgres и вернулся ошибкой 500
+        if not 0 < event_id < 2 ** 31:
+            raise ValueError(event_id)
+        return _CURSOR_EPOCH + timedelta(seconds=int(seconds)), event_id
+    except (ValueError, UnicodeDecodeError, OverflowError) as e:
+        # OverflowError - секунды за пределами timedelta или datetime
+        raise ValueError('Некорректный курсор') from e
+
+
+def page_params(default_size):
+    """(размер страницы, after, before) из параметров запроса; ValueError с текстом ошибки."""
+    limit = request.args.get('limit', default_size, type=int)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit должен быть от 1 до {MAX_PAGE_SIZE}')
+    after, before = request.args.get('after'), request.args.get('before')
+    if after and before:
+        raise ValueError('Нужен только один из курсоров after и before')
+    return limit, decode_cursor(after) if after else None, decode_cursor(before) if before else None
+
+
+def paginate(fetch, limit, after=None, before=None):
+    """Страница событий и заголовки с курсорами.
+
+    fetch(n, after, before) возвращает до n событий по возрастанию (starts_at, id); просим на одно больше,
+    чтобы узнать, есть ли следующая (или, при before, предыдущая) страница.
+    """
+    events = fetch(limit + 1, after, before)
+    if before is not None:
+        has_prev, has_next = len(events) > limit, True
+        events = events[-limit:]
+    else:
+        has_prev, has_next = after is not None, len(events) > limit
+        events = events[:limit]
+
+    headers = {}
+    if events and has_next:
+        headers['X-Next-Cursor'] = encode_cursor(events[-1])
+    if events and has_prev:
+        headers['X-Prev-Cursor'] = encode_cursor(events[0])
+    return events, headers
+
+
+def keyset_page(query, limit, after=None, before=None):
+    """Применяет к запросу событий условие по курсору, порядок и LIMIT; строки - по возрастанию (starts_at, id)."""
+    # Условие на starts_at повторяет сравнение кортежей и даёт планировщику границу для индекса
+    if before is not None:
+        query = query.filter(Event.starts_at <= before[0], tuple_(Event.starts_at, Event.id) < before)
+        return query.order_by(Event.starts_at.desc(), Event.id.desc()).limit(limit).all()[::-1]
+    return keyset_query(query, limit, after).all()
+
+
+def keyset_query(query, limit, after=None):
+    """Запрос событий строго после ключа after по возрастанию (starts_at, id), не больше limit строк."""
+    if after is not None:
+        query = query.filter(Event.starts_at >= after[0], tuple_(Event.starts_at, Event.id) > after)
+    return query.order_by(Event.starts_at.asc(), Event.id.asc()).limit(limit)
+
+
+# Потоковая выдача списков: клиент с Accept: application/x-ndjson получает по строке JSON на запись,
+# строки читаются из серверного курсора пачками и сразу уходят клиенту, весь список в памяти не собирается
+NDJSON = 'application/x-ndjson'
+MAX_STREAM_ROWS = int(os.environ.get('MAX_STREAM_ROWS', 100000))
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 1000))
 
-from sqlalchemy.sql import func, expression
 
-@app.route('/upcoming_events', methods=['GET']) # Предстоящие события
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+
+def stream_params():
+    """(limit, after) для потоковой выдачи событий; ValueError с текстом ошибки."""
+    limit = request.args.get('limit', MAX_STREAM_ROWS, type=int)
+    if not 1 <= limit <= MAX_STREAM_ROWS:
+        raise ValueError(f'limit должен быть от 1 до {MAX_STREAM_ROWS}')
+    if request.args.get('before'):
+        raise ValueError('В потоке NDJSON поддерживается только курсор after')
+    after = request.args.get('after')
+    return limit, decode_cursor(after) if after else None
+
+
+def ndjson_response(query, to_dict):
+    """Ответ NDJSON: строки query, каждая через to_dict, читаются из серверного курсора."""
+    provider = current_app.json
+
+    def lines():
+        # Одна порция ответа на пачку строк, а не на каждую строку
+        batch = []
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            batch.append(dumps_bytes(provider, to_dict(row)))
+            if len(batch) == STREAM_BATCH_SIZE:
+                yield b'\n'.join(batch) + b'\n'
+                batch = []
+        if batch:
+            yield b'\n'.join(batch) + b'\n'
+
+    # stream_with_context держит сессию базы открытой, пока поток не дочитан
+    return current_app.response_class(stream_with_context(lines()), mimetype=NDJSON)
+
+
+@api.route('/upcoming_events', methods=['GET']) # Предстоящие события
 @require_api_key
 def get_upcoming_events():
-    # Объединяем date и time в одно значение datetime на уровне запроса
-    datetime_expr = expression.cast(Event.date, db.DateTime) + expression.cast(Event.time, db.Interval)
+    if wants_ndjson():
+        try:
+            limit, after = stream_params()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return ndjson_response(keyset_query(upcoming_events_query(), limit, after),
+                               lambda row: upcoming_event_dict(*row))
+    try:
+        limit, after, before = page_params(20)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Та же версия выбирает снимок событий, поэтому ETag один во всех воркерах и не меняется без изменений в базе
+    version = data_version('events', 'offices')
+    return conditional_json(version, lambda: paginate(
+        lambda n, page_after, page_before: upcoming_events(n, page_after, page_before, version), limit, after, before))
+
+
+def load_events_snapshot(per_office):
+    """По per_office ближайших событий каждого офиса для EventsSnapshot."""
+    # LATERAL: для каждого офиса короткий проход по индексу (office_id, starts_at)
+    office_events = db.select(
+        Event.id, Event.starts_at, Event.coach_id, Event.registered_participants, Event.max_participants
+    ).where(
+        Event.office_id == Office.id,
+        Event.starts_at >= func.localtimestamp()
+    ).order_by(
+        Event.starts_at.asc(), Event.id.asc()
+    ).limit(per_office).lateral()
 
     results = db.session.query(
+        office_events, Office.id.label('office_id'), Office.name.label('office_name')
+    ).select_from(Office).join(office_events, true()).all()
+
+    return [
+        (SnapshotEvent(row.id, row.starts_at, row.office_id, row.office_name, row.max_participants, row.coach_id),
+         row.registered_participants)
+        for row in results
+    ]
+
+
+def upcoming_events(limit=20, after=None, before=None, version=None):
+    """Предстоящие события из снимка или из базы; version - data_version('events', 'offices')."""
+    events = events_snapshot.upcoming(load_events_snapshot, datetime.now(), limit, after=after, before=before,
+                                      version=version)
+    if events is None:
+        # Версия в ключе: присоединиться можно только к запросу, начатому не раньше, чем стала видна эта версия
+        return query_coalescer.do(('upcoming_events', version, limit, after, before),
+                                  lambda: query_upcoming_events(limit, after, before))
+    return [
+        upcoming_event_dict(event.id, event.starts_at, event.office_name, seats, event.max_participants)
+        for event, seats in events
+    ]
+
+
+def upcoming_event_dict(event_id, starts_at, office_name, registered_participants, max_participants):
+    return {
+        'event_id': event_id,
+        # То же, что strftime('%Y-%m-%d %H:%M:%S'), но в несколько раз быстрее
+        'datetime': starts_at.isoformat(sep=' ', timespec='seconds'),
+        'office_name': office_name,
+        'registered_participants': registered_participants,
+        'max_participants': max_participants
+    }
+
+
+def query_upcoming_events(limit=20, after=None, before=None):
+    return [upcoming_event_dict(*event) for event in keyset_page(upcoming_events_query(), limit, after, before)]
+
+
+def upcoming_events_query():
+    # starts_at и счётчик записей хранятся в events, поэтому хватает прохода по индексу starts_at без GROUP BY.
+    # LOCALTIMESTAMP, а не now(): сравнение timestamp с timestamptz не дало бы использовать индекс
+    return db.session.query(
         Event.id,
-        datetime_expr.label('datetime'),
+        Event.starts_at.label('datetime'),
         Office.name.label('office_name'),
-        func.count(EventRegistration.id).label('registered_participants'),
+        Event.registered_participants,
         Event.max_participants
     ).join(Office, Event.office_id == Office.id
-    ).outerjoin(EventRegistration, EventRegistration.event_id == Event.id
     ).filter(
-        datetime_expr >= func.now()  # Фильтруем события, начиная с текущего момента
-    ).group_by(
-        Event.id, Office.name, Event.max_participants, datetime_expr
-    ).order_by(
-        datetime_expr.asc()
-    ).limit(20).all()
-
-    upcoming_events = [
-        {
-            'event_id': event.id,
-            'datetime': event.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-            'office_name': event.office_name,
-            'registered_participants': event.registered_participants,
-            'max_participants': event.max_participants
-        }
-        for event in results
-    ]
-
-    return jsonify(upcoming_events)
+        Event.starts_at >= func.localtimestamp()  # Фильтруем события, начиная с текущего момента
+    )
 
 
-@app.route('/available_events', methods=['GET'])  # Только события доступные для пользователя
+@api.route('/available_events', methods=['GET'])  # Только события доступные для пользователя
 @require_api_key
 def get_available_events():
     # Получаем telegram_id пользователя из параметров запроса
@@ -305,56 +1222,116 @@ def get_available_events():
         return jsonify({'error': 'Необходимо указать telegram_id пользователя'}), 400
 
     # Находим пользователя по telegram_id
-    user = User.query.filter_by(telegram_id=telegram_id).first()
+    user = get_user_ref(telegram_id)
     if not user:
         return jsonify({'error': 'Пользователь не найден'}), 404
 
-    datetime_expr = expression.cast(Event.date, db.DateTime) + expression.cast(Event.time, db.Interval)
+    if wants_ndjson():
+        try:
+            limit, after = stream_params()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return ndjson_response(keyset_query(available_events_query(user), limit, after), available_event_row)
 
-    # Получаем ID событий, на которые пользователь уже зарегистрирован
-    registered_event_ids = db.session.query(EventRegistration.event_id).filter_by(user_id=user.id).subquery()
+    try:
+        limit, after, before = page_params(8)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Записи самого пользователя меняют счётчик мест в events, поэтому отдельная версия для них не нужна
+    events_version, offices_version, coaches_version = data_versions('events', 'offices', 'coaches')
+    snapshot_version = f'{events_version}/{offices_version}'
+
+    def build():
+        # Справочник тренеров, загруженный при другой версии, перечитываем: ответ не старее своего ETag
+        coach_directory.sync(coaches_version, load_coaches)
+        return paginate(
+            lambda n, page_after, page_before: available_events(user, n, page_after, page_before, snapshot_version),
+            limit, after, before)
+
+    return conditional_json(f'{user.id}/{user.office}/{snapshot_version}/{coaches_version}', build)
 
+
+def available_events(user, limit=8, after=None, before=None, version=None):
+    """То же, что query_available_events, но из снимка событий и множества записей пользователя."""
+    registered_event_ids = {
+        event_id for event_id, in db.session.query(EventRegistration.event_id).filter_by(user_id=user.id)
+    }
+    events = events_snapshot.upcoming(load_events_snapshot, datetime.now(), limit, office_id=user.office or None,
+                                      exclude=registered_event_ids, after=after, before=before, version=version)
+    if events is None:
+        return coalesced_available_events(user, registered_event_ids, limit, after, before, version)
+    return [
+        available_event_dict(event.id, event.starts_at, event.office_name, seats, event.max_participants,
+                             event.coach_id)
+        for event, seats in events
+    ]
+
+
+def available_event_dict(event_id, starts_at, office_name, registered_participants, max_participants, coach_id):
+    coach = get_coach(coach_id)
+    return {
+        'event_id': event_id,
+        'datetime': starts_at.isoformat(sep=' ', timespec='seconds'),
+        'office_name': office_name,
+        'registered_participants': registered_participants,
+        'max_participants': max_participants,
+        'coach_name': coach.name if coach else None,
+        'coach_description': coach.description if coach else None
+    }
+
+
+def available_event_row(event):
+    # Описание тренера - из справочника, а не через JOIN с coaches
+    return available_event_dict(event.id, event.datetime, event.office_name, event.registered_participants,
+                                event.max_participants, event.coach_id)
+
+
+def coalesced_available_events(user, registered_event_ids, limit, after, before, version):
+    """То же, что query_available_events, но один запрос на всех пользователей офиса с той же страницей.
+
+    Общий запрос берёт события офиса без учёта записей с запасом в limit строк, записи пользователя
+    отбрасываются уже здесь. Если запаса не хватило, выполняется запрос только для этого пользователя.
+    """
+    office_id = user.office or None
+    fetched = query_coalescer.do(('available_events', version, office_id, limit, after, before),
+                                 lambda: keyset_page(office_events_query(office_id), limit * 2, after, before))
+    events = [event for event in fetched if event.id not in registered_event_ids]
+    if len(events) < limit and len(fetched) == limit * 2:
+        return query_available_events(user, limit, after, before)
+    events = events[-limit:] if before is not None else events[:limit]
+    return [available_event_row(event) for event in events]
+
+
+def query_available_events(user, limit=8, after=None, before=None):
+    """Ближайшие события, на которые пользователь ещё не записан (с учётом любимого офиса)."""
+    return [available_event_row(event) for event in keyset_page(available_events_query(user), limit, after, before)]
+
+
+def office_events_query(office_id):
+    """Предстоящие события офиса; без office_id - всех офисов."""
     query = db.session.query(
         Event.id,
-        datetime_expr.label('datetime'),
+        Event.starts_at.label('datetime'),
         Office.name.label('office_name'),
-        Event.coach,
-        func.count(EventRegistration.id).label('registered_participants'),
-        Event.max_participants,
-        Coach.name.label('coach_name'),
-        Coach.description.label('coach_description')
+        Event.coach_id,
+        Event.registered_participants,
+        Event.max_participants
     ).join(Office, Event.office_id == Office.id
-    ).outerjoin(EventRegistration, EventRegistration.event_id == Event.id
-    ).outerjoin(Coach, Coach.name == Event.coach
     ).filter(
-        datetime_expr >= func.now(),
-        ~Event.id.in_(registered_event_ids)
+        Event.starts_at >= func.localtimestamp()
     )
 
     # Применяем фильтрацию по офису только если у пользователя указан любимый офис
-    if user.office:
-        query = query.filter(Event.office_id == user.office)
+    if office_id:
+        query = query.filter(Event.office_id == office_id)
+    return query
 
-    results = query.group_by(
-        Event.id, Office.name, Event.max_participants, datetime_expr, Coach.name, Coach.description
-    ).order_by(
-        datetime_expr.asc()
-    ).limit(8).all()
-
-    available_events = [
-        {
-            'event_id': event.id,
-            'datetime': event.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-            'office_name': event.office_name,
-            'registered_participants': event.registered_participants,
-            'max_participants': event.max_participants,
-            'coach_name': event.coach_name,
-            'coach_description': event.coach_description
-        }
-        for event in results
-    ]
 
-    return jsonify(available_events)
+def available_events_query(user):
+    # Получаем ID событий, на которые пользователь уже зарегистрирован
+    registered_event_ids = db.select(EventRegistration.event_id).filter_by(user_id=user.id)
+    return office_events_query(user.office).filter(~Event.id.in_(registered_event_ids))
 
 
 from flask import request, jsonify
@@ -363,7 +1340,7 @@ from datetime import datetime
 
 from datetime import datetime, time
 
-@app.route('/user_events', methods=['GET'])  # События, на которые подписался пользователь
+@api.route('/user_events', methods=['GET'])  # События, на которые подписался пользователь
 @require_api_key
 def get_user_events():
     telegram_id = request.args.get('telegram_id')
@@ -372,10 +1349,38 @@ def get_user_events():
         return jsonify({'error': 'Необходимо указать telegram_id пользователя'}), 400
 
     # Находим пользователя по telegram_id
-    user = User.query.filter_by(telegram_id=telegram_id).first()
+    user = get_user_ref(telegram_id)
     if not user:
         return jsonify({'error': 'Пользователь не найден'}), 404
 
+    if wants_ndjson():
+        return ndjson_response(user_events_query(user), user_event_dict)
+
+    user_events = query_user_events(user)
+
+    if not user_events:
+        return jsonify({'message': 'No events found for this user.'}), 404
+
+    return jsonify(user_events)
+
+
+def query_user_events(user):
+    """Будущие события, на которые записан пользователь."""
+    return [user_event_dict(registration) for registration in user_events_query(user)]
+
+
+def user_event_dict(registration):
+    return {
+        'event_id': registration.EventRegistration.event_id,
+        'event_date': registration.date.isoformat(),
+        'event_time': registration.time.isoformat(timespec='minutes'),  # как strftime('%H:%M')
+        'office_name': registration.office_name,
+        'coach': registration.coach,
+        'max_participants': registration.max_participants
+    }
+
+
+def user_events_query(user):
     # Теперь флаг future_events всегда True, так как мы хотим видеть только будущие события
     future_events = True
 
@@ -391,85 +1396,245 @@ def get_user_events():
                   ).filter(EventRegistration.user_id == user.id)
 
     if future_events:
-        now = datetime.now()
-        # Объединяем дату и время события и сравниваем с текущим временем
-        query = query.filter(
-            (Event.date > now.date()) | ((Event.date == now.date()) & (Event.time > now.time())))
+        # Сравниваем начало события с текущим временем
+        query = query.filter(Event.starts_at > datetime.now())
+    return query
 
-    registrations = query.all()
 
-    if not registrations:
-        return jsonify({'message': 'No events found for this user.'}), 404
+@api.route('/event_registrations/refresh', methods=['POST'])  # Запись или отмена записи и свежие списки одним запросом
+@require_api_key
+def register_and_refresh():
+    data = request.get_json()
+    event_id = parse_event_id(data.get('event_id'))
+    telegram_id = data.get('telegram_id')
+    action = data.get('action', 'register')
 
-    user_events = [
-        {
-            'event_id': registration.EventRegistration.event_id,
-            'event_date': registration.date.isoformat(),
-            'event_time': registration.time.strftime('%H:%M'),
-            'office_name': registration.office_name,
-            'coach': registration.coach,
-            'max_participants': registration.max_participants
-        }
-        for registration in registrations
-    ]
+    if action not in ('register', 'unregister'):
+        return jsonify({'error': 'action должен быть register или unregister'}), 400
+    if event_id is None:
+        return jsonify({'error': 'Некорректный формат ID события. Ожидается целое число.'}), 400
 
-    return jsonify(user_events)
+    user = get_user_ref(telegram_id)
+    if not user:
+        return jsonify({'error': 'Пользователь не найден'}), 404
+
+    # Запись и чтение обновлённых списков - в одной транзакции, списки уже учитывают это изменение
+    try:
+        if action == 'register':
+            error = reserve_seat(event_id, user.id)
+            message, status = 'Вы успешно зарегистрированы на событие', 201
+        else:
+            error = release_seat(event_id, user.id)
+            message, status = 'Регистрация на событие удалена', 200
+        if error:
+            db.session.rollback()
+            return jsonify({'error': error[0]}), error[1]
+
+        available, headers = paginate(lambda n, after, before: query_available_events(user, n), 8)
+        result = {
+            'message': message,
+            'available_events': available,
+            # Курсор следующей страницы available_events, как X-Next-Cursor у /available_events
+            'available_next_cursor': headers.get('X-Next-Cursor'),
+            'user_events': query_user_events(user),
+        }
+        db.session.commit()
+        return jsonify(result), status
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
 from sqlalchemy.sql import func
 
 from datetime import datetime
 
 
-@app.route('/upcoming_event_registrations', methods=['GET'])
+@api.route('/upcoming_event_registrations', methods=['GET'])
 @require_api_key
 def get_upcoming_event_registrations():
+    # Необязательный фильтр по офису: явно через office_id или через любимый офис пользователя (telegram_id)
+    query = event_registrations_query(request.args.get('office_id', type=int),
+                                      request.args.get('telegram_id', type=int))
+    if wants_ndjson():
+        return ndjson_response(query, event_registration_dict)
+    return jsonify([event_registration_dict(registration) for registration in query])
+
+
+def event_registration_dict(registration):
+    return {
+        'user_name': registration.name,
+        'event_id': registration.event_id,
+        'event_date': registration.date.isoformat(),
+        'event_time': registration.time.isoformat(timespec='minutes'),  # как strftime('%H:%M')
+        'office_name': registration.office_name
+    }
+
+
+def event_registrations_query(office_id=None, telegram_id=None):
+    """Записавшиеся на ближайшие 10 событий (всех офисов, офиса office_id или любимого офиса пользователя)."""
     # Получаем текущее время
     now = datetime.now()
 
-    # Формируем запрос к базе данных, фильтруя события, которые еще не произошли
+    # Ближайшие 10 событий, которые еще не произошли - подзапрос, а не отдельный запрос
     upcoming_events_query = db.session.query(
         Event.id,
         Event.date,
         Event.time,
         Office.name.label('office_name')
     ).join(Office, Event.office_id == Office.id
-           ).filter(
-        db.or_(
-            db.and_(Event.date == now.date(), Event.time > now.time()),
-            Event.date > now.date()
-        )
-    ).order_by(Event.date.asc(), Event.time.asc()
-               ).limit(10)
-
-    event_registrations = []
-    for event in upcoming_events_query:
-        registrations = db.session.query(
-            User.name,
-            EventRegistration.event_id,
-            Event.date,
-            Event.time,
-            Office.name.label('office_name')
-        ).join(EventRegistration, EventRegistration.user_id == User.id
-               ).join(Event, EventRegistration.event_id == Event.id
-                      ).join(Office, Event.office_id == Office.id
-                             ).filter(EventRegistration.event_id == event.id
-                                      ).all()
-
-        for registration in registrations:
-            event_registrations.append({
-                'user_name': registration.name,
-                'event_id': registration.event_id,
-                'event_date': registration.date.isoformat(),
-                'event_time': registration.time.strftime('%H:%M'),
-                'office_name': registration.office_name
-            })
-
-    return jsonify(event_registrations)
-
-@app.route('/users/office/<int:telegram_id>', methods=['GET'])
+           ).filter(Event.starts_at > now)
+
+    if office_id is not None:
+        upcoming_events_query = upcoming_events_query.filter(Event.office_id == office_id)
+    elif telegram_id is not None:
+        # Если у пользователя нет любимого офиса, coalesce оставляет все офисы
+        favorite_office = db.session.query(User.office).filter(
+            User.telegram_id == telegram_id).limit(1).scalar_subquery()
+        upcoming_events_query = upcoming_events_query.filter(
+            Event.office_id == func.coalesce(favorite_office, Event.office_id))
+
+    upcoming_events = upcoming_events_query.order_by(
+        Event.starts_at.asc(), Event.id.asc()
+    ).limit(10).subquery()
+
+    # Весь список записавшихся одним запросом вместо запроса на каждое событие
+    return db.session.query(
+        User.name,
+        upcoming_events.c.id.label('event_id'),
+        upcoming_events.c.date,
+        upcoming_events.c.time,
+        upcoming_events.c.office_name
+    ).join(EventRegistration, EventRegistration.event_id == upcoming_events.c.id
+           ).join(User, EventRegistration.user_id == User.id
+                  ).order_by(
+        upcoming_events.c.date.asc(), upcoming_events.c.time.asc(), upcoming_events.c.id.asc(),
+        EventRegistration.id.asc()
+    )
+
+@api.route('/events/<int:event_id>/telegram_ids', methods=['GET'])  # Кому писать об изменениях события (рассылки бота)
+@require_api_key
+def get_event_telegram_ids(event_id):
+    if db.session.get(Event, event_id) is None:
+        return jsonify({'error': 'События не существует'}), 404
+    rows = db.session.query(User.telegram_id).join(
+        EventRegistration, EventRegistration.user_id == User.id
+    ).filter(
+        EventRegistration.event_id == event_id, User.telegram_id.isnot(None)
+    ).order_by(EventRegistration.id)
+    return jsonify([row.telegram_id for row in rows]), 200
+
+
+MAX_REMINDER_BATCH = int(os.environ.get('MAX_REMINDER_BATCH', 1000))
+
+
+@api.route('/reminders/due', methods=['GET'])  # Наступившие напоминания о занятиях (их забирает outbox.py бота)
+@require_api_key
+def get_due_reminders():
+    """Самые ранние напоминания с due_at не позже текущего момента; по индексу due_at, без прохода по записям.
+
+    Отдача ничего не меняет: бот ставит сообщения в очередь и подтверждает их через /reminders/ack,
+    поэтому после падения бота между этими шагами напоминания просто придут снова.
+    """
+    limit = min(request.args.get('limit', 100, type=int), MAX_REMINDER_BATCH)
+    rows = db.session.query(
+        Reminder.registration_id,
+        Reminder.due_at,
+        User.telegram_id,
+        Event.id.label('event_id'),
+        Event.date,
+        Event.time,
+        Event.coach,
+        Office.name.label('office_name')
+    ).join(EventRegistration, EventRegistration.id == Reminder.registration_id
+           ).join(User, User.id == EventRegistration.user_id
+                  ).join(Event, Event.id == EventRegistration.event_id
+                         ).join(Office, Office.id == Event.office_id
+                                ).filter(Reminder.due_at <= datetime.now()
+                                         ).order_by(Reminder.due_at, Reminder.registration_id).limit(limit)
+    return jsonify([{
+        'registration_id': row.registration_id,
+        'due_at': row.due_at.isoformat(),
+        'telegram_id': row.telegram_id,
+        'event_id': row.event_id,
+        'event_date': row.date.isoformat(),
+        'event_time': row.time.isoformat(timespec='minutes'),
+        'coach': row.coach,
+        'office_name': row.office_name,
+    } for row in rows]), 200
+
+
+@api.route('/reminders/ack', methods=['POST'])  # Напоминания поставлены в очередь бота - удалить
+@require_api_key
+def ack_reminders():
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    try:
+        keys = {(item['registration_id'], datetime.fromisoformat(item['due_at'])) for item in items}
+    except (TypeError, KeyError, ValueError):
+        return jsonify({'error': 'Ожидается список items из объектов {registration_id, due_at}'}), 400
+    if len(keys) > MAX_REMINDER_BATCH:
+        return jsonify({'error': f'Не больше {MAX_REMINDER_BATCH} напоминаний за запрос'}), 413
+
+    deleted = 0
+    if keys:
+        # Вместе с due_at: напоминание, которое успели перенести вместе с событием, остаётся в очереди
+        deleted = db.session.execute(
+            delete(Reminder).where(tuple_(Reminder.registration_id, Reminder.due_at).in_(keys))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    return jsonify({'deleted': deleted}), 200
+
+
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', 10000))
+
+
+@api.route('/exports/registrations', methods=['GET'])  # Выгрузка записей за период для отчётов по посещаемости
+@require_api_key
+def export_registrations():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return jsonify({'error': f"format должен быть одним из: {', '.join(exports.FORMATS)}"}), 400
+    if fmt == 'parquet' and not exports.parquet_available():
+        return jsonify({'error': 'Выгрузка в Parquet недоступна: не установлен pyarrow'}), 501
+    try:
+        date_from = date.fromisoformat(request.args.get('date_from', ''))
+        date_to = date.fromisoformat(request.args.get('date_to', ''))
+    except ValueError:
+        return jsonify({'error': 'Нужны date_from и date_to в формате YYYY-MM-DD'}), 400
+    if date_to < date_from:
+        return jsonify({'error': 'date_to раньше date_from'}), 400
+    office_id = request.args.get('office_id', type=int)
+
+    chunks = exports.export_chunks(db.session, fmt, date_from, date_to, office_id, EXPORT_FETCH_SIZE)
+    filename = f"registrations_{date_from}_{date_to}{f'_office{office_id}' if office_id else ''}.{fmt}"
+    return current_app.response_class(stream_with_context(chunks), mimetype=exports.MIMETYPES[fmt],
+                                      headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@api.route('/analytics/attendance', methods=['GET'])  # Заполняемость и отмены из сводки attendance_daily
+@require_api_key
+def get_attendance_analytics():
+    group_by = [name.strip() for name in request.args.get('group_by', 'office').split(',') if name.strip()]
+    unknown = [name for name in group_by if name not in analytics.GROUPINGS]
+    if not group_by or unknown:
+        return jsonify({'error': f"group_by - через запятую из: {', '.join(analytics.GROUPINGS)}"}), 400
+    try:
+        date_from = date.fromisoformat(request.args.get('date_from', ''))
+        date_to = date.fromisoformat(request.args.get('date_to', ''))
+    except ValueError:
+        return jsonify({'error': 'Нужны date_from и date_to в формате YYYY-MM-DD'}), 400
+    if date_to < date_from:
+        return jsonify({'error': 'date_to раньше date_from'}), 400
+    office_id = request.args.get('office_id', type=int)
+
+    return jsonify(analytics.attendance(db.session, date_from, date_to, list(dict.fromkeys(group_by)), office_id)), 200
+
+
+@api.route('/users/office/<int:telegram_id>', methods=['GET'])
 @require_api_key
 def get_user_office(telegram_id):
-    user = User.query.filter_by(telegram_id=telegram_id).first()
+    user = get_user_ref(telegram_id)
     if not user:
         return jsonify({'error': 'Пользователь не найден'}), 404
     if user.office:
@@ -479,10 +1644,10 @@ def get_user_office(telegram_id):
         return jsonify({'message': 'У пользователя не установлен любимый офис'}), 404
 
 
-@app.route('/users/office/<int:telegram_id>', methods=['PUT'])
+@api.route('/users/office/<int:telegram_id>', methods=['PUT'])
 @require_api_key
 def update_user_office(telegram_id):
-    user = User.query.filter_by(telegram_id=telegram_id).first()
+    user = get_user_ref(telegram_id)
     if not user:
         return jsonify({'error': 'Пользователь не найден'}), 404
 
@@ -491,75 +1656,38 @@ def update_user_office(telegram_id):
     if office_id is None or not isinstance(office_id, int):
         return jsonify({'error': 'Некорректный формат ID офиса. Ожидается целое число.'}), 400
 
-    user.office = office_id
-
     try:
+        # Обновляем одну колонку по первичному ключу, не загружая строку пользователя целиком
+        result = db.session.execute(
+            update(User).where(User.id == user.id).values(office=office_id)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            # Пользователь удалён из базы, а запись кэша ещё жива
+            db.session.rollback()
+            user_cache.invalidate(telegram_id)
+            return jsonify({'error': 'Пользователь не найден'}), 404
         db.session.commit()
+        user_cache.put(telegram_id, user._replace(office=office_id))
         return jsonify({'message': 'Любимый офис пользователя успешно обновлён'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
-# Дальше админка
-
-from flask_admin import Admin
-from flask_admin.contrib.sqla import ModelView
-
-class EventModelView(ModelView):
-    form_columns = ['date', 'time', 'coach', 'office_id', 'max_participants']
-
-
-from flask_admin.contrib.sqla import ModelView
-
-
-class EventRegistrationModelView(ModelView):
-    column_list = ('id', 'user', 'event.office', 'event.coach', 'event.date', 'event.time')
-    column_sortable_list = (
-    'id', ('user', 'user.name'), ('event.office', 'event.office.name'), ('event.coach', 'event.coach'),
-    ('event.date', 'event.date'), ('event.time', 'event.time'))
-
-    def _user_formatter(view, context, model, name):
-        # Убедитесь, что обращение к связанному пользователю корректно
-        return model.user.name if model.user else ''
-
-    column_formatters = {
-        'user': _user_formatter,
-    }
-
-    column_labels = {
-        'user': 'User Name',
-        'event.office': 'Office Name',
-        'event.coach': 'Coach',
-        'event.date': 'Date',
-        'event.time': 'Time'
-    }
-
-    def _user_formatter(view, context, model, name):
-        if model.user:
-            return model.user.name
-        return ''
-
-    def _office_formatter(view, context, model, name):
-        if model.event and model.event.office:
-            return model.event.office.name
-        return ''
-
-    column_formatters = {
-        'user': _user_formatter,
-        'event.office': _office_formatter,
-    }
-
-# Создание экземпляра административного интерфейса
-admin = Admin(app, name='MyApp Admin', template_mode='bootstrap3')
-
-# Добавление моделей в административный интерфейс
-admin.add_view(ModelView(User, db.session))
-admin.add_view(EventRegistrationModelView(EventRegistration, db.session, name='Заявки на йогу'))
-admin.add_view(ModelView(Office, db.session))
-admin.add_view(EventModelView(Event, db.session))
-
-
-
+@api.route('/metrics', methods=['GET'])  # Счётчики кэшей процесса
+@require_api_key
+def get_metrics():
+    return jsonify({
+        'user_cache': user_cache.stats(),
+        'events_snapshot': events_snapshot.stats(),
+        'query_coalescing': query_coalescer.stats(),
+        'coach_directory': coach_directory.stats(),
+        'compression': (current_app.extensions['compression'].stats()
+                        if 'compression' in current_app.extensions else None),
+    }), 200
+
+
+# Сервер разработки; в продакшене - gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8081)
\ No newline at end of file
+    create_app().run(host=os.environ.get('API_HOST', '0.0.0.0'), port=int(os.environ.get('API_PORT', 8081)))
\ No newline at end of file
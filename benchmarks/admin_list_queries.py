@@ -0,0 +1,95 @@
+# Число SQL-запросов и время на одну страницу списков админки (Flask-Admin), и чего стоит точный count(*)
+# по большой таблице записей по сравнению с оценкой из pg_class.
+# Записи вставляются в случайном порядке, чтобы на одной странице были разные пользователи, события и офисы.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/admin_list_queries.py --users 2000 --events 500 --offices 20 --registrations 300000
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event as sa_event  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+
+app = create_app(components=['admin'])
+
+PAGES = ['/admin/eventregistration/', '/admin/eventregistration/?sort=1', '/admin/user/', '/admin/event/']
+
+
+def prepare(users, events, offices, registrations):
+    with app.app_context():
+        db.create_all()
+        if db.session.execute(db.text('SELECT count(*) FROM event_registration')).scalar() >= registrations:
+            return
+        db.session.execute(db.text(
+            "INSERT INTO offices (name, address) SELECT 'Офис ' || i, 'Адрес ' || i FROM generate_series(1, :n) AS i"),
+            {'n': offices})
+        db.session.execute(db.text(
+            "INSERT INTO users (telegram_id, name, role, info) "
+            "SELECT 9200000000 + i, 'Пользователь ' || i, 'user', "
+            "       json_build_object('bio', repeat('о себе ', 200), 'tags', json_build_array('йога', 'утро')) "
+            "FROM generate_series(1, :n) AS i"), {'n': users})
+        db.session.execute(db.text(
+            "INSERT INTO events (date, time, coach, office_id, max_participants) "
+            "SELECT current_date + i / 10, make_time(8 + i % 10, 0, 0), 'Тренер ' || i % 7, "
+            "       (SELECT min(id) FROM offices) + i % :offices, 100000 "
+            "FROM generate_series(0, :n - 1) AS i"), {'n': events, 'offices': offices})
+        # Случайный порядок: соседние по id записи - от разных пользователей на разные события
+        db.session.execute(db.text(
+            "INSERT INTO event_registration (user_id, event_id) "
+            "SELECT u.id, e.id FROM users u CROSS JOIN events e ORDER BY random() LIMIT :n"), {'n': registrations})
+        db.session.commit()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--offices', type=int, default=20)
+    parser.add_argument('--registrations', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    prepare(args.users, args.events, args.offices, args.registrations)
+    with app.app_context():
+        engine = db.engine
+
+    statements = []
+    lock = threading.Lock()
+
+    @sa_event.listens_for(engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, *_):
+        with lock:
+            statements.append(statement)
+
+    client = app.test_client()
+    for path in PAGES:
+        client.get(path)
+        statements.clear()
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            response = client.get(path)
+        elapsed = (time.perf_counter() - started) / args.repeat
+        per_page = len(statements) / args.repeat
+        print(f'{path:<36} status={response.status_code} {per_page:5.0f} queries/page  {elapsed * 1000:6.1f} ms/page')
+
+    with app.app_context():
+        for title, sql in (('count(*)', 'SELECT count(*) FROM event_registration'),
+                           ('pg_class estimate', "SELECT reltuples::bigint FROM pg_class "
+                                                 "WHERE oid = to_regclass('event_registration')")):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                value = db.session.execute(db.text(sql)).scalar()
+            elapsed = (time.perf_counter() - started) / args.repeat
+            print(f'{title:<20} {value:>9} rows  {elapsed * 1000:6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# Отчёт /analytics/attendance из сводки attendance_daily против того же отчёта прямым GROUP BY по events
+# и event_registration, полная сверка сводки и цена ведения сводки на одну запись и отмену записи через API.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/analytics_rollup.py --users 2500 --events 2000 --offices 10
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event as sa_event  # noqa: E402
+
+import analytics  # noqa: E402
+import app as app_module  # noqa: E402
+from app import create_app, db  # noqa: E402
+
+app = create_app(components=[])
+
+# То же, что analytics.GROUPINGS, но по строкам events
+RAW_GROUPINGS = {
+    'office': 'e.office_id',
+    'coach': 'e.coach',
+    'weekday': 'CAST(extract(isodow FROM e.date) AS integer)',
+    'week': 'CAST(date_trunc(\'week\', e.date) AS date)',
+}
+
+RAW_SQL = '''
+SELECT {expression}, count(*), sum(e.max_participants), sum(r.registrations)
+FROM events e
+CROSS JOIN LATERAL (SELECT count(*) AS registrations FROM event_registration WHERE event_id = e.id) r
+WHERE e.starts_at >= :date_from AND e.starts_at < CAST(:date_to AS date) + 1
+GROUP BY 1
+ORDER BY 1
+'''
+
+
+def prepare(users, events, offices):
+    """users x events записей; по 10 событий в день с завтрашнего, офисы и 6 тренеров по кругу."""
+    with app.app_context():
+        db.create_all()
+        if db.session.execute(db.text('SELECT count(*) FROM event_registration')).scalar() >= users * events:
+            return
+        db.session.execute(db.text(
+            "INSERT INTO offices (name, address) SELECT 'Офис ' || i, '-' FROM generate_series(1, :n) AS i"),
+            {'n': offices})
+        db.session.execute(db.text(
+            "INSERT INTO users (telegram_id, name, role) "
+            "SELECT 9400000000 + i, 'Пользователь ' || i, 'user' FROM generate_series(1, :n) AS i"), {'n': users})
+        db.session.execute(db.text(
+            "INSERT INTO events (date, time, coach, office_id, max_participants, registered_participants) "
+            "SELECT current_date + 1 + i / 10, make_time(8 + i % 10, 0, 0), 'Тренер ' || i % 6, "
+            "       (SELECT min(id) FROM offices) + i % :offices, :n * 2, :n "
+            "FROM generate_series(0, :events - 1) AS i"), {'offices': offices, 'n': users, 'events': events})
+        db.session.execute(db.text(
+            "INSERT INTO event_registration (user_id, event_id, created_at) "
+            "SELECT u.id, e.id, now() FROM events e CROSS JOIN users u"))
+        db.session.commit()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return result, statistics.median(times)
+
+
+def compare_reports(date_from, date_to, repeat):
+    with app.app_context():
+        for name, expression in RAW_GROUPINGS.items():
+            raw, raw_time = timed(lambda: [tuple(int(v) if i else v for i, v in enumerate(row)) for row in db.session.execute(
+                db.text(RAW_SQL.format(expression=expression)), {'date_from': date_from, 'date_to': date_to})], repeat)
+            rollup, rollup_time = timed(lambda: analytics.attendance(db.session, date_from, date_to, [name]), repeat)
+            field = analytics.GROUPINGS[name][1]
+            same = raw == [(row[field], row['events'], row['capacity'], row['registrations']) for row in rollup]
+            print(f'  group_by={name:<8} {len(rollup):>4} rows  raw {raw_time * 1000:8.1f} ms  '
+                  f'rollup {rollup_time * 1000:6.2f} ms  x{raw_time / rollup_time:7.0f}  same={same}')
+
+
+def write_latency(telegram_ids, event_id, rollup):
+    """Медиана POST /event_registrations и /event_registrations/delete с ведением сводки и без него."""
+    hook = app_module._update_attendance_rollup
+    if not rollup:
+        sa_event.remove(db.session, 'before_commit', hook)
+    client = app.test_client()
+    headers = {'X-API-KEY': os.environ.get('API_KEY')}
+    try:
+        timings = {'register': [], 'cancel': []}
+        for path, kind in (('/event_registrations', 'register'), ('/event_registrations/delete', 'cancel')):
+            for telegram_id in telegram_ids:
+                started = time.perf_counter()
+                response = client.post(path, json={'event_id': event_id, 'telegram_id': telegram_id}, headers=headers)
+                timings[kind].append(time.perf_counter() - started)
+                assert response.status_code in (200, 201), response.get_json()
+        return {kind: statistics.median(values) for kind, values in timings.items()}
+    finally:
+        if not rollup:
+            sa_event.listen(db.session, 'before_commit', hook)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=2500)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--offices', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--writes', type=int, default=500)
+    args = parser.parse_args()
+
+    prepare(args.users, args.events, args.offices)
+    first = date.today() + timedelta(days=1)
+    last = first + timedelta(days=args.events // 10)
+
+    with app.app_context():
+        registrations = db.session.execute(db.text('SELECT count(*) FROM event_registration')).scalar()
+        started = time.perf_counter()
+        fixed = analytics.reconcile(db.session, first, last)
+        print(f'{registrations} registrations; full reconcile {first} - {last}: '
+              f'{time.perf_counter() - started:.1f} s, {fixed} rows fixed')
+        rollup_rows = db.session.execute(db.text('SELECT count(*) FROM attendance_daily')).scalar()
+        print(f'attendance_daily: {rollup_rows} rows')
+
+    for title, date_to in (('one month', first + timedelta(days=30)), ('everything', last)):
+        print(f'{title} ({first} - {date_to}):')
+        compare_reports(first, date_to, args.repeat)
+
+    with app.app_context():
+        office_id = db.session.execute(db.text('SELECT min(id) FROM offices')).scalar()
+        event_id = db.session.execute(db.text(
+            "INSERT INTO events (date, time, coach, office_id, max_participants) "
+            "VALUES (current_date + 1, '21:00', 'Тренер записи', :office_id, 100000) "
+            "ON CONFLICT (office_id, date, time) DO UPDATE SET max_participants = EXCLUDED.max_participants "
+            "RETURNING id"),
+            {'office_id': office_id}).scalar()
+        telegram_ids = [row[0] for row in db.session.execute(db.text(
+            'SELECT telegram_id FROM users ORDER BY id LIMIT :n'), {'n': args.writes})]
+        db.session.commit()
+    for rollup in (False, True):
+        latency = write_latency(telegram_ids, event_id, rollup)
+        print(f'rollup {"on " if rollup else "off"}: register {latency["register"] * 1000:5.2f} ms  '
+              f'cancel {latency["cancel"] * 1000:5.2f} ms (median of {len(telegram_ids)})')
+
+
+if __name__ == '__main__':
+    main()
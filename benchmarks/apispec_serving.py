@@ -0,0 +1,52 @@
+# Стоимость ответа /apispec_1.json: стандартное представление Flasgger (собирает и сериализует спецификацию
+# на каждый запрос) против заранее сериализованных и сжатых байтов из swagger_spec.PrecompressedSpec.
+# База не нужна.
+#
+#   python benchmarks/apispec_serving.py --requests 2000
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flasgger import Swagger  # noqa: E402
+from app import create_app  # noqa: E402
+from swagger import swagger_template  # noqa: E402
+
+
+def measure(app, accept_encoding, requests):
+    view = app.view_functions['flasgger.apispec_1']
+    with app.test_request_context('/apispec_1.json', headers={'Accept-Encoding': accept_encoding}):
+        for _ in range(50):
+            view()
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = view()
+        elapsed = time.perf_counter() - started
+    return elapsed / requests, len(response.get_data()), response.headers.get('Content-Encoding', 'identity')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    flasgger_app = create_app(components=[])
+    Swagger(flasgger_app, template=swagger_template)
+    precompressed_app = create_app(components=['swagger'])
+
+    cases = [
+        ('flasgger', flasgger_app, 'gzip, br'),
+        ('precompressed', precompressed_app, ''),
+        ('precompressed', precompressed_app, 'gzip'),
+        ('precompressed', precompressed_app, 'gzip, br'),
+    ]
+    for name, app, accept_encoding in cases:
+        per_request, size, encoding = measure(app, accept_encoding, args.requests)
+        print(f'{name:<14} {encoding:<9} {per_request * 1e6:8.1f} мкс/запрос  {size:>6} байт')
+
+
+if __name__ == '__main__':
+    main()
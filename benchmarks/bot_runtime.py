@@ -0,0 +1,167 @@
+# Сравнение синхронного бота (bot.py, как в bot.polling) и асинхронного (bot_async.py) на пачке обновлений.
+# Telegram и API подменяются локальным HTTP-сервером с настраиваемыми задержками, сеть не нужна.
+# Каждое обновление - "Записаться на йогу": один запрос /available_events и один sendMessage.
+#
+#   python benchmarks/bot_runtime.py --updates 2000 --chats 500 --api-delay 0.05 --telegram-delay 0.02
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TELEGRAM_TOKEN', '123:benchmark')
+
+import telebot  # noqa: E402
+from telebot import apihelper, asyncio_helper, types  # noqa: E402
+
+EVENTS = [
+    {'event_id': i, 'datetime': '2030-01-0%d 12:30:00' % (i % 9 + 1), 'office_name': 'Динамо',
+     'registered_participants': 5, 'max_participants': 20, 'coach_name': 'Coach',
+     'coach_description': 'Хатха-йога'}
+    for i in range(8)
+]
+
+
+class FakeServer:
+    def __init__(self, api_delay, telegram_delay):
+        self.api_delay = api_delay
+        self.telegram_delay = telegram_delay
+        self.sent = defaultdict(list)  # chat_id -> время каждого sendMessage
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _params(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode() if length else ''
+                params = parse_qs(urlparse(self.path).query)
+                params.update(parse_qs(body))
+                return {k: v[0] for k, v in params.items()}
+
+            def do_GET(self):
+                self.do_POST()
+
+            def do_POST(self):
+                params = self._params()
+                path = urlparse(self.path).path
+                if path.startswith('/bot'):
+                    time.sleep(server.telegram_delay)
+                    chat_id = int(params.get('chat_id', 0))
+                    with server.lock:
+                        server.sent[chat_id].append(time.perf_counter())
+                    self._reply({'ok': True, 'result': {
+                        'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}, 'text': ''}})
+                else:
+                    time.sleep(server.api_delay)
+                    self._reply(EVENTS)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def delivered(self):
+        with self.lock:
+            return sum(len(v) for v in self.sent.values())
+
+    def reset(self):
+        with self.lock:
+            self.sent.clear()
+
+
+def make_updates(count, chats):
+    return [
+        types.Update.de_json({
+            'update_id': i,
+            'message': {
+                'message_id': i, 'date': 0, 'text': 'Записаться на йогу',
+                'chat': {'id': 1 + i % chats, 'type': 'private'},
+                'from': {'id': 1 + i % chats, 'is_bot': False, 'first_name': 'User'},
+            },
+        })
+        for i in range(count)
+    ]
+
+
+def report(title, server, started, count):
+    latencies = sorted(t - started for times in server.sent.values() for t in times)
+    elapsed = latencies[-1]
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f'{title}: {count / elapsed:.1f} updates/s, p50={p50 * 1000:.0f} ms, p99={p99 * 1000:.0f} ms, total={elapsed:.2f} s')
+
+
+def run_sync(server, updates):
+    import bot
+
+    bot.api.base_url = server.url
+    started = time.perf_counter()
+    # Как bot.polling: пачки до 100 обновлений, обработчики в пуле потоков TeleBot
+    for i in range(0, len(updates), 100):
+        bot.bot.process_new_updates(updates[i:i + 100])
+    while server.delivered() < len(updates):
+        time.sleep(0.01)
+    report('sync  (bot.py)      ', server, started, len(updates))
+
+
+def run_async(server, updates):
+    import bot_async
+
+    bot_async.api.base_url = server.url
+
+    async def main():
+        dispatcher = bot_async.ChatDispatcher(bot_async.handle_update)
+        started = time.perf_counter()
+        for update in updates:
+            dispatcher.submit(update)
+        await dispatcher.join()
+        await bot_async.api.close()
+        await bot_async.bot.close_session()
+        return started
+
+    started = asyncio.run(main())
+    report('async (bot_async.py)', server, started, len(updates))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--api-delay', type=float, default=0.05)
+    parser.add_argument('--telegram-delay', type=float, default=0.02)
+    parser.add_argument('--skip-sync', action='store_true')
+    args = parser.parse_args()
+
+    server = FakeServer(args.api_delay, args.telegram_delay)
+    apihelper.API_URL = server.url + '/bot{0}/{1}'
+    asyncio_helper.API_URL = server.url + '/bot{0}/{1}'
+    telebot.logger.setLevel('CRITICAL')
+
+    print(f'updates={args.updates} chats={args.chats} api_delay={args.api_delay}s telegram_delay={args.telegram_delay}s')
+    if not args.skip_sync:
+        run_sync(server, make_updates(args.updates, args.chats))
+        server.reset()
+    run_async(server, make_updates(args.updates, args.chats))
+
+
+if __name__ == '__main__':
+    main()
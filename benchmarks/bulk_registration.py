@@ -0,0 +1,82 @@
+# Пакетная запись и отмена записи на N пар (telegram_id, event_id) против поштучных запросов.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/bulk_registration.py --items 10000 --events 50 --single-sample 500
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta, time as dt_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event as sa_event  # noqa: E402
+
+from app import create_app, db, User, Office, Event  # noqa: E402
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--events', type=int, default=50)
+    # Сколько пар прогнать поштучными POST /event_registrations для сравнения
+    parser.add_argument('--single-sample', type=int, default=500)
+    args = parser.parse_args()
+
+    headers = {'X-API-KEY': os.environ.get('API_KEY')}
+    base_telegram_id = 8_000_000_000
+    users_per_event = -(-args.items // args.events)
+
+    with app.app_context():
+        db.create_all()
+        office = Office(name='Benchmark office', address='-')
+        db.session.add(office)
+        db.session.flush()
+        events = [Event(date=date.today() + timedelta(days=1 + i // 12), time=dt_time(8 + i % 12, 0),
+                        coach='Benchmark', office_id=office.id, max_participants=users_per_event * 2)
+                  for i in range(args.events * 2)]
+        db.session.add_all(events)
+        db.session.add_all([User(name=f'bench {i}', telegram_id=base_telegram_id + i, role='user')
+                            for i in range(users_per_event)])
+        db.session.commit()
+        bulk_events = [event.id for event in events[:args.events]]
+        single_events = [event.id for event in events[args.events:]]
+
+        statements = [0]
+        sa_event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    def pairs(event_ids, count):
+        return [{'telegram_id': base_telegram_id + i // len(event_ids), 'event_id': event_ids[i % len(event_ids)]}
+                for i in range(count)]
+
+    client = app.test_client()
+
+    items = pairs(bulk_events, args.items)
+    statements[0] = 0
+    started = time.perf_counter()
+    response = client.post('/event_registrations/bulk', headers=headers, json={'items': items})
+    elapsed = time.perf_counter() - started
+    print(f'bulk create:  {args.items} items in {elapsed:.2f}s ({args.items / elapsed:.0f} items/s), '
+          f'created={response.json["created"]}, statements={statements[0]}')
+
+    statements[0] = 0
+    started = time.perf_counter()
+    response = client.post('/event_registrations/bulk_delete', headers=headers, json={'items': items})
+    elapsed = time.perf_counter() - started
+    print(f'bulk delete:  {args.items} items in {elapsed:.2f}s ({args.items / elapsed:.0f} items/s), '
+          f'deleted={response.json["deleted"]}, statements={statements[0]}')
+
+    sample = pairs(single_events, args.single_sample)
+    statements[0] = 0
+    started = time.perf_counter()
+    for item in sample:
+        client.post('/event_registrations', headers=headers, json=item)
+    elapsed = time.perf_counter() - started
+    print(f'single create: {len(sample)} items in {elapsed:.2f}s ({len(sample) / elapsed:.0f} items/s), '
+          f'statements={statements[0]}')
+
+
+if __name__ == '__main__':
+    main()
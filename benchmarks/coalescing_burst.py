@@ -0,0 +1,89 @@
+# Всплеск одинаковых запросов, как после анонса занятия в общем чате: N клиентов одновременно
+# запрашивают /upcoming_events. Сравниваем число SQL-запросов и время с объединением запросов и без него.
+# Снимок событий выключен, чтобы каждый запрос доходил до базы.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/coalescing_burst.py --requests 1000 --events 1000
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta, time as dt_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Без объединения запросы стоят в очереди за соединениями пула дольше обычного таймаута
+os.environ.setdefault('DB_POOL_TIMEOUT', '60')
+
+from sqlalchemy import event as sa_event  # noqa: E402
+
+import app as api  # noqa: E402
+from app import create_app, db, Office, Event  # noqa: E402
+
+app = create_app()
+
+
+def burst(path, count):
+    """count потоков стартуют одновременно; возвращает статусы ответов и время всего всплеска."""
+    api_key = os.environ.get('API_KEY')
+    barrier = threading.Barrier(count + 1)
+    statuses = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        with app.test_client() as client:
+            statuses[i] = client.get(path, headers={'X-API-KEY': api_key}).status_code
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return statuses, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--path', default='/upcoming_events')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        office = Office(name='Benchmark office', address='-')
+        db.session.add(office)
+        db.session.flush()
+        start = date.today() + timedelta(days=1)
+        db.session.add_all([
+            Event(date=start + timedelta(days=i // 10), time=dt_time(8 + i % 10), coach='Benchmark',
+                  office_id=office.id, max_participants=20)
+            for i in range(args.events)
+        ])
+        db.session.commit()
+        engine = db.engine
+
+    statements = [0]
+    lock = threading.Lock()
+
+    @sa_event.listens_for(engine, 'before_cursor_execute')
+    def count(*_):
+        with lock:
+            statements[0] += 1
+
+    api.events_snapshot.ttl = 0
+    print(f'requests={args.requests} path={args.path}')
+    for title, timeout in (('without coalescing', 0), ('with coalescing   ', 5)):
+        api.query_coalescer = type(api.query_coalescer)(timeout=timeout)
+        statements[0] = 0
+        statuses, elapsed = burst(args.path, args.requests)
+        stats = api.query_coalescer.stats()
+        print(f'{title}: {elapsed:.2f} s, {args.requests / elapsed:.0f} req/s, SQL statements={statements[0]}, '
+              f'executions={stats["executions"]}, shared={stats["shared"]}, timeouts={stats["timeouts"]}, '
+              f'non-200={sum(status != 200 for status in statuses)}')
+
+
+if __name__ == '__main__':
+    main()
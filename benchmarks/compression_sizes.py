@@ -0,0 +1,92 @@
+# Размер ответа на проводе и процессорное время сжатия для типичных списков записавшихся
+# (/upcoming_event_registrations: 10 ближайших событий по N участников) и страниц событий.
+# Сравнивает уровни gzip и brotli: выбранные по умолчанию в compression.py и соседние.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/compression_sizes.py --roster 5 20 50 --repeat 50
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import brotli  # noqa: E402
+from app import create_app, db  # noqa: E402
+
+app = create_app(components=[])
+
+CODECS = [('gzip', level) for level in (1, 5, 9)]
+if brotli is not None:
+    CODECS += [('br', quality) for quality in (1, 4, 11)]
+
+
+def compress(body, codec, level):
+    if codec == 'br':
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def prepare(max_roster):
+    with app.app_context():
+        db.create_all()
+        office_id = db.session.execute(db.text(
+            "INSERT INTO offices (name, address) VALUES ('Офис на Лесной, 5 этаж', '-') RETURNING id")).scalar()
+        db.session.execute(db.text(
+            "INSERT INTO events (date, time, coach, office_id, max_participants) "
+            "SELECT current_date + 1 + i / 5, make_time(8 + i % 5 * 2, 0, 0), 'Анна Петрова', :office_id, 100 "
+            "FROM generate_series(0, 49) AS i"), {'office_id': office_id})
+        db.session.execute(db.text(
+            "INSERT INTO users (telegram_id, name, role, office) "
+            "SELECT 9100000000 + i, 'Участник ' || i, 'user', :office_id FROM generate_series(0, :n - 1) AS i "
+            "ON CONFLICT DO NOTHING"), {'office_id': office_id, 'n': max_roster})
+        db.session.commit()
+        return office_id
+
+
+def set_roster(office_id, size):
+    """По size записей на каждое событие офиса."""
+    with app.app_context():
+        db.session.execute(db.text(
+            "DELETE FROM event_registration WHERE event_id IN (SELECT id FROM events WHERE office_id = :office_id)"),
+            {'office_id': office_id})
+        db.session.execute(db.text(
+            "INSERT INTO event_registration (user_id, event_id) "
+            "SELECT u.id, e.id FROM events e CROSS JOIN LATERAL ("
+            "  SELECT id FROM users WHERE telegram_id >= 9100000000 ORDER BY telegram_id LIMIT :size) u "
+            "WHERE e.office_id = :office_id"), {'office_id': office_id, 'size': size})
+        db.session.commit()
+
+
+def report(name, body, repeat):
+    print(f'{name}: {len(body)} bytes uncompressed')
+    for codec, level in CODECS:
+        started = time.process_time()
+        for _ in range(repeat):
+            compressed = compress(body, codec, level)
+        cpu = (time.process_time() - started) / repeat
+        print(f'  {codec:<4} {level:>2}  {len(compressed):>7} bytes  {len(compressed) / len(body):6.1%}  '
+              f'{cpu * 1e6:8.0f} us CPU')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--roster', type=int, nargs='+', default=[5, 20, 50])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    office_id = prepare(max(args.roster))
+    client = app.test_client()
+    headers = {'X-API-KEY': os.environ.get('API_KEY'), 'Accept-Encoding': 'identity'}
+    for size in args.roster:
+        set_roster(office_id, size)
+        body = client.get(f'/upcoming_event_registrations?office_id={office_id}', headers=headers).get_data()
+        report(f'roster: 10 events x {size}', body, args.repeat)
+    for limit in (8, 50):
+        body = client.get(f'/upcoming_events?limit={limit}', headers=headers).get_data()
+        report(f'/upcoming_events?limit={limit}', body, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
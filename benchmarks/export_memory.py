@@ -0,0 +1,101 @@
+# Память и время выгрузки записей (exports.py) для маленького и большого периода, CSV и Parquet.
+# Каждая выгрузка - отдельный процесс `python exports.py`, он печатает свой пиковый RSS; файлы пишутся во временный каталог.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/export_memory.py --users 5000 --events 1000
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Запускает exports.py как скрипт и после выгрузки печатает пиковый RSS процесса в КБ
+RUNNER = '''
+import resource, runpy, sys
+sys.argv = ['exports.py'] + sys.argv[1:]
+runpy.run_path('exports.py', run_name='__main__')
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stderr)
+'''
+
+
+def prepare(users, events, small):
+    """Большой офис: users x events записей, по 10 событий в день с завтрашнего.
+    Маленький офис: одно событие завтра, на него записаны small пользователей. Возвращает id маленького офиса."""
+    from app import create_app, db
+    app = create_app(components=[])
+    with app.app_context():
+        db.create_all()
+        small_office_id = db.session.execute(db.text(
+            "SELECT id FROM offices WHERE name = 'Маленький офис'")).scalar()
+        if small_office_id is not None:
+            return small_office_id
+        office_id = db.session.execute(db.text(
+            "INSERT INTO offices (name, address) VALUES ('Офис выгрузки', '-') RETURNING id")).scalar()
+        db.session.execute(db.text(
+            "INSERT INTO users (telegram_id, name, role) "
+            "SELECT 9300000000 + i, 'Пользователь ' || i, 'user' FROM generate_series(1, :n) AS i"), {'n': users})
+        db.session.execute(db.text(
+            "INSERT INTO events (date, time, coach, office_id, max_participants, registered_participants) "
+            "SELECT current_date + 1 + i / 10, make_time(8 + i % 10, 0, 0), 'Тренер ' || i % 7, :office_id, :n, :n "
+            "FROM generate_series(0, :events - 1) AS i"), {'office_id': office_id, 'n': users, 'events': events})
+        db.session.execute(db.text(
+            "INSERT INTO event_registration (user_id, event_id, created_at) "
+            "SELECT u.id, e.id, now() FROM events e CROSS JOIN users u"))
+        small_office_id = db.session.execute(db.text(
+            "INSERT INTO offices (name, address) VALUES ('Маленький офис', '-') RETURNING id")).scalar()
+        db.session.execute(db.text(
+            "WITH e AS (INSERT INTO events (date, time, coach, office_id, max_participants, registered_participants) "
+            "           VALUES (current_date + 1, '12:00', 'Тренер', :office_id, :small, :small) RETURNING id) "
+            "INSERT INTO event_registration (user_id, event_id, created_at) "
+            "SELECT u.id, e.id, now() FROM e CROSS JOIN (SELECT id FROM users ORDER BY id LIMIT :small) u"),
+            {'office_id': small_office_id, 'small': small})
+        db.session.commit()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        return small_office_id
+
+
+def count_rows(path, fmt):
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f) - 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--small', type=int, default=1000)
+    args = parser.parse_args()
+
+    small_office_id = prepare(args.users, args.events, args.small)
+    first = date.today() + timedelta(days=1)
+    last = first + timedelta(days=args.events // 10)
+    exports = {
+        'small': ['--date-from', str(first), '--date-to', str(first), '--office-id', str(small_office_id)],
+        'everything': ['--date-from', str(first), '--date-to', str(last)],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ('csv', 'parquet'):
+            for name, options in exports.items():
+                path = os.path.join(tmp, f'export.{fmt}')
+                command = [sys.executable, '-c', RUNNER, *options, '--format', fmt, '-o', path]
+                started = time.perf_counter()
+                result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+                elapsed = time.perf_counter() - started
+                rss = int(result.stderr.strip().splitlines()[-1])
+                rows = count_rows(path, fmt)
+                print(f'{fmt:<8} {name:<11} {rows:>9} rows  {elapsed:6.1f} s  {os.path.getsize(path) / 1e6:8.1f} MB  '
+                      f'peak RSS {rss / 1024:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Большой список событий (по умолчанию 100 000 строк) одним ответом /upcoming_events:
+# JSON целиком в памяти (стандартный провайдер Flask и orjson) против потока NDJSON из серверного курсора.
+# Каждый режим - в отдельном процессе, чтобы пики памяти не накладывались. Печатает время до первого байта,
+# время до конца ответа, размер ответа и прирост пикового RSS процесса на время запроса.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/list_streaming.py --rows 100000
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    'json, flask json': ('flask', 'application/json'),
+    'json, orjson': ('orjson', 'application/json'),
+    'ndjson, flask json': ('flask', 'application/x-ndjson'),
+    'ndjson, orjson': ('orjson', 'application/x-ndjson'),
+}
+
+
+def prepare(rows):
+    from app import create_app, db
+    app = create_app(components=[])
+    with app.app_context():
+        db.create_all()
+        if db.session.execute(db.text('SELECT count(*) FROM events WHERE starts_at >= LOCALTIMESTAMP')).scalar() >= rows:
+            return
+        office_id = db.session.execute(db.text(
+            "INSERT INTO offices (name, address) VALUES ('Benchmark office', '-') RETURNING id")).scalar()
+        # Одним INSERT ... SELECT: через ORM 100 000 событий вставлялись бы минутами
+        db.session.execute(db.text(
+            "INSERT INTO events (date, time, coach, office_id, max_participants) "
+            "SELECT current_date + 1 + i / 10, make_time(8 + i % 10, 0, 0), 'Benchmark', :office_id, 20 "
+            "FROM generate_series(0, :rows - 1) AS i"), {'office_id': office_id, 'rows': rows})
+        db.session.commit()
+        db.session.execute(db.text('ANALYZE events'))
+
+
+def measure(rows, accept):
+    """Выполняется в дочернем процессе: один запрос на rows строк, результат - JSON в stdout."""
+    from app import create_app
+    app = create_app(components=[])
+    client = app.test_client()
+    headers = {'X-API-KEY': os.environ.get('API_KEY'), 'Accept': accept}
+    client.get('/upcoming_events?limit=1', headers=headers).close()  # соединение с базой, прогрев импорта
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    response = client.get(f'/upcoming_events?limit={rows}', headers=headers, buffered=False)
+    first_byte, size, lines = None, 0, 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+        lines += chunk.count(b'\n')
+    response.close()
+    total = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'status': response.status_code, 'first_byte': first_byte, 'total': total, 'size': size,
+                      'lines': lines, 'rss_growth_kb': peak - baseline}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--measure', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.rows, MODES[args.measure][1])
+        return
+
+    prepare(args.rows)
+    print(f'rows={args.rows}')
+    for name, (provider, _) in MODES.items():
+        # Снимок событий выключен, а страница JSON разрешена на все строки - чтобы оба режима читали из базы
+        env = dict(os.environ, JSON_PROVIDER=provider, EVENTS_SNAPSHOT_TTL='0', MAX_PAGE_SIZE=str(args.rows),
+                   MAX_STREAM_ROWS=str(args.rows))
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--rows', str(args.rows), '--measure', name],
+                             env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"{name:<20} status={result['status']} first byte {result['first_byte'] * 1000:7.0f} ms  "
+              f"total {result['total'] * 1000:7.0f} ms  {result['size'] / 1e6:6.1f} MB  "
+              f"peak RSS +{result['rss_growth_kb'] / 1024:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# Скорость отправки рассылки через outbox.py против простого цикла send_message в несколько потоков.
+# Telegram подменяется локальным сервером с лимитами как у Bot API: не больше --global-limit сообщений
+# за любую секунду и одного сообщения в секунду в один чат, иначе 429 с retry_after.
+# Третий замер - падение: процесс `outbox.py run` убивается посреди рассылки и запускается снова.
+# Сеть и база не нужны; очередь пишется во временный файл SQLite.
+#
+#   python benchmarks/outbox_throughput.py --chats 1000 --busy-chats 50 --per-chat 5
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('TELEGRAM_TOKEN', '123:benchmark')
+
+import telebot  # noqa: E402
+from telebot import apihelper  # noqa: E402
+
+from outbox import Outbox, OutboxStore  # noqa: E402
+
+
+class FakeTelegram:
+    """sendMessage с лимитами Bot API; считает доставленные сообщения и ответы 429."""
+
+    def __init__(self, delay, global_limit):
+        self.delay = delay
+        self.global_limit = global_limit
+        self.lock = threading.Lock()
+        self.recent = deque()  # время доставленных за последнюю секунду
+        self.last_by_chat = {}
+        self.delivered = Counter()  # (chat_id, text) -> сколько раз
+        self.rejected = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                params = parse_qs(urlparse(self.path).query)
+                params.update(parse_qs(self.rfile.read(length).decode() if length else ''))
+                time.sleep(server.delay)
+                status, payload = server.accept(int(params['chat_id'][0]), params['text'][0])
+                body = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except BrokenPipeError:
+                    pass  # процесс outbox.py убит, не дождавшись ответа
+
+            do_GET = do_POST
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def accept(self, chat_id, text):
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] >= 1:
+                self.recent.popleft()
+            if len(self.recent) >= self.global_limit or now - self.last_by_chat.get(chat_id, -1) < 1:
+                self.rejected += 1
+                return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                             'parameters': {'retry_after': 1}}
+            self.recent.append(now)
+            self.last_by_chat[chat_id] = now
+            self.delivered[(chat_id, text)] += 1
+        return 200, {'ok': True, 'result': {'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'},
+                                            'text': text}}
+
+    def reset(self):
+        with self.lock:
+            self.recent.clear()
+            self.last_by_chat.clear()
+            self.delivered.clear()
+            self.rejected = 0
+
+
+def make_messages(chats, busy_chats, per_chat):
+    """Рассылка на chats чатов и ещё по per_chat сообщений в busy_chats чатов (напоминания подряд)."""
+    messages = [{'chat_id': 1000 + i, 'text': f'Занятие отменено #{i}'} for i in range(chats)]
+    messages += [{'chat_id': 1000 + i % busy_chats, 'text': f'Напоминание #{i}'} for i in range(busy_chats * per_chat)]
+    return messages
+
+
+def report(title, server, messages, elapsed):
+    expected = {(m['chat_id'], m['text']) for m in messages}
+    delivered = sum(1 for key in expected if server.delivered[key])
+    duplicates = sum(count - 1 for count in server.delivered.values() if count > 1)
+    print(f'{title:<22} {delivered:>5}/{len(messages)} delivered  {elapsed:6.1f} s  '
+          f'{delivered / elapsed:6.1f} msg/s  429: {server.rejected:>5}  duplicates: {duplicates}')
+
+
+def run_naive(server, messages, threads):
+    bot = telebot.TeleBot(os.environ['TELEGRAM_TOKEN'])
+
+    def send(message):
+        try:
+            bot.send_message(message['chat_id'], message['text'])
+        except apihelper.ApiTelegramException:
+            pass
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(send, messages))
+    report(f'naive, {threads} threads', server, messages, time.perf_counter() - started)
+
+
+def run_outbox(server, messages, path):
+    store = OutboxStore(path)
+    outbox = Outbox(store, telebot.TeleBot(os.environ['TELEGRAM_TOKEN']))
+    outbox.enqueue(messages, 'benchmark')
+    started = time.perf_counter()
+    outbox.start()
+    outbox.wait_empty()
+    elapsed = time.perf_counter() - started
+    outbox.stop()
+    store.close()
+    report('outbox', server, messages, elapsed)
+
+
+def run_crash(server, messages, path, kill_after):
+    """outbox.py run в отдельном процессе: SIGKILL через kill_after секунд, затем перезапуск до конца очереди."""
+    store = OutboxStore(path)
+    store.enqueue(messages, 'crash')
+    store.close()
+    env = dict(os.environ, TELEGRAM_API_URL=server.url, API_URL='http://127.0.0.1:9')
+    command = [sys.executable, 'outbox.py', '--path', path, 'run', '--until-empty']
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    time.sleep(kill_after)
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+    before_restart = sum(server.delivered.values())
+    subprocess.run(command, cwd=ROOT, env=env, stderr=subprocess.DEVNULL, check=True)
+    print(f'crash after {kill_after:.0f} s: {before_restart} delivered before SIGKILL')
+    report('outbox, killed + rerun', server, messages, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--busy-chats', type=int, default=50)
+    parser.add_argument('--per-chat', type=int, default=5)
+    parser.add_argument('--telegram-delay', type=float, default=0.05)
+    parser.add_argument('--global-limit', type=int, default=30)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--crash-messages', type=int, default=300)
+    parser.add_argument('--kill-after', type=float, default=5)
+    args = parser.parse_args()
+
+    server = FakeTelegram(args.telegram_delay, args.global_limit)
+    apihelper.API_URL = server.url + '/bot{0}/{1}'
+    messages = make_messages(args.chats, args.busy_chats, args.per_chat)
+    print(f'{len(messages)} messages, Bot API delay {args.telegram_delay * 1000:.0f} ms, '
+          f'limits {args.global_limit}/s and 1/s per chat')
+
+    run_naive(server, messages, args.threads)
+    with tempfile.TemporaryDirectory() as tmp:
+        server.reset()
+        run_outbox(server, messages, os.path.join(tmp, 'outbox.sqlite3'))
+        server.reset()
+        run_crash(server, messages[:args.crash_messages], os.path.join(tmp, 'crash.sqlite3'), args.kill_after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# Нагрузочный тест записи на одно популярное событие: N клиентов одновременно записываются,
+# считаем пропускную способность и проверяем, что мест не продано больше, чем max_participants.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/registration_burst.py --clients 500 --seats 50 --concurrency 10
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta, time as dt_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db, User, Office, Event, EventRegistration  # noqa: E402
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--seats', type=int, default=50)
+    # Не больше размера пула соединений SQLAlchemy (WEB_THREADS, по умолчанию 8, см. db_pool_options в app.py)
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args()
+
+    api_key = os.environ.get('API_KEY')
+    base_telegram_id = 9_000_000_000
+
+    with app.app_context():
+        db.create_all()
+        office = Office(name='Benchmark office', address='-')
+        db.session.add(office)
+        db.session.flush()
+        event = Event(date=date.today() + timedelta(days=1), time=dt_time(12, 30), coach='Benchmark',
+                      office_id=office.id, max_participants=args.seats)
+        db.session.add(event)
+        db.session.add_all([
+            User(name=f'bench {i}', telegram_id=base_telegram_id + i, role='user')
+            for i in range(args.clients)
+        ])
+        db.session.commit()
+        event_id = event.id
+
+    def register(i):
+        with app.test_client() as client:
+            response = client.post('/event_registrations', headers={'X-API-KEY': api_key},
+                                   json={'event_id': event_id, 'telegram_id': base_telegram_id + i})
+            return response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = list(pool.map(register, range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        rows = EventRegistration.query.filter_by(event_id=event_id).count()
+        counter = db.session.get(Event, event_id).registered_participants
+
+    print(f'clients={args.clients} seats={args.seats} concurrency={args.concurrency}')
+    print(f'elapsed={elapsed:.3f}s throughput={args.clients / elapsed:.1f} req/s')
+    print(f'201={statuses.count(201)} 400={statuses.count(400)} other={len(statuses) - statuses.count(201) - statuses.count(400)}')
+    print(f'registrations={rows} counter={counter} oversold={max(rows - args.seats, 0)}')
+    if rows > args.seats or rows != counter:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
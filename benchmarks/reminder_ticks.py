@@ -0,0 +1,153 @@
+# Цена одного тика напоминаний: GET /reminders/due при k наступивших напоминаниях из миллионов, против
+# выборки записей на события, которые начинаются в ближайшие REMINDER_LEAD минут (event_registration JOIN events),
+# и сколько напоминания добавляют к записи на занятие через API.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/reminder_ticks.py --users 2500 --events 2000 --due 0 100 1000
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from app import create_app, db  # noqa: E402
+
+app = create_app(components=[])
+
+# Все записи на события, которые начинаются в ближайшие lead минут - кандидаты на напоминание без очереди
+WINDOW_SQL = '''
+SELECT r.id, u.telegram_id, e.id, e.date, e.time
+FROM event_registration r
+JOIN events e ON e.id = r.event_id
+JOIN users u ON u.id = r.user_id
+WHERE e.starts_at > :now AND e.starts_at <= :now + :lead
+'''
+
+
+def prepare(users, events):
+    """users x events записей, по 10 событий в день (с 8 до 17 часов) с завтрашнего; напоминания - как миграция 007."""
+    with app.app_context():
+        db.create_all()
+        if db.session.execute(db.text('SELECT count(*) FROM event_registration')).scalar() < users * events:
+            office_id = db.session.execute(db.text(
+                "INSERT INTO offices (name, address) VALUES ('Офис напоминаний', '-') RETURNING id")).scalar()
+            db.session.execute(db.text(
+                "INSERT INTO users (telegram_id, name, role) "
+                "SELECT 9500000000 + i, 'Пользователь ' || i, 'user' FROM generate_series(1, :n) AS i"), {'n': users})
+            db.session.execute(db.text(
+                "INSERT INTO events (date, time, coach, office_id, max_participants, registered_participants) "
+                "SELECT current_date + 1 + i / 10, make_time(8 + i % 10, 0, 0), 'Тренер', :office_id, :n * 2, :n "
+                "FROM generate_series(0, :events - 1) AS i"), {'office_id': office_id, 'n': users, 'events': events})
+            db.session.execute(db.text(
+                "INSERT INTO event_registration (user_id, event_id, created_at) "
+                "SELECT u.id, e.id, now() FROM events e CROSS JOIN users u"))
+            db.session.commit()
+        if not db.session.execute(db.text('SELECT count(*) FROM reminders')).scalar():
+            db.session.execute(db.text(
+                "INSERT INTO reminders (registration_id, due_at) "
+                "SELECT r.id, e.starts_at - :lead FROM event_registration r JOIN events e ON e.id = r.event_id "
+                "WHERE e.starts_at - :lead > LOCALTIMESTAMP"), {'lead': app_module.REMINDER_LEAD})
+            db.session.commit()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return result, statistics.median(times)
+
+
+def queue_ticks(due_counts, repeat):
+    client = app.test_client()
+    headers = {'X-API-KEY': os.environ.get('API_KEY')}
+    with app.app_context():
+        reminders = db.session.execute(db.text('SELECT count(*) FROM reminders')).scalar()
+    print(f'reminders: {reminders} rows')
+    for due in due_counts:
+        with app.app_context():
+            # k самых ранних напоминаний "наступают": due_at - минуту назад; после замера возвращаем как было
+            moved = db.session.execute(db.text(
+                "UPDATE reminders SET due_at = LOCALTIMESTAMP - interval '1 minute' WHERE registration_id IN "
+                "(SELECT registration_id FROM reminders ORDER BY due_at, registration_id LIMIT :k) "
+                "RETURNING registration_id"), {'k': due}).scalars().all()
+            db.session.commit()
+        try:
+            response, elapsed = timed(
+                lambda: client.get(f'/reminders/due?limit={max(due, 1)}', headers=headers), repeat)
+            print(f'  GET /reminders/due  {len(response.get_json()):>5} due  {elapsed * 1000:7.2f} ms/tick')
+        finally:
+            with app.app_context():
+                db.session.execute(db.text(
+                    "UPDATE reminders m SET due_at = e.starts_at - :lead FROM event_registration r "
+                    "JOIN events e ON e.id = r.event_id WHERE r.id = m.registration_id AND m.registration_id = ANY(:ids)"),
+                    {'lead': app_module.REMINDER_LEAD, 'ids': moved})
+                db.session.commit()
+
+
+def window_ticks(repeat):
+    """Выборка без очереди в момент, когда в окне lead минут одно событие (за lead минут до первого)."""
+    with app.app_context():
+        lead = app_module.REMINDER_LEAD
+        first = db.session.execute(db.text('SELECT min(starts_at) FROM events WHERE starts_at > LOCALTIMESTAMP')).scalar()
+        for title, window in (('1 event', lead), ('1 day of events', timedelta(days=1))):
+            now = first - timedelta(minutes=1)
+            rows, elapsed = timed(lambda: db.session.execute(
+                db.text(WINDOW_SQL), {'now': now, 'lead': window}).all(), repeat)
+            print(f'  window scan, {title:<15} {len(rows):>6} rows  {elapsed * 1000:7.2f} ms/tick')
+
+
+def write_latency(writes):
+    """Медиана POST /event_registrations на новое событие с напоминаниями и без (REMINDER_LEAD = 0)."""
+    client = app.test_client()
+    headers = {'X-API-KEY': os.environ.get('API_KEY')}
+    with app.app_context():
+        telegram_ids = db.session.execute(db.text(
+            'SELECT telegram_id FROM users ORDER BY id LIMIT :n'), {'n': writes}).scalars().all()
+        office_id = db.session.execute(db.text('SELECT min(id) FROM offices')).scalar()
+    lead = app_module.REMINDER_LEAD
+    for title, reminder_lead in (('off', timedelta(0)), ('on ', lead)):
+        app_module.REMINDER_LEAD = reminder_lead
+        with app.app_context():
+            # Каждый замер - на новый день: событие в офисе на одно время может быть только одно
+            event_id = db.session.execute(db.text(
+                "INSERT INTO events (date, time, coach, office_id, max_participants) "
+                "SELECT current_date + 2 + CAST(count(*) AS integer), time '21:00', 'Тренер записи', :office_id, 100000 "
+                "FROM events WHERE coach = 'Тренер записи' RETURNING id"),
+                {'office_id': office_id}).scalar()
+            db.session.commit()
+        timings = []
+        for telegram_id in telegram_ids:
+            started = time.perf_counter()
+            response = client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': telegram_id},
+                                   headers=headers)
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 201, response.get_json()
+        print(f'  reminders {title}: register {statistics.median(timings) * 1000:5.2f} ms (median of {writes})')
+    app_module.REMINDER_LEAD = lead
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=2500)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--due', type=int, nargs='+', default=[0, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--writes', type=int, default=500)
+    args = parser.parse_args()
+
+    prepare(args.users, args.events)
+    queue_ticks(args.due, args.repeat)
+    window_ticks(args.repeat)
+    write_latency(args.writes)
+
+
+if __name__ == '__main__':
+    main()
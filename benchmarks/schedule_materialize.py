@@ -0,0 +1,118 @@
+# Год расписания по шаблонам: schedule.materialize (один INSERT ... SELECT ... ON CONFLICT DO NOTHING) против
+# событий по одному через ORM с коммитом на каждое, как при создании в админке, и против одного коммита
+# со всеми событиями через ORM. Повторный запуск и ежедневное продление горизонта на день - тоже.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/schedule_materialize.py --offices 7 --templates 10 --days 365
+import argparse
+import os
+import sys
+import time
+from datetime import date, time as dt_time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db, Coach, Event, Office, ScheduleTemplate, materialize_schedule  # noqa: E402
+
+app = create_app(components=[])
+
+# Дни недели шаблонов по кругу: пн/ср, вт/чт, пн/ср/пт, сб, вт/чт
+PATTERNS = [[1, 3], [2, 4], [1, 3, 5], [6], [2, 4]]
+
+
+def prepare(offices, templates):
+    """offices офисов, в каждом templates шаблонов на разные часы; возвращает id офисов и шаблонов."""
+    with app.app_context():
+        db.create_all()
+        office_rows = [Office(name=f'Офис расписания {i}', address='-') for i in range(offices)]
+        coaches = [Coach(name=f'Тренер расписания {i}') for i in range(offices * 2)]
+        db.session.add_all(office_rows + coaches)
+        db.session.flush()
+        templates = [
+            ScheduleTemplate(office_id=office.id, coach_id=coaches[(i * templates + k) % len(coaches)].id,
+                             weekdays=PATTERNS[k % len(PATTERNS)], time=dt_time(8 + k % 12, 30),
+                             max_participants=20, starts_on=date.today())
+            for i, office in enumerate(office_rows) for k in range(templates)
+        ]
+        db.session.add_all(templates)
+        db.session.commit()
+        return [office.id for office in office_rows], [template.id for template in templates]
+
+
+def reset(office_ids):
+    with app.app_context():
+        db.session.execute(db.text('DELETE FROM events WHERE office_id = ANY(:ids)'), {'ids': office_ids})
+        db.session.execute(db.text('DELETE FROM attendance_daily WHERE office_id = ANY(:ids)'), {'ids': office_ids})
+        db.session.commit()
+
+
+def fingerprint(office_ids):
+    with app.app_context():
+        return db.session.execute(db.text(
+            'SELECT office_id, date, time, coach, coach_id, max_participants FROM events '
+            'WHERE office_id = ANY(:ids) ORDER BY 1, 2, 3'), {'ids': office_ids}).all()
+
+
+def planned_events(office_ids, date_from, date_to):
+    """Те же события, что создаст шаблон, посчитанные в Python - для вставки через ORM."""
+    templates = ScheduleTemplate.query.filter(ScheduleTemplate.office_id.in_(office_ids)).all()
+    days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    return [Event(date=day, time=template.time, coach=template.coach_profile.name, coach_id=template.coach_id,
+                  office_id=template.office_id, max_participants=template.max_participants)
+            for template in templates for day in days if day.isoweekday() in template.weekdays]
+
+
+def run_orm(office_ids, date_from, date_to, commit_each):
+    with app.app_context():
+        events = planned_events(office_ids, date_from, date_to)
+        started = time.perf_counter()
+        for event in events:
+            db.session.add(event)
+            if commit_each:
+                db.session.commit()
+                # Как отдельный запрос админки: сессия не копит уже сохранённые события
+                db.session.expunge(event)
+        db.session.commit()
+        return len(events), time.perf_counter() - started
+
+
+def run_materialize(template_ids, date_from, date_to):
+    with app.app_context():
+        started = time.perf_counter()
+        created = materialize_schedule(date_from, date_to, template_ids)
+        db.session.commit()
+        return created, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--offices', type=int, default=7)
+    parser.add_argument('--templates', type=int, default=10)
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    office_ids, template_ids = prepare(args.offices, args.templates)
+    date_from = date.today() + timedelta(days=1)
+    date_to = date_from + timedelta(days=args.days - 1)
+    print(f'{args.offices} offices x {args.templates} templates, {date_from} - {date_to}')
+
+    results = {}
+    for title, run in (('ORM, commit per event', lambda: run_orm(office_ids, date_from, date_to, True)),
+                       ('ORM, one commit', lambda: run_orm(office_ids, date_from, date_to, False)),
+                       ('materialize', lambda: run_materialize(template_ids, date_from, date_to))):
+        reset(office_ids)
+        created, elapsed = run()
+        results[title] = fingerprint(office_ids)
+        print(f'  {title:<22} {created:>6} events  {elapsed:8.3f} s  {created / elapsed:9.0f} events/s')
+    same = len({tuple(rows) for rows in results.values()}) == 1
+    print(f'  same events: {same}')
+
+    created, elapsed = run_materialize(template_ids, date_from, date_to)
+    print(f'  materialize again      {created:>6} events  {elapsed:8.3f} s')
+    created, elapsed = run_materialize(template_ids, date_from, date_to + timedelta(days=7))
+    print(f'  horizon + 7 days       {created:>6} events  {elapsed:8.3f} s')
+    reset(office_ids)
+
+
+if __name__ == '__main__':
+    main()
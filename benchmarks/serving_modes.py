@@ -0,0 +1,99 @@
+# Пропускная способность API на сервере разработки (python app.py) и под gunicorn (gunicorn.conf.py).
+# Оба сервера запускаются отдельными процессами на свободном порту, клиенты - потоки с keep-alive сессиями.
+# Нужна база с данными (DATABASE_URL, API_KEY), например после benchmarks/registration_burst.py.
+#
+#   python benchmarks/serving_modes.py --clients 32 --duration 10 --workers 4 --threads 8
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, headers, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, headers=headers, timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'Сервер не ответил за {timeout} с: {url}')
+
+
+def load(url, headers, clients, duration):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                ok = session.get(url, headers=headers, timeout=10).ok
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies, errors[0]
+
+
+def run(title, command, env, args):
+    port = free_port()
+    env = dict(env, API_HOST='127.0.0.1', API_PORT=str(port))
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}{args.path}'
+    headers = {'X-API-KEY': os.environ.get('API_KEY', '')}
+    try:
+        wait_ready(url, headers)
+        latencies, errors = load(url, headers, args.clients, args.duration)
+    finally:
+        server.terminate()
+        server.wait()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0
+    print(f'{title}: {len(latencies) / args.duration:.0f} req/s, p50={p50:.1f} ms, p99={p99:.1f} ms, errors={errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--path', default='/upcoming_events')
+    args = parser.parse_args()
+
+    env = dict(os.environ, WEB_CONCURRENCY=str(args.workers), WEB_THREADS=str(args.threads))
+    print(f'clients={args.clients} duration={args.duration}s path={args.path}')
+    run('dev server (python app.py)        ', [sys.executable, 'app.py'], env, args)
+    run(f'gunicorn {args.workers} workers x {args.threads} threads',
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', os.devnull, 'wsgi:app'], env, args)
+
+
+if __name__ == '__main__':
+    main()
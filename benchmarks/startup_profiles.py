@@ -0,0 +1,66 @@
+# Время запуска и память воркера для разных наборов компонентов create_app (APP_COMPONENTS).
+# Каждый замер - отдельный свежий процесс: import app + create_app(components) + первый запрос к /metrics
+# через тестовый клиент (без базы). Печатает медиану времени и RSS процесса после запуска.
+#
+#   python benchmarks/startup_profiles.py --runs 5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'api': [],
+    'api+swagger': ['swagger'],
+    'api+admin': ['admin'],
+    'full': ['swagger', 'admin'],
+}
+
+# Выполняется в дочернем процессе
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+app = module.create_app(components=json.loads(sys.argv[1]))
+created = time.perf_counter()
+app.test_client().get('/metrics', headers={'X-API-KEY': 'probe'})
+served = time.perf_counter()
+with open('/proc/self/status') as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+print(json.dumps({'import': imported - started, 'create': created - imported,
+                  'first_request': served - created, 'rss_kb': rss,
+                  'modules': len(sys.modules)}))
+'''
+
+
+def probe(components):
+    env = dict(os.environ, API_KEY='probe', DATABASE_URL=os.environ.get('DATABASE_URL', 'sqlite://'))
+    out = subprocess.run([sys.executable, '-c', PROBE, json.dumps(components)], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'import ms':>10} {'create ms':>10} {'1st req ms':>11} {'total ms':>9} {'RSS MB':>7} {'modules':>8}")
+    for name, components in PROFILES.items():
+        runs = [probe(components) for _ in range(args.runs)]
+
+        def median(key):
+            return statistics.median(run[key] for run in runs)
+
+        total = median('import') + median('create') + median('first_request')
+        print(f"{name:<12} {median('import') * 1000:>10.0f} {median('create') * 1000:>10.0f} "
+              f"{median('first_request') * 1000:>11.0f} {total * 1000:>9.0f} "
+              f"{median('rss_kb') / 1024:>7.1f} {median('modules'):>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Планы запросов предстоящих событий до и после колонки starts_at на большом наборе событий.
+# ВНИМАНИЕ: создаёт таблицы и тестовые данные, запускайте только на отдельной базе (DATABASE_URL).
+#
+#   python benchmarks/upcoming_events_plans.py --events 1000000
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+
+app = create_app()
+
+# Прежние выражения: date + time вычисляется для каждой строки, индекс использовать нельзя
+QUERIES = {
+    'upcoming_events, before': '''
+        SELECT e.id, CAST(e.date AS timestamp) + CAST(e.time AS interval) AS datetime, o.name
+        FROM events e JOIN offices o ON e.office_id = o.id
+        WHERE CAST(e.date AS timestamp) + CAST(e.time AS interval) >= now()
+        ORDER BY 2 LIMIT 20''',
+    'upcoming_events, after': '''
+        SELECT e.id, e.starts_at, o.name
+        FROM events e JOIN offices o ON e.office_id = o.id
+        WHERE e.starts_at >= LOCALTIMESTAMP
+        ORDER BY e.starts_at, e.id LIMIT 20''',
+    'available_events (office), before': '''
+        SELECT e.id, CAST(e.date AS timestamp) + CAST(e.time AS interval) AS datetime
+        FROM events e
+        WHERE CAST(e.date AS timestamp) + CAST(e.time AS interval) >= now() AND e.office_id = :office_id
+        ORDER BY 2 LIMIT 8''',
+    'available_events (office), after': '''
+        SELECT e.id, e.starts_at
+        FROM events e
+        WHERE e.starts_at >= LOCALTIMESTAMP AND e.office_id = :office_id
+        ORDER BY e.starts_at, e.id LIMIT 8''',
+    'upcoming_event_registrations, before': '''
+        SELECT e.id FROM events e
+        WHERE (e.date = CURRENT_DATE AND e.time > LOCALTIME) OR e.date > CURRENT_DATE
+        ORDER BY e.date, e.time LIMIT 10''',
+    'upcoming_event_registrations, after': '''
+        SELECT e.id FROM events e
+        WHERE e.starts_at > LOCALTIMESTAMP
+        ORDER BY e.starts_at, e.id LIMIT 10''',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--offices', type=int, default=7)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        office_id = db.session.execute(text(
+            "INSERT INTO offices (name, address) SELECT 'Benchmark ' || g, '-' FROM generate_series(1, :n) g "
+            "RETURNING id"), {'n': args.offices}).scalars().all()[0]
+        # Расписание за ~10 лет в прошлое и немного в будущее, как у растущей таблицы events
+        db.session.execute(text('''
+            INSERT INTO events (date, time, coach, office_id, max_participants)
+            SELECT CURRENT_DATE - (g / :offices % 3650) + 30,
+                   time '08:00' + g / (:offices * 3650) * interval '10 minutes', 'Benchmark',
+                   :first_office + g % :offices, 20
+            FROM generate_series(1, :n) g'''),
+            {'n': args.events, 'first_office': office_id, 'offices': args.offices})
+        db.session.commit()
+        db.session.execute(text('ANALYZE events'))
+
+        for title, sql in QUERIES.items():
+            plan = db.session.execute(text('EXPLAIN (ANALYZE, BUFFERS) ' + sql), {'office_id': office_id})
+            print(f'--- {title}')
+            print('\n'.join(row[0] for row in plan))
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,29 @@
 import os
 from dotenv import load_dotenv
+import logging
 import telebot
-from telebot import types
+from telebot import types, apihelper
 import requests
+from api_client import ApiClient
 
 load_dotenv()
 
 API_URL = os.environ.get('API_URL')
 API_KEY = os.environ.get('API_KEY')
 TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN')
+# Таймауты на соединение и на ответ API, секунды
+API_CONNECT_TIMEOUT = float(os.environ.get('API_CONNECT_TIMEOUT', 3.05))
+API_READ_TIMEOUT = float(os.environ.get('API_READ_TIMEOUT', 10))
+
+# Адрес Bot API можно подменить, например локальным сервером для проверки без Telegram
+if os.environ.get('TELEGRAM_API_URL'):
+    apihelper.API_URL = os.environ['TELEGRAM_API_URL'].rstrip('/') + '/bot{0}/{1}'
 
 bot = telebot.TeleBot(TELEGRAM_TOKEN)
 
-headers = {'X-API-KEY': API_KEY}
+# Общий клиент API: пул keep-alive соединений, таймауты, повторы и статистика задержек
+api = ApiClient(API_URL, API_KEY, timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT),
+                retries=int(os.environ.get('API_RETRIES', 2)))
 
 # Функция регистрации пользователя
 def register_user(telegram_id, name, employee_id=None):
@@ -23,7 +34,7 @@ def register_user(telegram_id, name, employee_id=None):
         'role': 'user',
         'info': {}
     }
-    response = requests.post(f'{API_URL}/users', json=data, headers=headers)
+    response = api.post('/users', json=data)
     if response.status_code == 201:
         return True, "Вы успешно зарегистрированы!"
     elif response.status_code == 409:
@@ -33,20 +44,36 @@ def register_user(telegram_id, name, employee_id=None):
 
 # Функция получения доступных событий
 def get_available_events(telegram_id):
-    response = requests.get(f'{API_URL}/available_events', params={'telegram_id': telegram_id}, headers=headers)
+    response = api.get('/available_events', params={'telegram_id': telegram_id})
     if response.ok:
         return response.json()
     return []
 
+# Страница доступных событий: события и курсоры соседних страниц (None, если страницы нет)
+def get_available_events_page(telegram_id, after=None, before=None):
+    params = {'telegram_id': telegram_id, 'after': after, 'before': before}
+    response = api.get('/available_events', params={k: v for k, v in params.items() if v})
+    if response.ok:
+        return response.json(), response.headers.get('X-Next-Cursor'), response.headers.get('X-Prev-Cursor')
+    return [], None, None
+
 # Функция регистрации на событие
 def register_for_event(telegram_id, event_id):
     data = {'telegram_id': telegram_id, 'event_id': event_id}
-    response = requests.post(f'{API_URL}/event_registrations', json=data, headers=headers)
+    response = api.post('/event_registrations', json=data)
     return response.ok
 
+# Функция записи на событие, которая сразу возвращает обновлённые списки событий (один запрос вместо двух)
+def register_and_refresh(telegram_id, event_id, action='register'):
+    data = {'telegram_id': telegram_id, 'event_id': event_id, 'action': action}
+    response = api.post('/event_registrations/refresh', json=data)
+    if response.ok:
+        return response.json()
+    return None
+
 # Функция получения событий, на которые зарегистрирован пользователь
 def get_user_events(telegram_id):
-    response = requests.get(f'{API_URL}/user_events', params={'telegram_id': telegram_id}, headers=headers)
+    response = api.get('/user_events', params={'telegram_id': telegram_id})
     if response.ok:
         return response.json()
     return []
@@ -61,19 +88,19 @@ def update_user_data(telegram_id, employee_id=None, name=None, role=None, info=N
     }
     data = {k: v for k, v in data.items() if v is not None}
 
-    response = requests.put(f'{API_URL}/users/update_by_telegram_id', json=data, headers=headers)
+    response = api.put('/users/update_by_telegram_id', json=data)
     return response.ok, response.text
 
 # Функция удаления регистрации с события
 def delete_event_registration(telegram_id, event_id):
     data = {'telegram_id': telegram_id, 'event_id': event_id}
-    response = requests.post(f'{API_URL}/event_registrations/delete', json=data, headers=headers)
+    response = api.post('/event_registrations/delete', json=data)
     return response.ok
 
 @bot.message_handler(commands=['start'])
 def handle_start(message):
     telegram_id = message.from_user.id
-    name = message.from_user.first_name + (" " + message.from_user.last_name if message.from_user.last_name else "")
+    name = user_full_name(message.from_user)
     # Регистрируем пользователя без employee_id, предполагая, что функция register_user обрабатывает None значения для employee_id
     success, response_message = register_user(telegram_id, name)
     if success:
@@ -85,7 +112,7 @@ def handle_start(message):
 @bot.message_handler(func=lambda message: message.text.isdigit())
 def handle_employee_id(message):
     telegram_id = message.from_user.id
-    name = message.from_user.first_name + (" " + message.from_user.last_name if message.from_user.last_name else "")
+    name = user_full_name(message.from_user)
     employee_id = message.text
     success, response_message = update_user_data(telegram_id, employee_id=employee_id, name=name)
     if success:
@@ -95,29 +122,126 @@ def handle_employee_id(message):
     show_main_menu_first(message.chat.id)
 
 
+# Дальше функции, которые только собирают текст и клавиатуры, без обращений к API и Telegram.
+# Их используют и синхронный бот, и асинхронный (bot_async.py).
+
+def update_chat_id(update):
+    # Ключ, по которому обновления одного чата обрабатываются по порядку (bot_async.py, bot_webhook.py)
+    if update.message is not None:
+        return update.message.chat.id
+    if update.callback_query is not None:
+        if update.callback_query.message is not None:
+            return update.callback_query.message.chat.id
+        return update.callback_query.from_user.id
+    # Остальные типы обновлений не упорядочиваем между собой
+    return ('update', update.update_id)
+
+
+def user_full_name(from_user):
+    return from_user.first_name + (" " + from_user.last_name if from_user.last_name else "")
+
+
+def format_status_yoga(events):
+    # Сортируем события по office_name и datetime
+    events = sorted(events, key=lambda x: (x['office_name'], x['datetime']))
+    response_message = ""
+    current_office = ""
+    for event in events:
+        office_name = event['office_name']
+        # Проверяем, изменилось ли название офиса, чтобы добавить заголовок
+        if current_office != office_name:
+            if current_office != "":  # Добавляем разделитель между офисами, если это не первый офис
+                response_message += "\n"
+            response_message += f"События в {office_name}\n"
+            current_office = office_name
+        # Формируем строку с информацией о событии
+        datetime_str = format_event_datetime(event['datetime'])
+        registered = event['registered_participants']
+        max_participants = event['max_participants']
+        response_message += f"На событие {datetime_str} записалось {registered} человек из {max_participants}\n"
+    return response_message.strip()  # .strip() удаляет лишние пробелы и переводы строки в начале и конце строки
+
+
+def format_registered_users(events_users):
+    message_text = ""
+    current_event_id = None
+    for item in events_users:
+        if current_event_id != item['event_id']:
+            # Начало нового события
+            message_text += f"\n{item['office_name']} {item['event_date']} в {item['event_time']}\n"
+            current_event_id = item['event_id']
+        message_text += f"{item['user_name']}\n"
+    return message_text.strip()
+
+
+def build_available_events_markup(events, next_cursor=None, prev_cursor=None):
+    markup = types.InlineKeyboardMarkup()
+    for event in sorted(events, key=lambda x: x['office_name']):
+        free_places_percentage = (1 - (event['registered_participants'] / event['max_participants'])) * 100
+        # Форматируем дату и время события для отображения
+        formatted_datetime = format_event_datetime(event['datetime'])
+        weekday_name = get_weekday_name(event['datetime'].split(" ")[0])
+        # Включаем описание тренера в текст кнопки
+        coach_description = event.get('coach_description', 'Информация о тренере недоступна')  # Предполагаем, что API возвращает 'coach_description'
+        button_text = f"{coach_description} {weekday_name}, {formatted_datetime} {event['office_name']}"
+        if free_places_percentage < 20:
+            button_text += " ⚠️"  # Добавляем эмодзи, если мест меньше 20%
+        markup.add(types.InlineKeyboardButton(text=button_text, callback_data=f"reg_{event['event_id']}"))
+    # Листание: курсор страницы едет в callback_data (курсор короткий, лимит Telegram - 64 байта)
+    navigation = []
+    if prev_cursor:
+        navigation.append(types.InlineKeyboardButton(text="« Раньше", callback_data=f"page_prev_{prev_cursor}"))
+    if next_cursor:
+        navigation.append(types.InlineKeyboardButton(text="Позже »", callback_data=f"page_next_{next_cursor}"))
+    if navigation:
+        markup.row(*navigation)
+    return markup
+
+
+def build_user_events_markup(events):
+    markup = types.InlineKeyboardMarkup()
+    for event in events:
+        markup.add(types.InlineKeyboardButton(text=f"{event['event_date']} {event['event_time']} {event['office_name']}", callback_data=f"unreg_{event['event_id']}"))
+    return markup
+
+
+def main_menu_markup():
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=False)
+    markup.row('Записаться на йогу', 'Мои записи на йогу')
+    markup.row('Выбрать любимый офис')
+    return markup
+
+
+def main_menu_first_markup():
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=False)
+    markup.add('Записаться на йогу', 'Мои записи на йогу', 'Выбрать любимый офис')
+    return markup
+
+
+def favorite_office_markup():
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    markup.add('Динамо', 'Чертаново', 'Парк Кузьминки')
+    return markup
+
+
+# Кнопки офисов и их ID в базе
+OFFICE_IDS = {
+    'Романов двор': 1,
+    'Динамо': 2,
+    'Белорусская': 6,
+    'Щербинка': 5,
+    'Парк Культуры': 4,
+    'Парк Кузьминки': 7,
+    'Чертаново': 8,
+}
+
+
 @bot.message_handler(commands=['status_yoga'])
 def status_yoga(message):
     telegram_id = message.from_user.id
     events = get_available_events(telegram_id)
     if events:
-        # Сортируем события по office_name и datetime
-        events.sort(key=lambda x: (x['office_name'], x['datetime']))
-        response_message = ""
-        current_office = ""
-        for event in events:
-            office_name = event['office_name']
-            # Проверяем, изменилось ли название офиса, чтобы добавить заголовок
-            if current_office != office_name:
-                if current_office != "":  # Добавляем разделитель между офисами, если это не первый офис
-                    response_message += "\n"
-                response_message += f"События в {office_name}\n"
-                current_office = office_name
-            # Формируем строку с информацией о событии
-            datetime_str = format_event_datetime(event['datetime'])
-            registered = event['registered_participants']
-            max_participants = event['max_participants']
-            response_message += f"На событие {datetime_str} записалось {registered} человек из {max_participants}\n"
-        bot.send_message(message.chat.id, response_message.strip())  # .strip() удаляет лишние пробелы и переводы строки в начале и конце строки
+        bot.send_message(message.chat.id, format_status_yoga(events))
     else:
         bot.send_message(message.chat.id, "На данный момент нет доступных событий.")
 
@@ -129,23 +253,15 @@ def handle_status_yoga_users(message):
 
 def send_registered_users(chat_id, telegram_id):
     # Здесь мы предполагаем, что у вас есть endpoint /upcoming_event_registrations, который возвращает необходимую информацию
-    response = requests.get(f'{API_URL}/upcoming_event_registrations', headers=headers)
+    # telegram_id ограничивает список любимым офисом пользователя, чтобы не тянуть записи по всем офисам
+    response = api.get('/upcoming_event_registrations', params={'telegram_id': telegram_id})
     if response.ok:
         events_users = response.json()
         if not events_users:
             bot.send_message(chat_id, "На данный момент нет записавшихся пользователей на ближайшие события.")
             return
 
-        message_text = ""
-        current_event_id = None
-        for item in events_users:
-            if current_event_id != item['event_id']:
-                # Начало нового события
-                message_text += f"\n{item['office_name']} {item['event_date']} в {item['event_time']}\n"
-                current_event_id = item['event_id']
-            message_text += f"{item['user_name']}\n"
-
-        bot.send_message(chat_id, message_text.strip())
+        bot.send_message(chat_id, format_registered_users(events_users))
     else:
         bot.send_message(chat_id, "Не удалось получить список зарегистрированных пользователей.")
 
@@ -158,20 +274,8 @@ def main_menu(message):
         show_user_events(message)
     elif message.text == 'Выбрать любимый офис':
         choose_favorite_office(message)
-    elif message.text == 'Романов двор':
-        update_user_office(message, 1, "Романов двор")
-    elif message.text == 'Динамо':
-        update_user_office(message, 2, "Динамо")
-    elif message.text == 'Белорусская':
-        update_user_office(message, 6, "Белорусская")
-    elif message.text == 'Щербинка':
-        update_user_office(message, 5, "Щербинка")
-    elif message.text == 'Парк Культуры':
-        update_user_office(message, 4, "Парк Культуры")
-    elif message.text == 'Парк Кузьминки':
-        update_user_office(message, 7, "Парк Кузьминки")
-    elif message.text == 'Чертаново':
-        update_user_office(message, 8, "Чертаново")
+    elif message.text in OFFICE_IDS:
+        update_user_office(message, OFFICE_IDS[message.text], message.text)
 
 
 from datetime import datetime
@@ -216,45 +320,21 @@ def format_event_datetime(datetime_str):
 
 def show_available_events(message):
     telegram_id = message.from_user.id
-    events = get_available_events(telegram_id)
-    sorted_events = sorted(events, key=lambda x: x['office_name'])
-    if sorted_events:
-        markup = types.InlineKeyboardMarkup()
-        for event in sorted_events:
-            free_places_percentage = (1 - (event['registered_participants'] / event['max_participants'])) * 100
-            # Форматируем дату и время события для отображения
-            formatted_datetime = format_event_datetime(event['datetime'])
-            weekday_name = get_weekday_name(event['datetime'].split(" ")[0])
-            # Теперь включаем описание тренера в текст сообщения
-            coach_description = event.get('coach_description', 'Информация о тренере недоступна')  # Предполагаем, что API возвращает 'coach_description'
-            button_text = f"{coach_description} {weekday_name}, {formatted_datetime} {event['office_name']}"  # Добавляем описание тренера в текст кнопки
-            if free_places_percentage < 20:
-                button_text += " ⚠️"  # Добавляем эмодзи, если мест меньше 20%
-            markup.add(types.InlineKeyboardButton(text=button_text, callback_data=f"reg_{event['event_id']}"))
-        bot.send_message(message.chat.id, "Выберите событие для записи:", reply_markup=markup)
+    events, next_cursor, prev_cursor = get_available_events_page(telegram_id)
+    if events:
+        bot.send_message(message.chat.id, "Выберите событие для записи:", reply_markup=build_available_events_markup(events, next_cursor, prev_cursor))
     else:
         bot.send_message(message.chat.id, "На данный момент нет доступных событий.")
 
 
-def show_available_events_by_id(telegram_id, chat_id):
-    events = get_available_events(telegram_id)
-    sorted_events = sorted(events, key=lambda x: x['office_name'])
-    if sorted_events:
-        markup = types.InlineKeyboardMarkup()
-        for event in sorted_events:
-            free_places_percentage = (1 - (event['registered_participants'] / event['max_participants'])) * 100
-            # Форматируем дату и время события для отображения
-            formatted_datetime = format_event_datetime(event['datetime'])
-            weekday_name = get_weekday_name(event['datetime'].split(" ")[0])
-            # Включаем описание тренера в текст сообщения
-            coach_description = event.get('coach_description', 'Информация о тренере недоступна')
-            button_text = f"{coach_description} {weekday_name}, {formatted_datetime} {event['office_name']}"
-            if free_places_percentage < 20:
-                button_text += " ⚠️"  # Добавляем эмодзи, если мест меньше 20%
-            markup.add(types.InlineKeyboardButton(text=button_text, callback_data=f"reg_{event['event_id']}"))
+def show_available_events_by_id(telegram_id, chat_id, events=None, next_cursor=None):
+    # events можно передать готовыми, например из ответа register_and_refresh
+    if events is None:
+        events, next_cursor, _ = get_available_events_page(telegram_id)
+    if events:
         # Отправляем описания тренеров перед кнопками
         bot.send_message(chat_id, "Информация о тренерах и доступные события:", parse_mode='Markdown')
-        bot.send_message(chat_id, "Выберите событие для записи:", reply_markup=markup)
+        bot.send_message(chat_id, "Выберите событие для записи:", reply_markup=build_available_events_markup(events, next_cursor))
     else:
         bot.send_message(chat_id, "На данный момент нет доступных событий.")
 
@@ -263,10 +343,7 @@ def show_user_events(message):
     telegram_id = message.from_user.id
     events = get_user_events(telegram_id)
     if events:
-        markup = types.InlineKeyboardMarkup()
-        for event in events:
-            markup.add(types.InlineKeyboardButton(text=f"{event['event_date']} {event['event_time']} {event['office_name']}", callback_data=f"unreg_{event['event_id']}"))
-        bot.send_message(message.chat.id, "Ваши записи на йогу.\nЧтобы отменить запись - нажмите на неё:", reply_markup=markup)
+        bot.send_message(message.chat.id, "Ваши записи на йогу.\nЧтобы отменить запись - нажмите на неё:", reply_markup=build_user_events_markup(events))
     else:
         bot.send_message(message.chat.id, "Если вы захотите посетить йогу - то вы можете снова записаться на занятие!")
 
@@ -276,17 +353,18 @@ def handle_callback_query(call):
     telegram_id = call.from_user.id
     chat_id = call.message.chat.id
     if call.data.startswith("reg_"):
-        event_id = call.data.split("_")[1]
-        if register_for_event(telegram_id, event_id):
+        event_id = int(call.data.split("_")[1])
+        result = register_and_refresh(telegram_id, event_id)
+        if result is not None:
 
             bot.delete_message(chat_id=call.message.chat.id, message_id=call.message.message_id)
-            show_available_events_by_id(telegram_id, chat_id)
+            show_available_events_by_id(telegram_id, chat_id, result['available_events'], result.get('available_next_cursor'))
             bot.send_message(chat_id, "**Вы успешно записались на событие!**", parse_mode='Markdown')
             show_main_menu(call.message.chat.id)
         else:
             bot.answer_callback_query(call.id, "Произошла ошибка при записи на событие или места на занятие закончились.", show_alert=True)
     elif call.data.startswith("unreg_"):
-        event_id = call.data.split("_")[1]
+        event_id = int(call.data.split("_")[1])
         if delete_event_registration(telegram_id, event_id):
             # Изменено здесь: замена на send_message для отправки сообщения пользователю
             bot.send_message(chat_id, "Вы успешно отменили запись на событие.") # todo - добавить логирование отписок от событий с датами отписки
@@ -294,37 +372,37 @@ def handle_callback_query(call):
             show_main_menu(call.message.chat.id)
         else:
             bot.answer_callback_query(call.id, "Произошла ошибка при отмене записи на событие.", show_alert=True)
+    elif call.data.startswith("page_"):
+        # page_next_<курсор> или page_prev_<курсор>; в курсоре тоже может быть "_", поэтому не split
+        direction, cursor = call.data[len("page_"):len("page_next")], call.data[len("page_next_"):]
+        if direction == "next":
+            events, next_cursor, prev_cursor = get_available_events_page(telegram_id, after=cursor)
+        else:
+            events, next_cursor, prev_cursor = get_available_events_page(telegram_id, before=cursor)
+        if events:
+            bot.edit_message_reply_markup(chat_id=chat_id, message_id=call.message.message_id,
+                                          reply_markup=build_available_events_markup(events, next_cursor, prev_cursor))
+            bot.answer_callback_query(call.id)
+        else:
+            bot.answer_callback_query(call.id, "Других доступных событий нет.")
 
-from telebot import types
 def show_main_menu(chat_id):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=False)
-    markup.row('Записаться на йогу', 'Мои записи на йогу')
-    markup.row('Выбрать любимый офис')
-    bot.send_message(chat_id, "Выберите действие:", reply_markup=markup)
+    bot.send_message(chat_id, "Выберите действие:", reply_markup=main_menu_markup())
 
 
 
 def show_main_menu_first(chat_id):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=False)
-    markup.add('Записаться на йогу', 'Мои записи на йогу', 'Выбрать любимый офис')
-    bot.send_message(chat_id, "Теперь вы можете записаться на йогу!", reply_markup=markup)
+    bot.send_message(chat_id, "Теперь вы можете записаться на йогу!", reply_markup=main_menu_first_markup())
 
 def choose_favorite_office(message):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    markup.add('Динамо', 'Чертаново', 'Парк Кузьминки')
-    bot.send_message(message.chat.id, "Выберите ваш любимый офис:", reply_markup=markup)
+    bot.send_message(message.chat.id, "Выберите ваш любимый офис:", reply_markup=favorite_office_markup())
 
 def send_office_preference_to_api(telegram_id, office_id):
-    endpoint = f"{API_URL}/users/office/{telegram_id}"
-    headers = {
-        'Content-Type': 'application/json',
-        'X-API-KEY': API_KEY
-    }
     data = {
         'office_id': office_id
     }
     try:
-        response = requests.put(endpoint, json=data, headers=headers)
+        response = api.put(f'/users/office/{telegram_id}', name='/users/office/{telegram_id}', json=data)
         return response.ok  # Возвращает True, если статус ответа в диапазоне 200-299
     except requests.RequestException as e:
         print(f"Ошибка при отправке запроса к API: {e}")
@@ -345,4 +423,9 @@ def update_user_office(message, office_id, office_name):
 
 
 if __name__ == '__main__':
-    bot.polling(none_stop=True)
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    try:
+        bot.polling(none_stop=True)
+    finally:
+        logging.info('API latency by endpoint: %s, 304 responses: %s', api.stats(), api.not_modified)
+        api.close()
\ No newline at end of file
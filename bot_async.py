@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import os
+from collections import deque
+
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+
+from api_client import AsyncApiClient
+from bot import (
+    API_URL, API_KEY, TELEGRAM_TOKEN, API_CONNECT_TIMEOUT, API_READ_TIMEOUT, OFFICE_IDS,
+    update_chat_id, user_full_name, format_status_yoga, format_registered_users, build_available_events_markup,
+    build_user_events_markup, main_menu_markup, main_menu_first_markup, favorite_office_markup,
+)
+
+# Асинхронный режим бота: обновления разных чатов обрабатываются параллельно,
+# обновления одного чата - строго по очереди. Запуск: python bot_async.py
+
+logger = logging.getLogger(__name__)
+
+# Сколько обработчиков может одновременно ждать API или Telegram
+BOT_MAX_CONCURRENCY = int(os.environ.get('BOT_MAX_CONCURRENCY', 100))
+# Сколько полученных, но ещё не обработанных обновлений держим в памяти, прежде чем перестать опрашивать Telegram
+BOT_MAX_PENDING = int(os.environ.get('BOT_MAX_PENDING', 1000))
+
+if os.environ.get('TELEGRAM_API_URL'):
+    asyncio_helper.API_URL = os.environ['TELEGRAM_API_URL'].rstrip('/') + '/bot{0}/{1}'
+
+bot = AsyncTeleBot(TELEGRAM_TOKEN)
+
+api = AsyncApiClient(API_URL, API_KEY, timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT),
+                     retries=int(os.environ.get('API_RETRIES', 2)), pool_size=BOT_MAX_CONCURRENCY)
+
+
+class ChatDispatcher:
+    """Раздаёт обновления обработчику: параллельно между чатами, по порядку внутри чата.
+
+    submit() вызывается синхронно в порядке прихода обновлений, поэтому очередь чата
+    сохраняет этот порядок. На каждый чат с необработанными обновлениями работает одна задача.
+    """
+
+    def __init__(self, handle, max_concurrency=BOT_MAX_CONCURRENCY, max_pending=BOT_MAX_PENDING):
+        self._handle = handle
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_pending = max_pending
+        self._queues = {}  # chat_id -> deque обновлений
+        self._tasks = set()
+        self._capacity = asyncio.Condition()
+        self.pending = 0
+
+    def submit(self, update):
+        self.pending += 1
+        key = update_chat_id(update)
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.append(update)
+            return
+        self._queues[key] = deque([update])
+        task = asyncio.create_task(self._drain(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key):
+        queue = self._queues[key]
+        try:
+            while queue:
+                update = queue[0]  # остаётся в очереди, пока обрабатывается, чтобы новые вставали за ним
+                async with self._semaphore:
+                    try:
+                        await self._handle(update)
+                    except Exception:
+                        logger.exception('Ошибка при обработке обновления %s', update.update_id)
+                queue.popleft()
+                self.pending -= 1
+                async with self._capacity:
+                    self._capacity.notify_all()
+        finally:
+            del self._queues[key]
+
+    async def wait_for_capacity(self):
+        async with self._capacity:
+            await self._capacity.wait_for(lambda: self.pending < self._max_pending)
+
+    async def join(self):
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+
+# Функции работы с API - те же, что в bot.py, но неблокирующие
+
+async def register_user(telegram_id, name, employee_id=None):
+    data = {
+        'name': name,
+        'telegram_id': telegram_id,
+        'employee_id': employee_id,
+        'role': 'user',
+        'info': {}
+    }
+    response = await api.post('/users', json=data)
+    if response.status_code == 201:
+        return True, "Вы успешно зарегистрированы!"
+    elif response.status_code == 409:
+        return False, "Пользователь уже зарегистрирован."
+    else:
+        return False, "Произошла ошибка при регистрации."
+
+
+async def get_available_events(telegram_id):
+    response = await api.get('/available_events', params={'telegram_id': telegram_id})
+    if response.ok:
+        return response.json()
+    return []
+
+
+async def get_available_events_page(telegram_id, after=None, before=None):
+    params = {'telegram_id': telegram_id, 'after': after, 'before': before}
+    response = await api.get('/available_events', params={k: v for k, v in params.items() if v})
+    if response.ok:
+        return response.json(), response.headers.get('X-Next-Cursor'), response.headers.get('X-Prev-Cursor')
+    return [], None, None
+
+
+async def register_and_refresh(telegram_id, event_id, action='register'):
+    data = {'telegram_id': telegram_id, 'event_id': event_id, 'action': action}
+    response = await api.post('/event_registrations/refresh', json=data)
+    if response.ok:
+        return response.json()
+    return None
+
+
+async def get_user_events(telegram_id):
+    response = await api.get('/user_events', params={'telegram_id': telegram_id})
+    if response.ok:
+        return response.json()
+    return []
+
+
+async def update_user_data(telegram_id, employee_id=None, name=None, role=None, info=None):
+    data = {
+        'telegram_id': telegram_id,
+        'employee_id': employee_id,
+        'name': name,
+        'role': role,
+        'info': info
+    }
+    data = {k: v for k, v in data.items() if v is not None}
+    response = await api.put('/users/update_by_telegram_id', json=data)
+    return response.ok, response.text
+
+
+async def delete_event_registration(telegram_id, event_id):
+    response = await api.post('/event_registrations/delete', json={'telegram_id': telegram_id, 'event_id': event_id})
+    return response.ok
+
+
+async def send_office_preference_to_api(telegram_id, office_id):
+    try:
+        response = await api.put(f'/users/office/{telegram_id}', name='/users/office/{telegram_id}',
+                                 json={'office_id': office_id})
+        return response.ok
+    except Exception as e:
+        logger.warning('Ошибка при отправке запроса к API: %s', e)
+        return False
+
+
+# Обработчики - повторяют bot.py
+
+@bot.message_handler(commands=['start'])
+async def handle_start(message):
+    success, response_message = await register_user(message.from_user.id, user_full_name(message.from_user))
+    if success:
+        await bot.send_message(message.chat.id, "Вы успешно зарегистрированы! Пожалуйста, введите ваш employee_id для завершения регистрации или обновления данных.")
+    else:
+        await bot.send_message(message.chat.id, response_message + " Пожалуйста, введите ваш employee_id для обновления данных.")
+    await show_main_menu(message.chat.id)
+
+
+@bot.message_handler(func=lambda message: message.text.isdigit())
+async def handle_employee_id(message):
+    success, response_message = await update_user_data(message.from_user.id, employee_id=message.text,
+                                                       name=user_full_name(message.from_user))
+    if success:
+        await bot.send_message(message.chat.id, "Ваши данные успешно обновлены.")
+    else:
+        await bot.send_message(message.chat.id, f"Произошла ошибка при обновлении вашего employee_id: {response_message}")
+    await bot.send_message(message.chat.id, "Теперь вы можете записаться на йогу!", reply_markup=main_menu_first_markup())
+
+
+@bot.message_handler(commands=['status_yoga'])
+async def status_yoga(message):
+    events = await get_available_events(message.from_user.id)
+    if events:
+        await bot.send_message(message.chat.id, format_status_yoga(events))
+    else:
+        await bot.send_message(message.chat.id, "На данный момент нет доступных событий.")
+
+
+@bot.message_handler(commands=['status_yoga_users'])
+async def handle_status_yoga_users(message):
+    response = await api.get('/upcoming_event_registrations', params={'telegram_id': message.from_user.id})
+    if not response.ok:
+        await bot.send_message(message.chat.id, "Не удалось получить список зарегистрированных пользователей.")
+    elif not response.json():
+        await bot.send_message(message.chat.id, "На данный момент нет записавшихся пользователей на ближайшие события.")
+    else:
+        await bot.send_message(message.chat.id, format_registered_users(response.json()))
+
+
+@bot.message_handler(func=lambda message: True)
+async def main_menu(message):
+    if message.text == 'Записаться на йогу':
+        await show_available_events(message.from_user.id, message.chat.id)
+    elif message.text == 'Мои записи на йогу':
+        await show_user_events(message)
+    elif message.text == 'Выбрать любимый офис':
+        await bot.send_message(message.chat.id, "Выберите ваш любимый офис:", reply_markup=favorite_office_markup())
+    elif message.text in OFFICE_IDS:
+        await update_user_office(message, OFFICE_IDS[message.text], message.text)
+
+
+async def show_available_events(telegram_id, chat_id, with_header=False, events=None, next_cursor=None):
+    prev_cursor = None
+    if events is None:
+        events, next_cursor, prev_cursor = await get_available_events_page(telegram_id)
+    if events:
+        if with_header:
+            await bot.send_message(chat_id, "Информация о тренерах и доступные события:", parse_mode='Markdown')
+        await bot.send_message(chat_id, "Выберите событие для записи:",
+                               reply_markup=build_available_events_markup(events, next_cursor, prev_cursor))
+    else:
+        await bot.send_message(chat_id, "На данный момент нет доступных событий.")
+
+
+async def show_user_events(message):
+    events = await get_user_events(message.from_user.id)
+    if events:
+        await bot.send_message(message.chat.id, "Ваши записи на йогу.\nЧтобы отменить запись - нажмите на неё:", reply_markup=build_user_events_markup(events))
+    else:
+        await bot.send_message(message.chat.id, "Если вы захотите посетить йогу - то вы можете снова записаться на занятие!")
+
+
+@bot.callback_query_handler(func=lambda call: True)
+async def handle_callback_query(call):
+    telegram_id = call.from_user.id
+    chat_id = call.message.chat.id
+    if call.data.startswith("reg_"):
+        event_id = int(call.data.split("_")[1])
+        result = await register_and_refresh(telegram_id, event_id)
+        if result is not None:
+            await bot.delete_message(chat_id=chat_id, message_id=call.message.message_id)
+            await show_available_events(telegram_id, chat_id, with_header=True, events=result['available_events'],
+                                        next_cursor=result.get('available_next_cursor'))
+            await bot.send_message(chat_id, "**Вы успешно записались на событие!**", parse_mode='Markdown')
+            await show_main_menu(chat_id)
+        else:
+            await bot.answer_callback_query(call.id, "Произошла ошибка при записи на событие или места на занятие закончились.", show_alert=True)
+    elif call.data.startswith("unreg_"):
+        event_id = int(call.data.split("_")[1])
+        if await delete_event_registration(telegram_id, event_id):
+            await bot.send_message(chat_id, "Вы успешно отменили запись на событие.")
+            await bot.delete_message(chat_id=chat_id, message_id=call.message.message_id)
+            await show_main_menu(chat_id)
+        else:
+            await bot.answer_callback_query(call.id, "Произошла ошибка при отмене записи на событие.", show_alert=True)
+    elif call.data.startswith("page_"):
+        direction, cursor = call.data[len("page_"):len("page_next")], call.data[len("page_next_"):]
+        if direction == "next":
+            events, next_cursor, prev_cursor = await get_available_events_page(telegram_id, after=cursor)
+        else:
+            events, next_cursor, prev_cursor = await get_available_events_page(telegram_id, before=cursor)
+        if events:
+            await bot.edit_message_reply_markup(chat_id=chat_id, message_id=call.message.message_id,
+                                                reply_markup=build_available_events_markup(events, next_cursor, prev_cursor))
+            await bot.answer_callback_query(call.id)
+        else:
+            await bot.answer_callback_query(call.id, "Других доступных событий нет.")
+
+
+async def show_main_menu(chat_id):
+    await bot.send_message(chat_id, "Выберите действие:", reply_markup=main_menu_markup())
+
+
+async def update_user_office(message, office_id, office_name):
+    if await send_office_preference_to_api(message.from_user.id, office_id):
+        await bot.send_message(message.chat.id, f"Вы выбрали любимым офис {office_name}. Теперь вам будут предлагаться только события в этом офисе.")
+    else:
+        await bot.send_message(message.chat.id, "Произошла ошибка при обновлении вашего любимого офиса.")
+    await show_main_menu(message.chat.id)
+
+
+async def handle_update(update):
+    await bot.process_new_updates([update])
+
+
+async def run_polling(poll_timeout=20):
+    dispatcher = ChatDispatcher(handle_update)
+    offset = None
+    try:
+        while True:
+            # Не забираем новые обновления, пока не разобрали накопившиеся
+            await dispatcher.wait_for_capacity()
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=poll_timeout, request_timeout=poll_timeout + 10)
+            except Exception:
+                logger.exception('Не удалось получить обновления от Telegram')
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                dispatcher.submit(update)
+    finally:
+        await dispatcher.join()
+        logger.info('API latency by endpoint: %s, 304 responses: %s', api.stats(), api.not_modified)
+        await api.close()
+        await bot.close_session()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_polling())
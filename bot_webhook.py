@@ -0,0 +1,189 @@
+import logging
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from flask import Flask, request, jsonify
+from telebot import types
+
+from bot import bot, api, update_chat_id
+
+# Приём обновлений Telegram через webhook вместо long polling.
+# Обновления складываются в ограниченные очереди и обрабатываются пулом потоков теми же
+# обработчиками, что и в bot.py. Запуск: python bot_webhook.py или gunicorn -w 1 --threads 8 bot_webhook:app
+# (один процесс: порядок обновлений чата и отсев повторов работают в пределах процесса).
+# Проверить локально без Telegram можно, отправив сохранённый JSON обновления:
+#   curl -X POST localhost:8082/webhook -H 'Content-Type: application/json' -d @update.json
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_HOST = os.environ.get('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', 8082))
+# Публичный адрес, который регистрируется в Telegram (без /webhook); если не задан, set_webhook не вызывается
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+# Секрет, который Telegram присылает в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 8))
+# Размер очереди одного потока; когда она заполнена, отвечаем 503 и Telegram повторит доставку позже
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 100))
+# Сколько последних update_id помним, чтобы не обработать повторную доставку дважды
+WEBHOOK_DEDUP_SIZE = int(os.environ.get('WEBHOOK_DEDUP_SIZE', 10000))
+
+
+class RecentIds:
+    """Ограниченное множество последних update_id."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def add(self, update_id):
+        """Добавляет id; возвращает False, если он уже был."""
+        with self._lock:
+            if update_id in self._ids:
+                self.duplicates += 1
+                return False
+            self._ids[update_id] = None
+            if len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+            return True
+
+    def discard(self, update_id):
+        with self._lock:
+            self._ids.pop(update_id, None)
+
+
+class UpdateWorkerPool:
+    """Пул потоков с отдельной ограниченной очередью у каждого потока.
+
+    Обновления одного чата всегда попадают в одну и ту же очередь, поэтому обрабатываются по порядку.
+    """
+
+    def __init__(self, handle, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE):
+        self._handle = handle
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        """Запускает потоки, если они ещё не запущены; повторный вызов ничего не делает."""
+        with self._lock:
+            if self._threads:
+                return
+            for i, q in enumerate(self._queues):
+                thread = threading.Thread(target=self._work, args=(q,), name=f'webhook-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, update):
+        """Ставит обновление в очередь; возвращает False, если очередь переполнена."""
+        # Потоки стартуют при первом обновлении: под gunicorn блок __main__ не выполняется,
+        # а потоки, запущенные до fork воркера, в нём не живут
+        self.start()
+        q = self._queues[hash(update_chat_id(update)) % len(self._queues)]
+        try:
+            q.put_nowait(update)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.accepted += 1
+        return True
+
+    def stop(self):
+        # Дорабатываем то, что уже в очередях, и останавливаем потоки
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self, q):
+        while True:
+            update = q.get()
+            if update is None:
+                return
+            try:
+                self._handle(update)
+                with self._lock:
+                    self.processed += 1
+            except Exception:
+                logger.exception('Ошибка при обработке обновления %s', update.update_id)
+                with self._lock:
+                    self.failed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': [q.qsize() for q in self._queues],
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'processed': self.processed,
+                'failed': self.failed,
+            }
+
+
+def handle_update(update):
+    bot.process_new_updates([update])
+
+
+# Обработчики выполняются прямо в потоке пула, а не в собственном пуле TeleBot
+bot.threaded = False
+
+app = Flask(__name__)
+recent_updates = RecentIds(WEBHOOK_DEDUP_SIZE)
+workers = UpdateWorkerPool(handle_update)
+
+
+def is_authorized():
+    return not WEBHOOK_SECRET or request.headers.get('X-Telegram-Bot-Api-Secret-Token') == WEBHOOK_SECRET
+
+
+@app.route('/webhook', methods=['POST'])
+def receive_update():
+    if not is_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('update_id'), int):
+        return jsonify({'error': 'Ожидается JSON обновления Telegram с update_id'}), 400
+
+    update_id = payload['update_id']
+    if not recent_updates.add(update_id):
+        # Повторная доставка: отвечаем 200, чтобы Telegram больше её не присылал
+        return jsonify({'status': 'duplicate'}), 200
+
+    if not workers.submit(types.Update.de_json(payload)):
+        # Не приняли - забываем id, чтобы повторная доставка прошла
+        recent_updates.discard(update_id)
+        return jsonify({'error': 'Очередь обновлений переполнена'}), 503, {'Retry-After': '1'}
+
+    return jsonify({'status': 'queued'}), 200
+
+
+# Тот же секрет, что и у /webhook: без него очереди и число чатов видны кому угодно
+@app.route('/webhook/stats', methods=['GET'])
+def webhook_stats():
+    if not is_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({'workers': workers.stats(), 'duplicates': recent_updates.duplicates, 'api': api.stats()}), 200
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    workers.start()
+    if WEBHOOK_URL:
+        bot.remove_webhook()
+        bot.set_webhook(url=WEBHOOK_URL.rstrip('/') + '/webhook', secret_token=WEBHOOK_SECRET)
+    try:
+        app.run(host=WEBHOOK_HOST, port=WEBHOOK_PORT, threaded=True)
+    finally:
+        workers.stop()
+        api.close()
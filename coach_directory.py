@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import namedtuple
+
+CoachRef = namedtuple('CoachRef', ['id', 'name', 'description'])
+
+
+class CoachDirectory:
+    """Все тренеры в памяти процесса: coach_id -> CoachRef.
+
+    Тренеров единицы, поэтому справочник грузится целиком одним запросом, а описания тренеров
+    не нужно тянуть через JOIN в каждом запросе событий. Правки тренеров в этом процессе сбрасывают
+    справочник (invalidate), правки из других воркеров видны не позже чем через ttl секунд, а сразу -
+    если перед ответом вызвать sync с версией данных тренеров.
+    Неизвестный id (тренер, добавленный другим воркером) перезагружает справочник, но не чаще раза в секунду.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._coaches = None
+        self._loaded_at = 0.0
+        self._version = None  # версия данных тренеров, прочитанная до загрузки
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def reload(self, loader, version=None):
+        coaches = {coach.id: coach for coach in loader()}
+        with self._lock:
+            self._coaches = coaches
+            self._loaded_at = time.monotonic()
+            self._version = version
+            self.reloads += 1
+        return coaches
+
+    def sync(self, version, loader):
+        """Перечитывает справочник, если он загружен не при этой версии данных тренеров."""
+        with self._lock:
+            current = self._coaches is not None and self._version == version
+        if not current:
+            self.reload(loader, version)
+
+    def get(self, coach_id, loader):
+        """CoachRef по id или None; loader() возвращает список CoachRef всех тренеров."""
+        if coach_id is None:
+            return None
+        with self._lock:
+            coaches, age, version = self._coaches, time.monotonic() - self._loaded_at, self._version
+        if coaches is None or age >= self.ttl or (coach_id not in coaches and age >= 1):
+            # Перечитанный справочник не старее прежней версии, поэтому она за ним сохраняется
+            coaches = self.reload(loader, version)
+        coach = coaches.get(coach_id)
+        with self._lock:
+            if coach is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return coach
+
+    def invalidate(self):
+        with self._lock:
+            self._coaches = None
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._coaches) if self._coaches is not None else 0,
+                'ttl': self.ttl,
+                'reloads': self.reloads,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
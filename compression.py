@@ -0,0 +1,121 @@
+import gzip
+import threading
+import time
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # без brotli сжимаем только gzip
+    brotli = None
+
+# Что имеет смысл сжимать; картинки, архивы и уже сжатые ответы не трогаем
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'application/json', 'application/x-ndjson', 'text/html', 'text/plain', 'text/css', 'text/csv',
+    'application/javascript', 'text/javascript',
+})
+
+
+class ResponseCompressor:
+    """Сжатие ответов gzip или brotli по Accept-Encoding клиента.
+
+    Обычные ответы сжимаются, только если тело не меньше min_size байт: маленький JSON сжатие почти не уменьшает,
+    а время на него тратится. Потоковые ответы (NDJSON) сжимаются по порциям по мере отправки.
+    Уровни по умолчанию - быстрые (gzip 5, brotli 4): на ответах API они сжимают почти как максимальные,
+    но во много раз быстрее. У сжатого ответа ETag становится слабым, как у nginx: байты другие, данные те же.
+    """
+
+    def __init__(self, min_size=1024, gzip_level=5, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._lock = threading.Lock()
+        self.compressed = {}  # кодировка -> число ответов
+        self.skipped_small = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+        app.extensions['compression'] = self
+
+    def encodings(self):
+        return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    def compress(self, response):
+        if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings())
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                with self._lock:
+                    self.skipped_small += 1
+                return response
+            response.set_data(self._compress_body(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        with self._lock:
+            self.compressed[encoding] = self.compressed.get(encoding, 0) + 1
+        return response
+
+    def _compress_body(self, body, encoding):
+        started = time.process_time()
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        self._observe(len(body), len(compressed), time.process_time() - started)
+        return compressed
+
+    def _compress_stream(self, chunks, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # формат gzip
+            compress, finish = compressor.compress, compressor.flush
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)  # noqa: E731
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                started = time.process_time()
+                # Каждую порцию отправляем сразу, а не ждём, пока компрессор накопит блок
+                data = compress(chunk) + flush()
+                self._observe(len(chunk), len(data), time.process_time() - started)
+                yield data
+            yield finish()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _observe(self, size_in, size_out, cpu):
+        with self._lock:
+            self.bytes_in += size_in
+            self.bytes_out += size_out
+            self.cpu_seconds += cpu
+
+    def stats(self):
+        with self._lock:
+            return {
+                'min_size': self.min_size,
+                'compressed': dict(self.compressed),
+                'skipped_small': self.skipped_small,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'ratio': self.bytes_out / self.bytes_in if self.bytes_in else 0.0,
+                'cpu_ms': self.cpu_seconds * 1000,
+            }
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import namedtuple
+
+# Предстоящее событие в снимке: всё, что нужно /upcoming_events и /available_events (тренер - по coach_id из справочника)
+SnapshotEvent = namedtuple('SnapshotEvent', [
+    'id', 'starts_at', 'office_id', 'office_name', 'max_participants', 'coach_id',
+])
+
+
+class _State:
+    def __init__(self, rows, per_office, version):
+        self.loaded_at = time.monotonic()
+        self.version = version  # версия данных, прочитанная до загрузки
+        self.seats = {event.id: seats for event, seats in rows}  # event_id -> занято мест
+        self.ordered = sorted((event for event, _ in rows), key=lambda e: (e.starts_at, e.id))
+        self.by_office = {}
+        for event in self.ordered:
+            self.by_office.setdefault(event.office_id, []).append(event)
+        # У офисов, где загружено ровно per_office событий, дальше могут быть ещё не загруженные:
+        # после ключа (starts_at, id) последнего загруженного события список офиса неполный
+        self.office_cutoff = {
+            office_id: (items[-1].starts_at, items[-1].id)
+            for office_id, items in self.by_office.items() if len(items) >= per_office
+        }
+        # После этой точки неполный общий список
+        self.cutoff = min(self.office_cutoff.values()) if self.office_cutoff else None
+
+
+class EventsSnapshot:
+    """Снимок ближайших предстоящих событий по офисам с числом занятых мест.
+
+    Снимок общий для всех пользователей и живёт в памяти процесса. Вызывающий передаёт версию данных
+    (data_version событий и офисов), прочитанную до обращения к снимку: снимок, загруженный при другой версии,
+    перечитывается, поэтому ответ не старее своего ETag и одинаков во всех воркерах. Кроме того, снимок
+    перечитывается не реже раза в ttl секунд; ttl <= 0 выключает снимок.
+    Если по снимку нельзя точно ответить на запрос, методы возвращают None - тогда нужен запрос в базу.
+    """
+
+    def __init__(self, ttl=10, per_office=100):
+        self.ttl = ttl
+        self.per_office = per_office
+        self._state = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._invalidations = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _fresh(self, state, version):
+        return (state is not None and state.version == version
+                and time.monotonic() - state.loaded_at < self.ttl)
+
+    def _current(self, loader, version):
+        if self.ttl <= 0:
+            return None
+        state = self._state
+        if self._fresh(state, version):
+            return state
+        # Перезагружает один поток, остальные дожидаются его и берут готовый снимок
+        with self._reload_lock:
+            state = self._state
+            if not self._fresh(state, version):
+                invalidations = self._invalidations
+                state = _State(loader(self.per_office), self.per_office, version)
+                with self._lock:
+                    self.reloads += 1
+                    # Сброс во время загрузки: прочитанное могло его не застать, поэтому не сохраняем
+                    if invalidations == self._invalidations:
+                        self._state = state
+        return state
+
+    def upcoming(self, loader, now, limit, office_id=None, exclude=(), after=None, before=None, version=None):
+        """До limit ближайших событий, начинающихся не раньше now, кроме exclude, по возрастанию (starts_at, id).
+
+        after/before - ключ (starts_at, id): события строго после него или последние limit строго до него.
+        loader(per_office) возвращает пары (SnapshotEvent, занято мест) - по per_office ближайших событий каждого офиса.
+        version - текущая версия данных; снимок, загруженный при другой версии, перечитывается.
+        Результат - список пар (SnapshotEvent, занято мест) или None, если снимок не даёт точного ответа.
+        """
+        state = self._current(loader, version)
+        if state is None:
+            return None
+
+        if office_id is not None:
+            candidates, cutoff = state.by_office.get(office_id, []), state.office_cutoff.get(office_id)
+        else:
+            candidates, cutoff = state.ordered, state.cutoff
+
+        def selected(event):
+            return event.starts_at >= now and event.id not in exclude
+
+        if before is not None:
+            # Всё, что раньше before, должно быть загружено
+            exact = cutoff is None or before <= cutoff
+            result = [event for event in candidates if (event.starts_at, event.id) < before and selected(event)]
+            result = result[-limit:]
+        else:
+            result = []
+            for event in candidates:
+                key = (event.starts_at, event.id)
+                if cutoff is not None and key > cutoff:
+                    break
+                if (after is None or key > after) and selected(event):
+                    result.append(event)
+                    if len(result) == limit:
+                        break
+            exact = len(result) == limit or cutoff is None
+
+        with self._lock:
+            if not exact:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [(event, state.seats[event.id]) for event in result]
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            state = self._state
+            total = self.hits + self.misses
+            return {
+                'size': len(state.seats) if state else 0,
+                'age': time.monotonic() - state.loaded_at if state else None,
+                'version': state.version if state else None,
+                'ttl': self.ttl,
+                'per_office': self.per_office,
+                'reloads': self.reloads,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
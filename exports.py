@@ -0,0 +1,144 @@
+# Выгрузка записей на занятия за период: CSV или Parquet, потоком из серверного курсора.
+# Строки читаются пачками по fetch_size и сразу превращаются в байты ответа или файла, поэтому память
+# процесса не зависит от размера выгрузки. Используется эндпоинтом /exports/registrations и из командной строки:
+#
+#   python exports.py --date-from 2026-10-01 --date-to 2026-10-31 --office-id 1 --format parquet -o october.parquet
+import argparse
+import csv
+import io
+import os
+import sys
+from datetime import date
+
+from sqlalchemy import text
+
+FORMATS = ('csv', 'parquet')
+MIMETYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+COLUMNS = [
+    'registration_id', 'registered_at', 'event_id', 'event_date', 'event_time', 'office_id', 'office_name',
+    'coach', 'user_id', 'user_name', 'telegram_id',
+]
+
+# Порядок по событиям и записям, чтобы выгрузки за один и тот же период совпадали
+_REGISTRATIONS_SQL = '''
+SELECT r.id, r.created_at, e.id, e.date, e.time, o.id, o.name, e.coach, u.id, u.name, u.telegram_id
+FROM event_registration r
+JOIN events e ON e.id = r.event_id
+JOIN offices o ON o.id = e.office_id
+JOIN users u ON u.id = r.user_id
+WHERE e.starts_at >= :date_from AND e.starts_at < CAST(:date_to AS date) + 1  -- по индексу starts_at
+  AND (CAST(:office_id AS integer) IS NULL OR e.office_id = :office_id)
+ORDER BY e.date, e.time, e.id, r.id
+'''
+
+
+def registration_batches(session, date_from, date_to, office_id=None, fetch_size=10000):
+    """Записи на события с date_from по date_to включительно: списки строк (кортежи в порядке COLUMNS).
+
+    stream_results - серверный курсор: psycopg2 держит в памяти не больше fetch_size строк.
+    """
+    result = session.connection().execution_options(stream_results=True, max_row_buffer=fetch_size).execute(
+        text(_REGISTRATIONS_SQL), {'date_from': date_from, 'date_to': date_to, 'office_id': office_id})
+    try:
+        for batch in result.partitions(fetch_size):
+            yield batch
+    finally:
+        result.close()
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл только для записи, из которого ParquetWriter забирают по мере записи (на диск ничего не пишется)."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_chunks(batches):
+    """Parquet по группе строк (row group) на пачку; в памяти - только текущая пачка и её сжатые байты."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('registration_id', pa.int64()), ('registered_at', pa.timestamp('us')), ('event_id', pa.int64()),
+        ('event_date', pa.date32()), ('event_time', pa.time64('us')), ('office_id', pa.int64()),
+        ('office_name', pa.string()), ('coach', pa.string()), ('user_id', pa.int64()), ('user_name', pa.string()),
+        ('telegram_id', pa.int64()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(session, fmt, date_from, date_to, office_id=None, fetch_size=10000):
+    batches = registration_batches(session, date_from, date_to, office_id, fetch_size)
+    return csv_chunks(batches) if fmt == 'csv' else parquet_chunks(batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Выгрузка записей на занятия за период')
+    parser.add_argument('--date-from', type=date.fromisoformat, required=True)
+    parser.add_argument('--date-to', type=date.fromisoformat, required=True)
+    parser.add_argument('--office-id', type=int)
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--fetch-size', type=int, default=int(os.environ.get('EXPORT_FETCH_SIZE', 10000)))
+    parser.add_argument('-o', '--output', help='файл; по умолчанию stdout')
+    args = parser.parse_args()
+
+    from app import create_app, db
+
+    app = create_app(components=[])
+    with app.app_context():
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in export_chunks(db.session, args.format, args.date_from, args.date_to, args.office_id,
+                                       args.fetch_size):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import os
+
+# Продакшен-запуск API: gunicorn -c gunicorn.conf.py wsgi:app
+# Воркеры и потоки задаются теми же переменными, по которым app.db_pool_options делит
+# DB_MAX_CONNECTIONS между воркерами, поэтому все воркеры вместе не превысят бюджет соединений Postgres.
+
+bind = f"{os.environ.get('API_HOST', '0.0.0.0')}:{os.environ.get('API_PORT', 8081)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('WEB_THREADS', 8))
+worker_class = 'gthread'
+
+# Приложение создаётся в каждом воркере после fork: у каждого свой пул соединений
+preload_app = False
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+# При SIGTERM воркер перестаёт принимать соединения и дорабатывает начатые запросы столько секунд
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    # Соединения с базой и кэши - до первого запроса, а не на нём
+    from app import warm_up
+    warm_up(worker.wsgi)
+    worker.log.info('Worker %s warmed up', worker.pid)
+
+
+def worker_exit(server, worker):
+    from app import shut_down
+    shut_down(worker.wsgi)
@@ -0,0 +1,24 @@
+-- Счётчик занятых мест на событии и уникальная запись (event_id, user_id)
+-- Применение: psql "$DATABASE_URL" -f migrations/001_event_seat_counter.sql
+
+BEGIN;
+
+-- Убираем дубли записей, которые могли появиться до уникального ключа
+DELETE FROM event_registration a
+USING event_registration b
+WHERE a.event_id = b.event_id
+  AND a.user_id = b.user_id
+  AND a.id > b.id;
+
+ALTER TABLE event_registration
+    ADD CONSTRAINT uq_event_registration_event_user UNIQUE (event_id, user_id);
+
+ALTER TABLE events
+    ADD COLUMN registered_participants integer NOT NULL DEFAULT 0;
+
+UPDATE events e
+SET registered_participants = r.cnt
+FROM (SELECT event_id, count(*) AS cnt FROM event_registration GROUP BY event_id) r
+WHERE r.event_id = e.id;
+
+COMMIT;
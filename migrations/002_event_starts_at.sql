@@ -0,0 +1,12 @@
+-- Хранимое начало события starts_at = date + time и индексы для выборок предстоящих событий
+-- Применение: psql "$DATABASE_URL" -f migrations/002_event_starts_at.sql
+-- ADD COLUMN ... STORED переписывает таблицу events под эксклюзивной блокировкой,
+-- индексы строятся CONCURRENTLY и не блокируют запись (поэтому без BEGIN/COMMIT).
+
+ALTER TABLE events
+    ADD COLUMN starts_at timestamp GENERATED ALWAYS AS (date + time) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_events_office_id_starts_at ON events (office_id, starts_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_events_starts_at ON events (starts_at);
+
+ANALYZE events;
@@ -0,0 +1,4 @@
+-- Индекс для поиска пользователя по telegram_id (его делает почти каждый эндпоинт)
+-- Применение: psql "$DATABASE_URL" -f migrations/003_users_telegram_id_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_telegram_id ON users (telegram_id);
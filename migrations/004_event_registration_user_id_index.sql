@@ -0,0 +1,4 @@
+-- Индекс для записей одного пользователя (/available_events, /user_events)
+-- Применение: psql "$DATABASE_URL" -f migrations/004_event_registration_user_id_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_event_registration_user_id ON event_registration (user_id);
@@ -0,0 +1,22 @@
+-- Ссылка события на тренера по id вместо сравнения строк Coach.name == Event.coach
+-- Применение: psql "$DATABASE_URL" -f migrations/005_event_coach_id.sql
+-- Внешний ключ добавляется NOT VALID и проверяется отдельно, чтобы не держать блокировку на время проверки;
+-- индекс строится CONCURRENTLY (поэтому без BEGIN/COMMIT).
+
+ALTER TABLE events ADD COLUMN IF NOT EXISTS coach_id integer;
+
+ALTER TABLE events
+    ADD CONSTRAINT events_coach_id_fkey FOREIGN KEY (coach_id) REFERENCES coaches (id) ON DELETE SET NULL NOT VALID;
+
+-- Заполняем по имени; если тренеров с одним именем несколько, берём первого
+UPDATE events e
+SET coach_id = c.id
+FROM (SELECT DISTINCT ON (name) id, name FROM coaches ORDER BY name, id) c
+WHERE e.coach_id IS NULL
+  AND e.coach = c.name;
+
+ALTER TABLE events VALIDATE CONSTRAINT events_coach_id_fkey;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_events_coach_id ON events (coach_id);
+
+ANALYZE events;
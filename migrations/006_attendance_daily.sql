@@ -0,0 +1,32 @@
+-- Сводка посещаемости по (офис, тренер, день) для /analytics/attendance
+-- Применение: psql "$DATABASE_URL" -f migrations/006_attendance_daily.sql
+-- Применяйте до выкладки кода, который её ведёт. Записи, сделанные между миграцией и выкладкой,
+-- исправит сверка: python analytics.py reconcile --date-from <дата миграции> --date-to <последнее занятие>
+-- Отмены до миграции не восстановить (записи удалены), их счётчик начинается с нуля.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS attendance_daily (
+    office_id integer NOT NULL REFERENCES offices (id),
+    coach varchar(255) NOT NULL,
+    date date NOT NULL,
+    events integer NOT NULL DEFAULT 0,
+    capacity integer NOT NULL DEFAULT 0,
+    registrations integer NOT NULL DEFAULT 0,
+    cancellations integer NOT NULL DEFAULT 0,
+    updated_at timestamp NOT NULL DEFAULT now(),
+    PRIMARY KEY (office_id, coach, date)
+);
+
+CREATE INDEX IF NOT EXISTS ix_attendance_daily_date ON attendance_daily (date);
+
+INSERT INTO attendance_daily (office_id, coach, date, events, capacity, registrations)
+SELECT e.office_id, e.coach, e.date, count(*), sum(e.max_participants), coalesce(sum(r.cnt), 0)
+FROM events e
+LEFT JOIN (SELECT event_id, count(*) AS cnt FROM event_registration GROUP BY event_id) r ON r.event_id = e.id
+GROUP BY e.office_id, e.coach, e.date
+ON CONFLICT (office_id, coach, date) DO NOTHING;
+
+COMMIT;
+
+ANALYZE attendance_daily;
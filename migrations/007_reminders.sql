@@ -0,0 +1,24 @@
+-- Очередь напоминаний о занятиях: строка на запись, due_at - когда напомнить (для /reminders/due)
+-- Применение: psql "$DATABASE_URL" -f migrations/007_reminders.sql
+-- Напоминания для уже существующих будущих записей ставятся за 60 минут до начала - как
+-- REMINDER_LEAD_MINUTES по умолчанию; если у вас другое значение, поправьте интервал ниже.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS reminders (
+    registration_id integer PRIMARY KEY REFERENCES event_registration (id) ON DELETE CASCADE,
+    due_at timestamp NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_reminders_due_at ON reminders (due_at);
+
+INSERT INTO reminders (registration_id, due_at)
+SELECT r.id, e.starts_at - interval '60 minutes'
+FROM event_registration r
+JOIN events e ON e.id = r.event_id
+WHERE e.starts_at - interval '60 minutes' > LOCALTIMESTAMP
+ON CONFLICT (registration_id) DO NOTHING;
+
+COMMIT;
+
+ANALYZE reminders;
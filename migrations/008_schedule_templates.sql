@@ -0,0 +1,41 @@
+-- Шаблоны повторяющегося расписания и уникальность события по (офис, дата, время) для schedule.py
+-- Применение: psql "$DATABASE_URL" -f migrations/008_schedule_templates.sql
+-- Если в events уже есть несколько событий в одном офисе на одно время, миграция остановится: перенесите
+-- записи на одно из них, остальные удалите и запустите снова. Список таких событий:
+--   SELECT office_id, date, time, array_agg(id ORDER BY id) FROM events GROUP BY 1, 2, 3 HAVING count(*) > 1;
+-- Индекс строится CONCURRENTLY (поэтому без BEGIN/COMMIT). Если построение прервалось, удалите невалидный
+-- индекс (DROP INDEX CONCURRENTLY uq_events_office_date_time) и запустите снова.
+
+\set ON_ERROR_STOP on
+
+DO $$
+DECLARE
+    duplicates integer;
+BEGIN
+    SELECT count(*) INTO duplicates
+    FROM (SELECT 1 FROM events GROUP BY office_id, date, time HAVING count(*) > 1) d;
+    IF duplicates > 0 THEN
+        RAISE EXCEPTION 'в events % повторяющихся (office_id, date, time), см. заголовок миграции', duplicates;
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_events_office_date_time ON events (office_id, date, time);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_events_office_date_time') THEN
+        ALTER TABLE events ADD CONSTRAINT uq_events_office_date_time UNIQUE USING INDEX uq_events_office_date_time;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS schedule_templates (
+    id serial PRIMARY KEY,
+    office_id integer NOT NULL REFERENCES offices (id),
+    coach_id integer NOT NULL REFERENCES coaches (id) ON DELETE CASCADE,
+    weekdays smallint[] NOT NULL,
+    time time NOT NULL,
+    max_participants integer NOT NULL,
+    starts_on date NOT NULL DEFAULT current_date,
+    ends_on date,
+    CONSTRAINT ck_schedule_templates_weekdays CHECK (weekdays <@ '{1,2,3,4,5,6,7}' AND cardinality(weekdays) > 0)
+);
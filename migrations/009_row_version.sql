@@ -0,0 +1,29 @@
+-- Номер изменения строки row_version для версий данных (ETag) вместо max(xmin): xmin 32-битный и после
+-- переполнения счётчика транзакций идёт по кругу, а наибольший xmin не меняется, если транзакции
+-- коммитятся не в порядке номеров. Вставка берёт номер из последовательности, изменение - триггер.
+-- Применение: psql "$DATABASE_URL" -f migrations/009_row_version.sql
+-- ADD COLUMN с DEFAULT nextval(...) переписывает таблицы под эксклюзивной блокировкой.
+
+BEGIN;
+
+CREATE SEQUENCE IF NOT EXISTS data_version_seq;
+
+CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.row_version := nextval('data_version_seq');
+    RETURN NEW;
+END
+$$;
+
+ALTER TABLE offices ADD COLUMN IF NOT EXISTS row_version bigint NOT NULL DEFAULT nextval('data_version_seq');
+ALTER TABLE events ADD COLUMN IF NOT EXISTS row_version bigint NOT NULL DEFAULT nextval('data_version_seq');
+ALTER TABLE coaches ADD COLUMN IF NOT EXISTS row_version bigint NOT NULL DEFAULT nextval('data_version_seq');
+
+DROP TRIGGER IF EXISTS offices_row_version ON offices;
+CREATE TRIGGER offices_row_version BEFORE UPDATE ON offices FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+DROP TRIGGER IF EXISTS events_row_version ON events;
+CREATE TRIGGER events_row_version BEFORE UPDATE ON events FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+DROP TRIGGER IF EXISTS coaches_row_version ON coaches;
+CREATE TRIGGER coaches_row_version BEFORE UPDATE ON coaches FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+
+COMMIT;
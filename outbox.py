@@ -0,0 +1,409 @@
+# Очередь исходящих сообщений бота для рассылок ("занятие отменено") и напоминаний.
+# Сообщения лежат в SQLite на стороне бота, их отправляет отдельный процесс с ограничением скорости:
+# общий token bucket на всего бота и по одному на чат, под лимиты Telegram (около 30 сообщений в секунду
+# и 1 сообщение в секунду в один чат). На 429 отправка приостанавливается на retry_after из ответа.
+# Сообщения забираются и отмечаются пачками, по транзакции SQLite на пачку; после падения процесса
+# отправка продолжается с того же места (сообщения, которые были в полёте, уйдут ещё раз).
+#
+#   python outbox.py broadcast --event-id 42 --text "Занятие в 12:30 отменено"
+#   python outbox.py run  # заодно забирает напоминания о занятиях из API (reminders.py)
+#   python outbox.py status
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PATH = os.environ.get('OUTBOX_PATH', 'outbox.sqlite3')
+# Сообщений в секунду на всего бота и в один чат; Telegram отвечает 429 примерно после 30/с и 1/с
+OUTBOX_GLOBAL_RATE = float(os.environ.get('OUTBOX_GLOBAL_RATE', 25))
+OUTBOX_CHAT_RATE = float(os.environ.get('OUTBOX_CHAT_RATE', 1))
+# Параллельных запросов к Bot API: при задержке ответа 100 мс одним потоком больше 10/с не отправить
+OUTBOX_SENDERS = int(os.environ.get('OUTBOX_SENDERS', 8))
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+# Сколько раз пробовать при сетевых ошибках и 5xx; 429 в попытки не засчитывается
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5))
+# Как часто записывать результаты отправки в SQLite и проверять новые сообщения, секунды
+FLUSH_INTERVAL = 0.5
+POLL_INTERVAL = 1.0
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    broadcast_id INTEGER REFERENCES broadcasts (id),
+    -- Необязательный ключ: сообщение с тем же ключом второй раз в очередь не попадёт
+    key TEXT UNIQUE,
+    chat_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    parse_mode TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending, sending, sent, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_messages_due ON messages (not_before, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS ix_messages_broadcast ON messages (broadcast_id, status);
+'''
+
+OutboxMessage = namedtuple('OutboxMessage', 'id chat_id text parse_mode attempts')
+
+
+class OutboxStore:
+    """Сообщения в SQLite. Одно соединение на процесс, доступ под блокировкой."""
+
+    def __init__(self, path=OUTBOX_PATH):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE: запись из другого процесса (broadcast) подождёт, а не упадёт посреди транзакции
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def enqueue(self, messages, name=None):
+        """Ставит сообщения в очередь одной транзакцией; messages - словари chat_id, text[, parse_mode, key, not_before].
+
+        С name создаётся рассылка, по её id видно прогресс. Возвращает (id рассылки или None, сколько добавлено).
+        """
+        now = time.time()
+        with self._transaction() as db:
+            broadcast_id = None
+            if name is not None:
+                broadcast_id = db.execute('INSERT INTO broadcasts (name, created_at) VALUES (?, ?)',
+                                          (name, now)).lastrowid
+            before = db.total_changes
+            db.executemany(
+                'INSERT OR IGNORE INTO messages (broadcast_id, key, chat_id, text, parse_mode, not_before, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(broadcast_id, m.get('key'), m['chat_id'], m['text'], m.get('parse_mode'), m.get('not_before', 0), now)
+                 for m in messages])
+            return broadcast_id, db.total_changes - before
+
+    def take_due(self, limit, now, wait_for_chat):
+        """До limit сообщений, которым пора уйти, помечает sending и возвращает.
+
+        wait_for_chat(message) - сколько ещё ждать чату этого сообщения (0 - можно отправлять); такие
+        сообщения откладываются на это время и остаются в очереди.
+        """
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT id, chat_id, text, parse_mode, attempts FROM messages "
+                "WHERE status = 'pending' AND not_before <= ? ORDER BY not_before, id LIMIT ?", (now, limit)).fetchall()
+            taken, postponed = [], []
+            for message in map(OutboxMessage._make, rows):
+                wait = wait_for_chat(message)
+                if wait > 0:
+                    postponed.append((now + wait, now, message.id))
+                else:
+                    taken.append(message)
+            db.executemany("UPDATE messages SET status = 'sending', updated_at = ? WHERE id = ?",
+                           [(now, message.id) for message in taken])
+            db.executemany('UPDATE messages SET not_before = ?, updated_at = ? WHERE id = ?', postponed)
+        return taken
+
+    def finish(self, sent=(), retries=(), failures=()):
+        """Результаты отправки одной транзакцией: sent - id; retries - (id, not_before, attempts, error);
+        failures - (id, attempts, error)."""
+        now = time.time()
+        with self._transaction() as db:
+            db.executemany("UPDATE messages SET status = 'sent', attempts = attempts + 1, error = NULL, updated_at = ? "
+                           "WHERE id = ?", [(now, message_id) for message_id in sent])
+            db.executemany("UPDATE messages SET status = 'pending', not_before = ?, attempts = ?, error = ?, "
+                           "updated_at = ? WHERE id = ?",
+                           [(not_before, attempts, error, now, message_id)
+                            for message_id, not_before, attempts, error in retries])
+            db.executemany("UPDATE messages SET status = 'failed', attempts = ?, error = ?, updated_at = ? WHERE id = ?",
+                           [(attempts, error, now, message_id) for message_id, attempts, error in failures])
+
+    def release(self, ids, not_before):
+        """Возвращает забранные, но не отправленные сообщения в очередь."""
+        with self._transaction() as db:
+            db.executemany("UPDATE messages SET status = 'pending', not_before = ? WHERE id = ? AND status = 'sending'",
+                           [(not_before, message_id) for message_id in ids])
+
+    def requeue_in_flight(self):
+        """После падения: сообщения, которые отправлялись, снова в очереди (лучше дубль, чем потеря)."""
+        with self._transaction() as db:
+            return db.execute("UPDATE messages SET status = 'pending' WHERE status = 'sending'").rowcount
+
+    def progress(self, broadcast_id=None):
+        """Число сообщений по статусам: рассылки broadcast_id или всей очереди."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT status, count(*) FROM messages WHERE ? IS NULL OR broadcast_id = ? GROUP BY status',
+                (broadcast_id, broadcast_id)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity про запас. Им пользуется только поток раздачи, поэтому без блокировок."""
+
+    def __init__(self, rate, capacity=1.0, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self):
+        """Через сколько секунд появится токен."""
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self._tokens -= 1
+
+    def idle(self):
+        self._refill()
+        return self._tokens >= self.capacity
+
+
+class Outbox:
+    """Отправляет сообщения из OutboxStore через bot.send_message с ограничением скорости.
+
+    Один поток раздачи забирает пачки из SQLite и выдаёт сообщения не чаще лимитов, HTTP-запросы к Bot API
+    идут в пуле из senders потоков, а их результаты записываются пачкой раз в FLUSH_INTERVAL.
+    """
+
+    def __init__(self, store, bot, global_rate=OUTBOX_GLOBAL_RATE, chat_rate=OUTBOX_CHAT_RATE,
+                 senders=OUTBOX_SENDERS, batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.store = store
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._global = TokenBucket(global_rate)
+        self._chats = {}
+        self._senders = senders
+        self._slots = threading.BoundedSemaphore(senders)
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._results = {'sent': [], 'retries': [], 'failures': []}
+        self._last_flush = 0.0
+        self.counters = Counter()
+
+    def start(self):
+        requeued = self.store.requeue_in_flight()
+        if requeued:
+            logger.info('Снова в очереди после перезапуска: %s сообщений', requeued)
+        self._executor = ThreadPoolExecutor(self._senders, thread_name_prefix='outbox-sender')
+        self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Перестаёт брать новые сообщения, дожидается отправляемых и записывает их результаты."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        self._flush(force=True)
+
+    def enqueue(self, messages, name=None):
+        result = self.store.enqueue(messages, name)
+        self._wake.set()
+        return result
+
+    def wait_empty(self, timeout=None):
+        """Ждёт, пока в очереди не останется неотправленных сообщений; False - если не дождались за timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            progress = self.store.progress()
+            if not progress.get('pending') and not progress.get('sending'):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+
+    def _pause_left(self):
+        with self._lock:
+            return max(0.0, self._paused_until - time.monotonic())
+
+    def _pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _wait_for_chat(self, message):
+        bucket = self._chats.get(message.chat_id)
+        if bucket is None:
+            # Простаивающие чаты забываем, чтобы словарь не рос бесконечно
+            if len(self._chats) >= 10 * self.batch_size:
+                self._chats = {chat_id: b for chat_id, b in self._chats.items() if not b.idle()}
+            bucket = self._chats[message.chat_id] = TokenBucket(self.chat_rate)
+        wait = bucket.wait_time()
+        if not wait:
+            bucket.take()
+        return wait
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._flush()
+            pause = self._pause_left()
+            if pause:
+                self._stop.wait(pause)
+                continue
+            batch = self.store.take_due(self.batch_size, time.time(), self._wait_for_chat)
+            if not batch:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            for index, message in enumerate(batch):
+                wait = self._global.wait_time()
+                if wait:
+                    self._stop.wait(wait)
+                pause = self._pause_left()
+                if pause or self._stop.is_set():
+                    self.store.release([m.id for m in batch[index:]], time.time() + pause)
+                    break
+                self._global.take()
+                self._slots.acquire()
+                self._executor.submit(self._send, message)
+                self._flush()
+
+    def _send(self, message):
+        try:
+            self.bot.send_message(message.chat_id, message.text, parse_mode=message.parse_mode)
+            outcome = ('sent', message.id)
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                self._pause(retry_after)
+                outcome = ('retries', (message.id, time.time() + retry_after, message.attempts, e.description))
+            elif e.error_code in (400, 403):
+                # Чат не найден или пользователь заблокировал бота - повтор не поможет
+                outcome = ('failures', (message.id, message.attempts + 1, e.description))
+            else:
+                outcome = self._backoff(message, e)
+        except Exception as e:
+            outcome = self._backoff(message, e)
+        finally:
+            self._slots.release()
+        with self._lock:
+            self._results[outcome[0]].append(outcome[1])
+            self.counters[outcome[0]] += 1
+
+    def _backoff(self, message, error):
+        attempts = message.attempts + 1
+        if attempts >= self.max_attempts:
+            return 'failures', (message.id, attempts, str(error))
+        return 'retries', (message.id, time.time() + 2 ** attempts, attempts, str(error))
+
+    def _flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        with self._lock:
+            results, self._results = self._results, {'sent': [], 'retries': [], 'failures': []}
+        if any(results.values()):
+            self.store.finish(results['sent'], results['retries'], results['failures'])
+
+    def stats(self):
+        with self._lock:
+            return {'sent': self.counters['sent'], 'retried': self.counters['retries'],
+                    'failed': self.counters['failures'], 'paused_s': max(0.0, self._paused_until - time.monotonic())}
+
+
+def _read_chat_ids(path):
+    with (sys.stdin if path == '-' else open(path)) as f:
+        return [int(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Очередь исходящих сообщений бота')
+    parser.add_argument('--path', default=OUTBOX_PATH, help='файл SQLite очереди (OUTBOX_PATH)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    broadcast = commands.add_parser('broadcast', help='поставить рассылку в очередь')
+    broadcast.add_argument('--text', required=True)
+    broadcast.add_argument('--parse-mode')
+    recipients = broadcast.add_mutually_exclusive_group(required=True)
+    recipients.add_argument('--event-id', type=int, help='всем записанным на событие (через API)')
+    recipients.add_argument('--chat-ids', help='файл с chat_id по одному в строке; - для stdin')
+    run = commands.add_parser('run', help='отправлять сообщения из очереди')
+    run.add_argument('--until-empty', action='store_true', help='выйти, когда очередь опустеет')
+    run.add_argument('--no-reminders', action='store_true', help='не забирать напоминания о занятиях из API')
+    status = commands.add_parser('status', help='сколько сообщений в каком статусе')
+    status.add_argument('--broadcast-id', type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    store = OutboxStore(args.path)
+    if args.command == 'broadcast':
+        if args.event_id is not None:
+            from bot import api
+            response = api.get(f'/events/{args.event_id}/telegram_ids', name='/events/{event_id}/telegram_ids')
+            response.raise_for_status()
+            chat_ids = response.json()
+            name = f'event {args.event_id}'
+        else:
+            chat_ids = _read_chat_ids(args.chat_ids)
+            name = args.chat_ids
+        broadcast_id, added = store.enqueue(
+            [{'chat_id': chat_id, 'text': args.text, 'parse_mode': args.parse_mode} for chat_id in chat_ids], name)
+        print(f'Рассылка {broadcast_id}: {added} сообщений в очереди')
+    elif args.command == 'run':
+        from bot import api, bot
+        from reminders import ReminderPump
+        outbox = Outbox(store, bot)
+        outbox.start()
+        pump = None if args.no_reminders else ReminderPump(api, outbox)
+        if pump:
+            pump.start()
+        try:
+            if args.until_empty:
+                outbox.wait_empty()
+            else:
+                while True:
+                    time.sleep(60)
+                    logger.info('Очередь: %s, отправка: %s', store.progress(), outbox.stats())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pump:
+                pump.stop()
+            outbox.stop()
+    else:
+        print(store.progress(args.broadcast_id))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
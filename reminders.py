@@ -0,0 +1,82 @@
+# Напоминания о занятиях на стороне бота: забирает наступившие напоминания из API (/reminders/due) пачками,
+# ставит сообщения в очередь outbox.py и подтверждает их (/reminders/ack). Очередь напоминаний ведёт API:
+# запись на занятие создаёт напоминание, отмена удаляет, перенос события сдвигает.
+# Сообщение ставится в outbox с ключом из записи и due_at, поэтому если бот упадёт между очередью и
+# подтверждением, повторно полученное напоминание второй раз не отправится. Запускается из `outbox.py run`.
+import logging
+import os
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Как часто спрашивать API о наступивших напоминаниях, секунды, и сколько забирать за запрос
+REMINDER_POLL_INTERVAL = float(os.environ.get('REMINDER_POLL_INTERVAL', 30))
+REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 500))
+
+
+def format_reminder(reminder):
+    return (f"Напоминание: занятие {reminder['event_date']} в {reminder['event_time']}, "
+            f"{reminder['office_name']}, тренер {reminder['coach']}.")
+
+
+class ReminderPump:
+    def __init__(self, api, outbox, batch_size=REMINDER_BATCH_SIZE, interval=REMINDER_POLL_INTERVAL):
+        self.api = api
+        self.outbox = outbox
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.queued = 0
+        self.expired = 0
+        self.unreachable = 0
+
+    def drain(self):
+        """Забирает все наступившие напоминания; возвращает, сколько сообщений поставлено в очередь."""
+        queued = 0
+        while True:
+            response = self.api.get('/reminders/due', params={'limit': self.batch_size})
+            response.raise_for_status()
+            reminders = response.json()
+            if not reminders:
+                return queued
+            now = datetime.now()
+            # Пользователю без telegram_id написать некуда, а chat_id в outbox обязателен: такая строка
+            # откатила бы всю пачку, и очередь встала бы на ней навсегда. Подтверждаем без сообщения
+            reachable = [r for r in reminders if r['telegram_id'] is not None]
+            # Бот мог лежать дольше, чем до начала занятия: о начавшемся занятии не напоминаем
+            current = [r for r in reachable
+                       if datetime.fromisoformat(f"{r['event_date']}T{r['event_time']}") > now]
+            _, added = self.outbox.enqueue([
+                {'chat_id': r['telegram_id'], 'text': format_reminder(r),
+                 'key': f"reminder:{r['registration_id']}:{r['due_at']}"}
+                for r in current
+            ])
+            self.api.post('/reminders/ack', json={'items': [
+                {'registration_id': r['registration_id'], 'due_at': r['due_at']} for r in reminders
+            ]}).raise_for_status()
+            queued += added
+            self.queued += added
+            self.expired += len(reachable) - len(current)
+            self.unreachable += len(reminders) - len(reachable)
+            if len(reminders) < self.batch_size:
+                return queued
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='reminder-pump', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                queued = self.drain()
+                if queued:
+                    logger.info('Напоминаний в очереди: %s', queued)
+            except Exception:
+                logger.exception('Не удалось забрать напоминания из API')
+            self._stop.wait(self.interval)
@@ -0,0 +1,79 @@
+# Повторяющееся расписание: шаблоны schedule_templates («вт/чт 12:30, Динамо, тренер X, 20 мест») превращаются
+# в события events на скользящий горизонт вперёд. Запускайте из cron раз в день, повторный запуск ничего
+# не дублирует - событие, которое уже есть в офисе на эту дату и время, пропускается (ON CONFLICT DO NOTHING):
+#
+#   python schedule.py materialize                  # на SCHEDULE_HORIZON_DAYS дней вперёд
+#   python schedule.py materialize --date-to 2027-06-30 --template-id 3
+#
+# Изменённый шаблон не трогает уже созданные события: их правят или удаляют в админке.
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+# На сколько дней вперёд создавать события
+SCHEDULE_HORIZON_DAYS = int(os.environ.get('SCHEDULE_HORIZON_DAYS', 90))
+
+WEEKDAYS = [(1, 'Пн'), (2, 'Вт'), (3, 'Ср'), (4, 'Чт'), (5, 'Пт'), (6, 'Сб'), (7, 'Вс')]
+
+# Все события шаблонов за период одним INSERT ... SELECT: дни периода, в которые действует шаблон и которые
+# совпадают с его днями недели. Уже прошедшие занятия не создаём. Вставка в порядке ключа events.
+_MATERIALIZE_SQL = '''
+INSERT INTO events (date, time, coach, coach_id, office_id, max_participants)
+SELECT CAST(d.day AS date), t.time, c.name, c.id, t.office_id, t.max_participants
+FROM schedule_templates t
+JOIN coaches c ON c.id = t.coach_id
+CROSS JOIN LATERAL generate_series(CAST(greatest(t.starts_on, :date_from) AS timestamp),
+                                   CAST(least(coalesce(t.ends_on, :date_to), :date_to) AS timestamp),
+                                   interval '1 day') AS d (day)
+WHERE CAST(extract(isodow FROM d.day) AS smallint) = ANY (t.weekdays)
+  AND CAST(d.day AS date) + t.time > LOCALTIMESTAMP
+  AND (CAST(:template_ids AS integer[]) IS NULL OR t.id = ANY (CAST(:template_ids AS integer[])))
+ORDER BY t.office_id, d.day, t.time
+ON CONFLICT (office_id, date, time) DO NOTHING
+RETURNING office_id, coach, date
+'''
+
+
+def format_weekdays(weekdays):
+    names = dict(WEEKDAYS)
+    return '/'.join(names.get(day, str(day)) for day in sorted(weekdays or ()))
+
+
+def materialize(connection, date_from, date_to, template_ids=None):
+    """Создаёт недостающие события шаблонов (всех или template_ids) за дни с date_from по date_to.
+
+    Возвращает (office_id, coach, date) созданных событий.
+    """
+    rows = connection.execute(text(_MATERIALIZE_SQL), {
+        'date_from': date_from,
+        'date_to': date_to,
+        'template_ids': list(template_ids) if template_ids is not None else None,
+    })
+    return [tuple(row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='События по шаблонам расписания')
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('materialize', help='создать недостающие события на горизонт вперёд')
+    today = date.today()
+    command.add_argument('--date-from', type=date.fromisoformat, default=today)
+    command.add_argument('--date-to', type=date.fromisoformat,
+                         default=today + timedelta(days=SCHEDULE_HORIZON_DAYS))
+    command.add_argument('--template-id', type=int, action='append', dest='template_ids')
+    args = parser.parse_args()
+
+    from app import create_app, db, materialize_schedule
+
+    app = create_app(components=[])
+    with app.app_context():
+        created = materialize_schedule(args.date_from, args.date_to, args.template_ids)
+        db.session.commit()
+    print(f'{args.date_from} - {args.date_to}: создано событий: {created}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединяет одновременные одинаковые запросы: пока по ключу выполняется fn, остальные ждут её результат.
+
+    Объединяются только вызовы, которые пересеклись по времени, результат не кэшируется.
+    Результат получают все ожидающие, поэтому он не должен меняться вызывающим кодом.
+    Если запрос идёт дольше timeout секунд, ожидающий перестаёт ждать и выполняет fn сам.
+    timeout <= 0 выключает объединение.
+    """
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def do(self, key, fn, timeout=None):
+        if self.timeout <= 0:
+            with self._lock:
+                self.calls += 1
+            return self._execute(fn)
+
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                leader = True
+            else:
+                leader = False
+
+        if leader:
+            return self._run(key, flight, fn)
+
+        if not flight.done.wait(self.timeout if timeout is None else timeout):
+            with self._lock:
+                self.timeouts += 1
+            return self._execute(fn)
+        with self._lock:
+            self.shared += 1
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _run(self, key, flight, fn):
+        try:
+            flight.result = self._execute(fn)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _execute(self, fn):
+        with self._lock:
+            self.executions += 1
+        try:
+            return fn()
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'shared': self.shared,
+                'saved_ratio': self.shared / self.calls if self.calls else 0.0,
+                'timeouts': self.timeouts,
+                'errors': self.errors,
+                'in_flight': len(self._flights),
+            }
@@ -150,8 +150,25 @@ swagger_template = {
             "get": {
                 "summary": "Список тренеров",
                 "description": "Retrieves a list of all coaches",
+                "parameters": [
+                    {
+                        "name": "Accept",
+                        "in": "header",
+                        "type": "string",
+                        "required": False,
+                        "description": "application/x-ndjson to stream rows as NDJSON (one JSON object per line) instead of a JSON array"
+                    },
+                    {
+                        "name": "If-None-Match",
+                        "in": "header",
+                        "type": "string",
+                        "required": False,
+                        "description": "ETag from a previous response"
+                    }
+                ],
                 "responses": {
-                    "200": {"description": "List of coaches"}
+                    "200": {"description": "List of coaches"},
+                    "304": {"description": "Not modified since the ETag in If-None-Match"}
                 }
             }
         },
@@ -183,7 +200,7 @@ swagger_template = {
                 "responses": {
                     "201": {"description": "User registered for event successfully"},
                     "404": {"description": "Event or User not found"},
-                    "400": {"description": "User already registered or event full or event ended"},
+                    "400": {"description": "event_id is neither an integer nor a numeric string, user already registered, event full or event ended"},
                     "500": {"description": "Internal Server Error"}
                 }
             }
@@ -215,26 +232,188 @@ swagger_template = {
                 ],
                 "responses": {
                     "200": {"description": "Event registration deleted successfully"},
+                    "400": {"description": "event_id is neither an integer nor a numeric string"},
                     "404": {"description": "User or registration not found"},
                     "500": {"description": "Internal Server Error"}
                 }
             }
         },
+        "/event_registrations/bulk": {
+            "post": {
+                "summary": "Пакетная регистрация на события",
+                "description": "Registers many (telegram_id, event_id) pairs at once. Users are resolved in one query, capacity is checked per event under a row lock, rows are inserted with multi-row INSERTs. Returns a result per item in input order",
+                "parameters": [
+                    {
+                        "name": "X-API-KEY",
+                        "in": "header",
+                        "type": "string",
+                        "required": True,
+                        "description": "API key"
+                    },
+                    {
+                        "name": "body",
+                        "in": "body",
+                        "required": True,
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "items": {
+                                    "type": "array",
+                                    "items": {
+                                        "type": "object",
+                                        "properties": {
+                                            "telegram_id": {"type": "integer"},
+                                            "event_id": {"type": "integer"}
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    }
+                ],
+                "responses": {
+                    "200": {"description": "Per-item results (status 201/400/404 each), created and failed counts"},
+                    "400": {"description": "items is not a list"},
+                    "413": {"description": "Too many items (MAX_BULK_ITEMS)"},
+                    "500": {"description": "Internal Server Error"}
+                }
+            }
+        },
+        "/event_registrations/bulk_delete": {
+            "post": {
+                "summary": "Пакетная отмена регистраций",
+                "description": "Deletes many (telegram_id, event_id) registrations at once; event_ids drops every registration of those events (class cancelled)",
+                "parameters": [
+                    {
+                        "name": "X-API-KEY",
+                        "in": "header",
+                        "type": "string",
+                        "required": True,
+                        "description": "API key"
+                    },
+                    {
+                        "name": "body",
+                        "in": "body",
+                        "required": True,
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "items": {
+                                    "type": "array",
+                                    "items": {
+                                        "type": "object",
+                                        "properties": {
+                                            "telegram_id": {"type": "integer"},
+                                            "event_id": {"type": "integer"}
+                                        }
+                                    }
+                                },
+                                "event_ids": {"type": "array", "items": {"type": "integer"}}
+                            }
+                        }
+                    }
+                ],
+                "responses": {
+                    "200": {"description": "Per-item results (status 200/400/404 each) and total deleted count"},
+                    "400": {"description": "items or event_ids malformed"},
+                    "413": {"description": "Too many items (MAX_BULK_ITEMS)"},
+                    "500": {"description": "Internal Server Error"}
+                }
+            }
+        },
+        "/event_registrations/refresh": {
+            "post": {
+                "summary": "Запись или отмена записи с обновлёнными списками событий",
+                "description": "Registers (action=register) or unregisters (action=unregister) the user and returns the refreshed available events and the user's events from the same transaction",
+                "parameters": [
+                    {
+                        "name": "X-API-KEY",
+                        "in": "header",
+                        "type": "string",
+                        "required": True,
+                        "description": "API key"
+                    },
+                    {
+                        "name": "body",
+                        "in": "body",
+                        "required": True,
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "event_id": {"type": "integer"},
+                                "telegram_id": {"type": "integer"},
+                                "action": {"type": "string", "enum": ["register", "unregister"], "default": "register"}
+                            }
+                        }
+                    }
+                ],
+                "responses": {
+                    "201": {"description": "Registered; body has message, available_events, available_next_cursor and user_events"},
+                    "200": {"description": "Unregistered; body has message, available_events, available_next_cursor and user_events"},
+                    "400": {"description": "Invalid action or event_id, user already registered, event full or event ended"},
+                    "404": {"description": "Event, user or registration not found"},
+                    "500": {"description": "Internal Server Error"}
+                }
+            }
+        },
         "/upcoming_events": {
             "get": {
                 "summary": "Получить предстоящие события",
                 "description": "Retrieves a list of upcoming events",
                 "parameters": [
+                    {
+                        "name": "Accept",
+                        "in": "header",
+                        "type": "string",
+                        "required": False,
+                        "description": "application/x-ndjson to stream rows as NDJSON (one JSON object per line) instead of a JSON array; limit then defaults to and is capped by MAX_STREAM_ROWS (100000), only the after cursor applies, no ETag or cursor headers"
+                    },
                     {
                         "name": "X-API-KEY",
                         "in": "header",
                         "type": "string",
                         "required": True,
                         "description": "API key"
+                    },
+                    {
+                        "name": "limit",
+                        "in": "query",
+                        "type": "integer",
+                        "required": False,
+                        "description": "Page size, default 20, at most MAX_PAGE_SIZE (50)"
+                    },
+                    {
+                        "name": "after",
+                        "in": "query",
+                        "type": "string",
+                        "required": False,
+                        "description": "Cursor from X-Next-Cursor: return the page after it"
+                    },
+                    {
+                        "name": "before",
+                        "in": "query",
+                        "type": "string",
+                        "required": False,
+                        "description": "Cursor from X-Prev-Cursor: return the page before it"
+                    },
+                    {
+                        "name": "If-None-Match",
+                        "in": "header",
+                        "type": "string",
+                        "required": False,
+                        "description": "ETag from a previous response"
                     }
                 ],
                 "responses": {
-                    "200": {"description": "List of upcoming events"}
+                    "200": {
+                        "description": "List of upcoming events",
+                        "headers": {
+                            "X-Next-Cursor": {"type": "string", "description": "Cursor of the next page, absent on the last page"},
+                            "X-Prev-Cursor": {"type": "string", "description": "Cursor of the previous page, absent on the first page"}
+                        }
+                    },
+                    "400": {"description": "Invalid limit or cursor"},
+                    "304": {"description": "Not modified since the ETag in If-None-Match"}
                 }
             }
         },
@@ -243,6 +422,13 @@ swagger_template = {
                 "summary": "Получить событие которые доступны для конкретного пользователя",
                 "description": "Retrieves a list of available events for a user",
                 "parameters": [
+                    {
+                        "name": "Accept",
+                        "in": "header",
+                        "type": "string",
+                        "required": False,
+                        "description": "application/x-ndjson to stream rows as NDJSON (one JSON object per line) instead of a JSON array; limit then defaults to and is capped by MAX_STREAM_ROWS (100000), only the after cursor applies, no ETag or cursor headers"
+                    },
                     {
                         "name": "X-API-KEY",
                         "in": "header",
@@ -256,12 +442,47 @@ swagger_template = {
                         "type": "integer",
                         "required": True,
                         "description": "Telegram ID of the user"
+                    },
+                    {
+                        "name": "limit",
+                        "in": "query",
+                        "type": "integer",
+                        "required": False,
+                        "description": "Page size, default 8, at most MAX_PAGE_SIZE (50)"
+                    },
+                    {
+                        "name": "after",
+                        "in": "query",
+                        "type": "string",
+                        "required": False,
+                        "description": "Cursor from X-Next-Cursor: return the page after it"
+                    },
+                    {
+                        "name": "before",
+                        "in": "query",
+                        "type": "string",
+                        "required": False,
+                        "description": "Cursor from X-Prev-Cursor: return the page before it"
+                    },
+                    {
+                        "name": "If-None-Match",
+                        "in": "header",
+                        "type": "string",
+                        "required": False,
+                        "description": "ETag from a previous response"
                     }
                 ],
                 "responses": {
-                    "200": {"description": "List of available events"},
+                    "200": {
+                        "description": "List of available events",
+                        "headers": {
+                            "X-Next-Cursor": {"type": "string", "description": "Cursor of the next page, absent on the last page"},
+                            "X-Prev-Cursor": {"type": "string", "description": "Cursor of the previous page, absent on the first page"}
+                        }
+                    },
+                    "304": {"description": "Not modified since the ETag in If-None-Match"},
                     "404": {"description": "User not found"},
-                    "400": {"description": "User telegram_id is required"}
+                    "400": {"description": "User telegram_id is required, or invalid limit or cursor"}
                 }
             }
         },
@@ -270,6 +491,13 @@ swagger_template = {
                 "summary": "Список событий на которые зарегистрирован пользователь",
                 "description": "Retrieves a list of events the user is registered for",
                 "parameters": [
+                    {
+                        "name": "Accept",
+                        "in": "header",
+                        "type": "string",
+                        "required": False,
+                        "description": "application/x-ndjson to stream rows as NDJSON (one JSON object per line) instead of a JSON array"
+                    },
                     {
                         "name": "X-API-KEY",
                         "in": "header",
@@ -297,12 +525,33 @@ swagger_template = {
                 "summary": "Админский метод - список записавшихся на событие",
                 "description": "Retrieves a list of upcoming event registrations",
                 "parameters": [
+                    {
+                        "name": "Accept",
+                        "in": "header",
+                        "type": "string",
+                        "required": False,
+                        "description": "application/x-ndjson to stream rows as NDJSON (one JSON object per line) instead of a JSON array"
+                    },
                     {
                         "name": "X-API-KEY",
                         "in": "header",
                         "type": "string",
                         "required": True,
                         "description": "API key"
+                    },
+                    {
+                        "name": "office_id",
+                        "in": "query",
+                        "type": "integer",
+                        "required": False,
+                        "description": "Only events in this office"
+                    },
+                    {
+                        "name": "telegram_id",
+                        "in": "query",
+                        "type": "integer",
+                        "required": False,
+                        "description": "Only events in the user's favourite office (ignored if office_id is set)"
                     }
                 ],
                 "responses": {
@@ -310,6 +559,198 @@ swagger_template = {
                 }
             }
         },
+        "/events/{event_id}/telegram_ids": {
+            "get": {
+                "summary": "telegram_id всех, кто записан на событие",
+                "description": "Recipients for bot broadcasts about this event (outbox.py broadcast --event-id), in registration order",
+                "parameters": [
+                    {
+                        "name": "X-API-KEY",
+                        "in": "header",
+                        "type": "string",
+                        "required": True,
+                        "description": "API key"
+                    },
+                    {
+                        "name": "event_id",
+                        "in": "path",
+                        "type": "integer",
+                        "required": True,
+                        "description": "Event ID"
+                    }
+                ],
+                "responses": {
+                    "200": {"description": "List of telegram_id"},
+                    "404": {"description": "Event not found"}
+                }
+            }
+        },
+        "/reminders/due": {
+            "get": {
+                "summary": "Наступившие напоминания о занятиях",
+                "description": "Earliest reminders with due_at in the past, read through the due_at index. Read-only: confirm delivery with /reminders/ack. The bot skips reminders for events that have already started but still acknowledges them",
+                "parameters": [
+                    {
+                        "name": "X-API-KEY",
+                        "in": "header",
+                        "type": "string",
+                        "required": True,
+                        "description": "API key"
+                    },
+                    {
+                        "name": "limit",
+                        "in": "query",
+                        "type": "integer",
+                        "required": False,
+                        "description": "Batch size, default 100, at most MAX_REMINDER_BATCH"
+                    }
+                ],
+                "responses": {
+                    "200": {"description": "List of reminders: registration_id, due_at, telegram_id, event_id, event_date, event_time, coach, office_name"}
+                }
+            }
+        },
+        "/reminders/ack": {
+            "post": {
+                "summary": "Подтвердить, что напоминания поставлены в очередь бота",
+                "description": "Deletes the given reminders. A reminder whose due_at changed since it was read (the event was moved) is kept",
+                "parameters": [
+                    {
+                        "name": "X-API-KEY",
+                        "in": "header",
+                        "type": "string",
+                        "required": True,
+                        "description": "API key"
+                    },
+                    {
+                        "name": "body",
+                        "in": "body",
+                        "required": True,
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "items": {
+                                    "type": "array",
+                                    "items": {
+                                        "type": "object",
+                                        "properties": {
+                                            "registration_id": {"type": "integer"},
+                                            "due_at": {"type": "string", "format": "date-time"}
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    }
+                ],
+                "responses": {
+                    "200": {"description": "Number of deleted reminders"},
+                    "400": {"description": "Invalid items"},
+                    "413": {"description": "Too many items"}
+                }
+            }
+        },
+        "/exports/registrations": {
+            "get": {
+                "summary": "Выгрузка записей на занятия за период (CSV или Parquet)",
+                "description": "Streams registrations joined with users, events and offices for events between date_from and date_to, read from a server-side cursor",
+                "produces": ["text/csv", "application/vnd.apache.parquet"],
+                "parameters": [
+                    {
+                        "name": "X-API-KEY",
+                        "in": "header",
+                        "type": "string",
+                        "required": True,
+                        "description": "API key"
+                    },
+                    {
+                        "name": "date_from",
+                        "in": "query",
+                        "type": "string",
+                        "format": "date",
+                        "required": True,
+                        "description": "First event date, YYYY-MM-DD"
+                    },
+                    {
+                        "name": "date_to",
+                        "in": "query",
+                        "type": "string",
+                        "format": "date",
+                        "required": True,
+                        "description": "Last event date (inclusive), YYYY-MM-DD"
+                    },
+                    {
+                        "name": "office_id",
+                        "in": "query",
+                        "type": "integer",
+                        "required": False,
+                        "description": "Only events in this office"
+                    },
+                    {
+                        "name": "format",
+                        "in": "query",
+                        "type": "string",
+                        "enum": ["csv", "parquet"],
+                        "required": False,
+                        "description": "Output format, default csv"
+                    }
+                ],
+                "responses": {
+                    "200": {"description": "Export file, sent as an attachment while it is being written"},
+                    "400": {"description": "Invalid dates or format"},
+                    "501": {"description": "Parquet requested but pyarrow is not installed"}
+                }
+            }
+        },
+        "/analytics/attendance": {
+            "get": {
+                "summary": "Заполняемость занятий и отмены записей за период",
+                "description": "Aggregates the attendance_daily rollup (one row per office, coach and day) without touching event_registration. fill_rate = registrations / capacity, cancellation_rate = cancellations / (registrations + cancellations)",
+                "parameters": [
+                    {
+                        "name": "X-API-KEY",
+                        "in": "header",
+                        "type": "string",
+                        "required": True,
+                        "description": "API key"
+                    },
+                    {
+                        "name": "date_from",
+                        "in": "query",
+                        "type": "string",
+                        "format": "date",
+                        "required": True,
+                        "description": "First event date, YYYY-MM-DD"
+                    },
+                    {
+                        "name": "date_to",
+                        "in": "query",
+                        "type": "string",
+                        "format": "date",
+                        "required": True,
+                        "description": "Last event date (inclusive), YYYY-MM-DD"
+                    },
+                    {
+                        "name": "group_by",
+                        "in": "query",
+                        "type": "string",
+                        "required": False,
+                        "description": "Comma-separated groupings: office, coach, weekday (1 = Monday), date, week. Default office"
+                    },
+                    {
+                        "name": "office_id",
+                        "in": "query",
+                        "type": "integer",
+                        "required": False,
+                        "description": "Only events in this office"
+                    }
+                ],
+                "responses": {
+                    "200": {"description": "Rows with the group fields plus events, capacity, registrations, cancellations, fill_rate and cancellation_rate"},
+                    "400": {"description": "Invalid dates or group_by"}
+                }
+            }
+        },
         "/users/office/{telegram_id}": {
             "get": {
                 "summary": "Получить инфу какой любимый офис у пользователя",
@@ -372,6 +813,24 @@ swagger_template = {
                     "500": {"description": "Internal Server Error"}
                 }
             }
+        },
+        "/metrics": {
+            "get": {
+                "summary": "Счётчики кэшей процесса",
+                "description": "Hit/miss counters of the in-process caches of the worker that served the request",
+                "parameters": [
+                    {
+                        "name": "X-API-KEY",
+                        "in": "header",
+                        "type": "string",
+                        "required": True,
+                        "description": "API key"
+                    }
+                ],
+                "responses": {
+                    "200": {"description": "Cache counters"}
+                }
+            }
         }
     }
 }
\ No newline at end of file
@@ -0,0 +1,65 @@
+import gzip
+import hashlib
+import json
+import re
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # без brotli отдаём только gzip и несжатый JSON
+    brotli = None
+
+# Методы, которые Flask добавляет к каждому маршруту сам; в спецификации их нет
+_IMPLICIT_METHODS = {'HEAD', 'OPTIONS'}
+
+
+class PrecompressedSpec:
+    """Спецификация OpenAPI, один раз сериализованная в JSON и сжатая gzip и brotli.
+
+    Ответ - готовые байты нужной кодировки, на запрос ничего не сериализуется и не сжимается.
+    У каждой кодировки свой ETag; If-None-Match с любым из них - 304, содержимое у них одно.
+    """
+
+    def __init__(self, spec):
+        self.body = json.dumps(spec, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode()
+        digest = hashlib.sha1(self.body).hexdigest()
+        self.encoded = {'identity': self.body, 'gzip': gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(self.body, quality=11)
+        self.etags = {encoding: f'{digest}-{encoding}' for encoding in self.encoded}
+
+    def response(self):
+        encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in self.encoded]) or 'identity'
+        if any(etag in request.if_none_match for etag in self.etags.values()):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(self.encoded[encoding], mimetype='application/json',
+                                                  direct_passthrough=True)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(self.etags[encoding])
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def stats(self):
+        return {encoding: len(body) for encoding, body in self.encoded.items()}
+
+
+def spec_drift(spec, app, blueprint):
+    """Расхождения между путями спецификации и маршрутами blueprint: список строк, пустой - всё совпадает."""
+    documented = {
+        (path, method.upper())
+        for path, operations in spec.get('paths', {}).items()
+        for method in operations if method != 'parameters'
+    }
+    routed = set()
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint.split('.', 1)[0] != blueprint:
+            continue
+        # /users/<int:telegram_id> -> /users/{telegram_id}
+        path = re.sub(r'<(?:[^:<>]+:)?([^<>]+)>', r'{\1}', rule.rule)
+        routed.update((path, method) for method in rule.methods - _IMPLICIT_METHODS)
+    return ([f'нет в спецификации: {method} {path}' for path, method in sorted(routed - documented)] +
+            [f'нет маршрута: {method} {path}' for path, method in sorted(documented - routed)])
@@ -0,0 +1,93 @@
+import os
+import sys
+from datetime import date, time, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py читает настройки при импорте; для тестов без базы хватает SQLite в памяти
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('API_KEY', 'test-key')
+
+# Тесты с Postgres пересоздают все таблицы в этой базе - только отдельная, пустая база
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+
+@pytest.fixture(scope='session')
+def pg_app():
+    """Приложение на TEST_DATABASE_URL со свежей схемой; без переменной тест пропускается."""
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL не задан')
+    import app as app_module
+
+    previous = os.environ.get('DATABASE_URL')
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    try:
+        flask_app = app_module.create_app(components=[])
+    finally:
+        os.environ['DATABASE_URL'] = previous
+    with flask_app.app_context():
+        app_module.db.drop_all()
+        app_module.db.create_all()
+    yield flask_app
+    with flask_app.app_context():
+        app_module.db.engine.dispose()
+
+
+@pytest.fixture
+def pg(pg_app, monkeypatch):
+    """Пустые таблицы и кэши процесса перед каждым тестом."""
+    import app as app_module
+
+    monkeypatch.setattr(app_module, 'API_KEY', 'test-key')
+    with pg_app.app_context():
+        tables = ', '.join(table.name for table in app_module.db.metadata.sorted_tables)
+        app_module.db.session.execute(app_module.db.text(f'TRUNCATE {tables} RESTART IDENTITY CASCADE'))
+        app_module.db.session.commit()
+    app_module.user_cache.clear()
+    app_module.events_snapshot.invalidate()
+    app_module.coach_directory.invalidate()
+    return pg_app
+
+
+@pytest.fixture
+def pg_client(pg):
+    client = pg.test_client()
+    client.environ_base['HTTP_X_API_KEY'] = 'test-key'
+    return client
+
+
+class Factory:
+    """Тестовые данные через ORM; каждый метод коммитит и возвращает id."""
+
+    def __init__(self, flask_app):
+        import app as app_module
+        self.app = flask_app
+        self.models = app_module
+
+    def _add(self, obj):
+        with self.app.app_context():
+            self.models.db.session.add(obj)
+            self.models.db.session.commit()
+            return obj.id
+
+    def office(self, name='Офис'):
+        return self._add(self.models.Office(name=name, address='-'))
+
+    def coach(self, name='Тренер', description=None):
+        return self._add(self.models.Coach(name=name, description=description))
+
+    def event(self, office_id, days=1, at=time(12, 30), max_participants=10, coach_id=None, coach='Тренер'):
+        return self._add(self.models.Event(date=date.today() + timedelta(days=days), time=at, coach=coach,
+                                           coach_id=coach_id, office_id=office_id,
+                                           max_participants=max_participants))
+
+    def user(self, telegram_id, office=None, role='user'):
+        return self._add(self.models.User(name=f'user {telegram_id}', telegram_id=telegram_id, role=role,
+                                          office=office))
+
+
+@pytest.fixture
+def factory(pg):
+    return Factory(pg)
@@ -0,0 +1,77 @@
+from datetime import date, time, timedelta
+
+import analytics
+import app as app_module
+
+
+def rollup(flask_app):
+    """Строки сводки: (офис, тренер, день) -> (занятий, мест, записей, отмен)."""
+    with flask_app.app_context():
+        return {
+            (row.office_id, row.coach, row.date): (row.events, row.capacity, row.registrations, row.cancellations)
+            for row in app_module.AttendanceDaily.query
+        }
+
+
+def test_events_and_registrations_update_rollup(pg, pg_client, factory):
+    office_id = factory.office()
+    day = date.today() + timedelta(days=1)
+    event_id = factory.event(office_id, max_participants=5, coach='Анна')
+    factory.event(office_id, max_participants=3, coach='Анна', at=time(18))
+    for telegram_id in (1, 2, 3):
+        factory.user(telegram_id)
+    assert rollup(pg) == {(office_id, 'Анна', day): (2, 8, 0, 0)}
+
+    for telegram_id in (1, 2):
+        pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': telegram_id})
+    pg_client.post('/event_registrations/delete', json={'event_id': event_id, 'telegram_id': 1})
+    pg_client.post('/event_registrations/bulk', json={'items': [{'telegram_id': 3, 'event_id': event_id}]})
+    assert rollup(pg) == {(office_id, 'Анна', day): (2, 8, 2, 1)}
+
+
+def test_moved_event_refreshes_both_days(pg, pg_client, factory):
+    office_id = factory.office()
+    day = date.today() + timedelta(days=1)
+    event_id = factory.event(office_id, max_participants=5, coach='Анна')
+    factory.user(1)
+    pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': 1})
+
+    with pg.app_context():
+        app_module.db.session.get(app_module.Event, event_id).date = day + timedelta(days=1)
+        app_module.db.session.commit()
+    # Отмены из базы не восстановить, остальное пересчитано по событиям и записям
+    assert rollup(pg) == {
+        (office_id, 'Анна', day): (0, 0, 0, 0),
+        (office_id, 'Анна', day + timedelta(days=1)): (1, 5, 1, 0),
+    }
+
+
+def test_reconcile_fixes_drift(pg, pg_client, factory):
+    office_id = factory.office()
+    day = date.today() + timedelta(days=1)
+    event_id = factory.event(office_id, max_participants=5, coach='Анна')
+    factory.user(1)
+    pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': 1})
+    with pg.app_context():
+        app_module.db.session.execute(app_module.db.text('UPDATE attendance_daily SET registrations = 7'))
+        app_module.db.session.commit()
+        assert analytics.reconcile(app_module.db.session, day, day) == 1
+        assert analytics.reconcile(app_module.db.session, day, day) == 0
+    assert rollup(pg) == {(office_id, 'Анна', day): (1, 5, 1, 0)}
+
+
+def test_attendance_report(pg, pg_client, factory):
+    office_id = factory.office()
+    day = date.today() + timedelta(days=1)
+    event_id = factory.event(office_id, max_participants=4, coach='Анна')
+    factory.event(office_id, max_participants=4, coach='Борис', at=time(18))
+    for telegram_id in (1, 2):
+        factory.user(telegram_id)
+        pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': telegram_id})
+    pg_client.post('/event_registrations/delete', json={'event_id': event_id, 'telegram_id': 2})
+
+    response = pg_client.get(f'/analytics/attendance?date_from={day}&date_to={day}&group_by=coach')
+    assert response.status_code == 200
+    assert [(row['coach'], row['registrations'], row['fill_rate'], row['cancellation_rate'])
+            for row in response.get_json()] == [('Анна', 1, 0.25, 0.5), ('Борис', 0, 0.0, None)]
+    assert pg_client.get(f'/analytics/attendance?date_from={day}&date_to={day}&group_by=x').status_code == 400
@@ -0,0 +1,70 @@
+from datetime import time
+
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def keys(pg, monkeypatch):
+    """Ключи query_coalescer; снимок событий выключен, чтобы списки шли через запросы."""
+    monkeypatch.setattr(app_module.events_snapshot, 'ttl', 0)
+    recorded = []
+    do = app_module.query_coalescer.do
+
+    def spy(key, fn, timeout=None):
+        recorded.append(key)
+        return do(key, fn, timeout)
+
+    monkeypatch.setattr(app_module.query_coalescer, 'do', spy)
+    return recorded
+
+
+def ids(response):
+    return [event['event_id'] for event in response.get_json()]
+
+
+def test_users_of_one_office_share_query(pg, pg_client, factory, keys):
+    office_id = factory.office()
+    event_ids = [factory.event(office_id, at=time(8 + i)) for i in range(4)]
+    factory.user(1, office=office_id)
+    factory.user(2, office=office_id)
+    pg_client.post('/event_registrations', json={'event_id': event_ids[0], 'telegram_id': 2})
+
+    assert ids(pg_client.get('/available_events?telegram_id=1')) == event_ids
+    assert ids(pg_client.get('/available_events?telegram_id=2')) == event_ids[1:]
+    assert len(keys) == 2 and keys[0] == keys[1]
+    # Версия данных читается каждым запросом сам, без объединения
+    assert all(key[0] == 'available_events' for key in keys)
+
+
+def test_falls_back_when_registrations_fill_the_page(pg, pg_client, factory, keys):
+    office_id = factory.office()
+    event_ids = [factory.event(office_id, days=1 + i // 10, at=time(8 + i % 10)) for i in range(20)]
+    factory.user(1, office=office_id)
+    # Первые 2 * (8 + 1) событий заняты пользователем - общему запросу не хватит запаса
+    for event_id in event_ids[:18]:
+        pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': 1})
+
+    assert ids(pg_client.get('/available_events?telegram_id=1')) == event_ids[18:]
+
+
+def test_pages_match_per_user_query(pg, pg_client, factory, keys):
+    office_id = factory.office()
+    event_ids = [factory.event(office_id, days=1 + i // 10, at=time(8 + i % 10)) for i in range(30)]
+    factory.user(1, office=office_id)
+    for event_id in event_ids[::3]:
+        pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': 1})
+    expected = [event_id for event_id in event_ids if event_id not in event_ids[::3]]
+
+    seen, cursor = [], None
+    while True:
+        response = pg_client.get('/available_events?telegram_id=1' + (f'&after={cursor}' if cursor else ''))
+        seen += ids(response)
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert seen == expected
+
+    previous = pg_client.get(f"/available_events?telegram_id=1&before={response.headers['X-Prev-Cursor']}")
+    assert ids(previous) == expected[-len(ids(response)) - 8:-len(ids(response))]
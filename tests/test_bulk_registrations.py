@@ -0,0 +1,83 @@
+import app as app_module
+
+
+def seats(flask_app, event_id):
+    """(счётчик в events, число записей)."""
+    with flask_app.app_context():
+        counter = app_module.db.session.get(app_module.Event, event_id).registered_participants
+        rows = app_module.EventRegistration.query.filter_by(event_id=event_id).count()
+        return counter, rows
+
+
+def statuses(response):
+    return [result['status'] for result in response.get_json()['results']]
+
+
+def test_bulk_register_reports_each_item(pg, pg_client, factory):
+    office_id = factory.office()
+    event_id = factory.event(office_id, max_participants=2)
+    past_id = factory.event(office_id, days=-1)
+    for telegram_id in (1, 2, 3):
+        factory.user(telegram_id)
+
+    response = pg_client.post('/event_registrations/bulk', json={'items': [
+        {'telegram_id': 1, 'event_id': event_id},
+        {'telegram_id': 1, 'event_id': event_id},  # повтор в том же пакете
+        {'telegram_id': 2, 'event_id': event_id},
+        {'telegram_id': 3, 'event_id': event_id},  # мест уже нет
+        {'telegram_id': 3, 'event_id': past_id},
+        {'telegram_id': 3, 'event_id': event_id + 100},
+        {'telegram_id': 99, 'event_id': event_id},
+        {'telegram_id': '3', 'event_id': event_id},
+    ]})
+    assert response.status_code == 200
+    assert statuses(response) == [201, 400, 201, 400, 400, 404, 404, 400]
+    assert response.get_json()['created'] == 2
+    assert seats(pg, event_id) == (2, 2)
+    assert seats(pg, past_id) == (0, 0)
+
+
+def test_bulk_register_respects_single_registrations(pg, pg_client, factory):
+    event_id = factory.event(factory.office(), max_participants=2)
+    for telegram_id in (1, 2, 3):
+        factory.user(telegram_id)
+    pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': 1})
+
+    response = pg_client.post('/event_registrations/bulk', json={'items': [
+        {'telegram_id': telegram_id, 'event_id': event_id} for telegram_id in (1, 2, 3)
+    ]})
+    assert statuses(response) == [400, 201, 400]
+    assert seats(pg, event_id) == (2, 2)
+
+
+def test_bulk_delete_pairs_and_whole_events(pg, pg_client, factory):
+    office_id = factory.office()
+    first_id = factory.event(office_id)
+    second_id = factory.event(office_id, days=2)
+    for telegram_id in (1, 2, 3):
+        factory.user(telegram_id)
+    pg_client.post('/event_registrations/bulk', json={'items': [
+        {'telegram_id': telegram_id, 'event_id': event_id}
+        for telegram_id in (1, 2, 3) for event_id in (first_id, second_id)
+    ]})
+
+    response = pg_client.post('/event_registrations/bulk_delete', json={
+        'items': [{'telegram_id': 1, 'event_id': first_id}, {'telegram_id': 99, 'event_id': first_id}],
+        'event_ids': [second_id],
+    })
+    assert response.status_code == 200
+    assert response.get_json()['deleted'] == 4
+    assert statuses(response) == [200, 404]
+    assert seats(pg, first_id) == (2, 2)
+    assert seats(pg, second_id) == (0, 0)
+
+    again = pg_client.post('/event_registrations/bulk_delete', json={'items': [{'telegram_id': 1, 'event_id': first_id}]})
+    assert statuses(again) == [404]
+
+
+def test_bulk_request_validation(pg, pg_client, monkeypatch):
+    assert pg_client.post('/event_registrations/bulk', json={'items': 'x'}).status_code == 400
+    assert pg_client.post('/event_registrations/bulk_delete', json={'items': [], 'event_ids': ['1']}).status_code == 400
+    monkeypatch.setattr(app_module, 'MAX_BULK_ITEMS', 2)
+    response = pg_client.post('/event_registrations/bulk', json={'items': [{}] * 3})
+    assert response.status_code == 413
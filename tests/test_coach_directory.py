@@ -0,0 +1,48 @@
+from coach_directory import CoachDirectory, CoachRef
+
+
+class Loader:
+    def __init__(self, coaches):
+        self.coaches = coaches
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.coaches
+
+
+def test_sync_reloads_only_for_other_version():
+    loader = Loader([CoachRef(1, 'Анна', None)])
+    directory = CoachDirectory(ttl=300)
+    directory.sync('1:5', loader)
+    directory.sync('1:5', loader)
+    assert loader.calls == 1
+    loader.coaches = [CoachRef(1, 'Анна Петровна', None)]
+    directory.sync('1:6', loader)
+    assert directory.get(1, loader).name == 'Анна Петровна'
+    assert loader.calls == 2
+
+
+def test_invalidate_forces_sync_reload():
+    loader = Loader([CoachRef(1, 'Анна', None)])
+    directory = CoachDirectory()
+    directory.sync('1:5', loader)
+    directory.invalidate()
+    directory.sync('1:5', loader)
+    assert loader.calls == 2
+
+
+def test_unknown_id_reloads_at_most_once_per_second(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('coach_directory.time.monotonic', lambda: now[0])
+    loader = Loader([CoachRef(1, 'Анна', None)])
+    directory = CoachDirectory()
+    directory.sync('v', loader)
+    assert directory.get(2, loader) is None
+    assert loader.calls == 1
+    now[0] += 1
+    loader.coaches.append(CoachRef(2, 'Борис', None))
+    assert directory.get(2, loader).name == 'Борис'
+    # Перечитанный по неизвестному id справочник остаётся при прежней версии
+    directory.sync('v', loader)
+    assert loader.calls == 2
@@ -0,0 +1,88 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response, jsonify
+
+import compression
+from compression import ResponseCompressor
+
+ROWS = [{'event_id': i, 'office_name': 'Офис на Ленина'} for i in range(200)]
+
+
+@pytest.fixture
+def compressor():
+    return ResponseCompressor(min_size=1024)
+
+
+@pytest.fixture
+def client(compressor):
+    app = Flask(__name__)
+
+    @app.route('/big')
+    def big():
+        response = jsonify(ROWS)
+        response.set_etag('abc')
+        return response
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' * 1000, mimetype='image/png')
+
+    @app.route('/not_modified')
+    def not_modified():
+        return Response(status=304, mimetype='application/json')
+
+    @app.route('/stream')
+    def stream():
+        return Response((json.dumps(row) + '\n' for row in ROWS), mimetype='application/x-ndjson')
+
+    compressor.init_app(app)
+    return app.test_client()
+
+
+def test_large_json_gzip(client, monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['ETag'] == 'W/"abc"'
+    assert json.loads(gzip.decompress(response.data)) == ROWS
+
+
+def test_brotli_preferred():
+    brotli = pytest.importorskip('brotli')
+    app = Flask(__name__)
+    app.add_url_rule('/big', 'big', lambda: jsonify(ROWS))
+    ResponseCompressor().init_app(app)
+    response = app.test_client().get('/big', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.data)) == ROWS
+
+
+def test_skips_small_unaccepted_and_binary(client, compressor):
+    small = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers and small.get_json() == {'ok': True}
+    assert compressor.stats()['skipped_small'] == 1
+    assert 'Content-Encoding' not in client.get('/big').headers
+    assert 'Content-Encoding' not in client.get('/image', headers={'Accept-Encoding': 'gzip'}).headers
+
+
+def test_not_modified_untouched(client):
+    response = client.get('/not_modified', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 304
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_stream_compressed_by_chunks(client, compressor, monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+    assert compressor.stats()['compressed'] == {'gzip': 1}
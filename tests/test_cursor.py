@@ -0,0 +1,38 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+from app import decode_cursor, encode_cursor
+
+
+def raw_cursor(key):
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def test_roundtrip():
+    cursor = encode_cursor({'datetime': '2026-10-17 18:30:00', 'event_id': 42})
+    assert decode_cursor(cursor) == (datetime(2026, 10, 17, 18, 30), 42)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor({'datetime': '2099-12-31 23:59:59', 'event_id': 2 ** 31 - 1})
+    assert '=' not in cursor and '+' not in cursor and '/' not in cursor
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'не base64',
+    raw_cursor('123'),
+    raw_cursor('a:b'),
+    raw_cursor('1:2:3'),
+    base64.urlsafe_b64encode(b'\xff\xfe:1').decode(),
+    raw_cursor('9' * 30 + ':1'),  # OverflowError в timedelta
+    raw_cursor('300000000000:1'),  # за пределами datetime
+    raw_cursor('0:0'),
+    raw_cursor('0:-1'),
+    raw_cursor(f'0:{2 ** 31}'),  # не помещается в integer
+])
+def test_bad_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
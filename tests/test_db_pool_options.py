@@ -0,0 +1,25 @@
+import pytest
+
+from app import db_pool_options
+
+
+@pytest.mark.parametrize('workers, threads, budget, pool_size', [
+    ('1', '8', '20', 8),
+    ('4', '8', '20', 5),
+    ('3', '8', '20', 6),
+    ('20', '8', '20', 1),
+])
+def test_pool_fits_budget(monkeypatch, workers, threads, budget, pool_size):
+    monkeypatch.setenv('WEB_CONCURRENCY', workers)
+    monkeypatch.setenv('WEB_THREADS', threads)
+    monkeypatch.setenv('DB_MAX_CONNECTIONS', budget)
+    options = db_pool_options()
+    assert options['pool_size'] == pool_size and options['max_overflow'] == 0
+    assert options['pool_size'] * int(workers) <= int(budget)
+
+
+def test_budget_below_workers_fails(monkeypatch):
+    monkeypatch.setenv('WEB_CONCURRENCY', '21')
+    monkeypatch.setenv('DB_MAX_CONNECTIONS', '20')
+    with pytest.raises(ValueError, match='DB_MAX_CONNECTIONS'):
+        db_pool_options()
@@ -0,0 +1,61 @@
+import app as app_module
+
+
+def test_upcoming_etag_stable_across_reloads(pg, pg_client, factory):
+    event_id = factory.event(factory.office())
+    factory.user(1)
+
+    first = pg_client.get('/upcoming_events')
+    etag = first.headers['ETag']
+    # Перезагрузка снимка (или другой воркер со своим снимком) не меняет ETag, пока не менялись данные
+    app_module.events_snapshot.invalidate()
+    again = pg_client.get('/upcoming_events', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+
+    pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': 1})
+    changed = pg_client.get('/upcoming_events', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()[0]['registered_participants'] == 1
+
+
+def test_snapshot_follows_changes_from_other_processes(pg, pg_client, factory):
+    event_id = factory.event(factory.office())
+    assert pg_client.get('/upcoming_events').get_json()[0]['registered_participants'] == 0
+
+    # Запись мимо этого процесса: снимок о ней не знает, но версия данных изменилась
+    with pg.app_context():
+        app_module.db.session.execute(app_module.db.text(
+            'UPDATE events SET registered_participants = 3 WHERE id = :id'), {'id': event_id})
+        app_module.db.session.commit()
+    assert pg_client.get('/upcoming_events').get_json()[0]['registered_participants'] == 3
+
+
+
+def test_available_etag_stable_across_reloads(pg, pg_client, factory):
+    office_id = factory.office()
+    factory.event(office_id, coach_id=factory.coach())
+    factory.user(1, office=office_id)
+
+    etag = pg_client.get('/available_events?telegram_id=1').headers['ETag']
+    app_module.events_snapshot.invalidate()
+    app_module.coach_directory.invalidate()
+    response = pg_client.get('/available_events?telegram_id=1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_available_events_follow_coach_changes_from_other_processes(pg, pg_client, factory):
+    office_id = factory.office()
+    coach_id = factory.coach(description='старое описание')
+    factory.event(office_id, coach_id=coach_id)
+    factory.user(1, office=office_id)
+    first = pg_client.get('/available_events?telegram_id=1')
+    assert first.get_json()[0]['coach_description'] == 'старое описание'
+
+    # Правка мимо этого процесса: справочник о ней не знает, но версия данных тренеров изменилась
+    with pg.app_context():
+        app_module.db.session.execute(app_module.db.text(
+            "UPDATE coaches SET description = 'новое описание' WHERE id = :id"), {'id': coach_id})
+        app_module.db.session.commit()
+    response = pg_client.get('/available_events?telegram_id=1', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.get_json()[0]['coach_description'] == 'новое описание'
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+from events_snapshot import EventsSnapshot, SnapshotEvent
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+def event(event_id, hours, office_id=1):
+    return SnapshotEvent(event_id, NOW + timedelta(hours=hours), office_id, f'Офис {office_id}', 10, None)
+
+
+class Loader:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def __call__(self, per_office):
+        self.calls += 1
+        return self.rows
+
+
+def ids(result):
+    return [event.id for event, _ in result]
+
+
+def test_upcoming_orders_and_limits():
+    loader = Loader([(event(3, 3), 0), (event(1, 1), 2), (event(2, 2), 5), (event(4, -1), 0)])
+    snapshot = EventsSnapshot(ttl=60, per_office=100)
+    result = snapshot.upcoming(loader, NOW, limit=2)
+    assert ids(result) == [1, 2]
+    assert result[1][1] == 5
+    assert loader.calls == 1
+
+
+def test_upcoming_exclude_office_and_pages():
+    loader = Loader([(event(1, 1), 0), (event(2, 2, office_id=2), 0), (event(3, 3), 0), (event(4, 4), 0)])
+    snapshot = EventsSnapshot(ttl=60, per_office=100)
+    assert ids(snapshot.upcoming(loader, NOW, limit=10, office_id=1, exclude={3})) == [1, 4]
+    after = (NOW + timedelta(hours=2), 2)
+    assert ids(snapshot.upcoming(loader, NOW, limit=10, after=after)) == [3, 4]
+    before = (NOW + timedelta(hours=4), 4)
+    assert ids(snapshot.upcoming(loader, NOW, limit=2, before=before)) == [2, 3]
+
+
+def test_upcoming_returns_none_past_loaded_events():
+    # per_office=2: у офиса загружено ровно 2 события, за ними в базе могут быть ещё
+    loader = Loader([(event(1, 1), 0), (event(2, 2), 0)])
+    snapshot = EventsSnapshot(ttl=60, per_office=2)
+    assert ids(snapshot.upcoming(loader, NOW, limit=2)) == [1, 2]
+    assert snapshot.upcoming(loader, NOW, limit=3) is None
+    assert snapshot.upcoming(loader, NOW, limit=1, after=(NOW + timedelta(hours=2), 2)) is None
+    stats = snapshot.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+
+def test_ttl_zero_disables_snapshot():
+    loader = Loader([(event(1, 1), 0)])
+    assert EventsSnapshot(ttl=0).upcoming(loader, NOW, limit=1) is None
+    assert loader.calls == 0
+
+
+def test_reloads_only_for_other_version():
+    loader = Loader([(event(1, 1), 3)])
+    snapshot = EventsSnapshot(ttl=60)
+    snapshot.upcoming(loader, NOW, limit=1, version='1:10/1:1')
+    snapshot.upcoming(loader, NOW, limit=1, version='1:10/1:1')
+    assert loader.calls == 1
+    loader.rows = [(event(1, 1), 4)]
+    result = snapshot.upcoming(loader, NOW, limit=1, version='1:11/1:1')
+    assert result[0][1] == 4 and loader.calls == 2
+    assert snapshot.stats()['version'] == '1:11/1:1'
+
+
+def test_ttl_bounds_age(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('events_snapshot.time.monotonic', lambda: now[0])
+    loader = Loader([(event(1, 1), 0)])
+    snapshot = EventsSnapshot(ttl=10)
+    snapshot.upcoming(loader, NOW, limit=1, version='v')
+    now[0] += 9
+    snapshot.upcoming(loader, NOW, limit=1, version='v')
+    now[0] += 2
+    snapshot.upcoming(loader, NOW, limit=1, version='v')
+    assert loader.calls == 2
+
+
+def test_invalidate_reloads():
+    loader = Loader([(event(1, 1), 0)])
+    snapshot = EventsSnapshot(ttl=60)
+    snapshot.upcoming(loader, NOW, limit=1)
+    snapshot.invalidate()
+    snapshot.upcoming(loader, NOW, limit=1)
+    assert loader.calls == 2
@@ -0,0 +1,53 @@
+from datetime import time
+
+import app as app_module
+
+
+def refresh(client, event_id, telegram_id, action='register'):
+    return client.post('/event_registrations/refresh',
+                       json={'event_id': event_id, 'telegram_id': telegram_id, 'action': action})
+
+
+def test_register_returns_updated_lists(pg, pg_client, factory):
+    office_id = factory.office()
+    event_ids = [factory.event(office_id, at=time(8 + i)) for i in range(10)]
+    factory.user(1, office=office_id)
+
+    response = refresh(pg_client, event_ids[0], 1)
+    assert response.status_code == 201
+    body = response.get_json()
+    # Список доступных уже без только что занятого события: 8 на странице и курсор следующей
+    assert [event['event_id'] for event in body['available_events']] == event_ids[1:9]
+    assert body['available_next_cursor'] is not None
+    assert [event['event_id'] for event in body['user_events']] == [event_ids[0]]
+
+    following = pg_client.get(f"/available_events?telegram_id=1&after={body['available_next_cursor']}")
+    assert [event['event_id'] for event in following.get_json()] == event_ids[9:]
+
+
+def test_unregister_returns_updated_lists(pg, pg_client, factory):
+    office_id = factory.office()
+    event_id = factory.event(office_id)
+    factory.user(1, office=office_id)
+    refresh(pg_client, event_id, 1)
+
+    response = refresh(pg_client, event_id, 1, action='unregister')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [event['event_id'] for event in body['available_events']] == [event_id]
+    assert body['available_events'][0]['registered_participants'] == 0
+    assert body['user_events'] == []
+
+
+def test_errors_roll_back(pg, pg_client, factory):
+    event_id = factory.event(factory.office(), max_participants=1)
+    factory.user(1)
+    factory.user(2)
+
+    assert refresh(pg_client, event_id, 1).status_code == 201
+    assert refresh(pg_client, event_id, 2).status_code == 400
+    assert refresh(pg_client, event_id, 2, action='unregister').status_code == 404
+    assert refresh(pg_client, event_id, 99).status_code == 404
+    assert refresh(pg_client, event_id, 1, action='cancel').status_code == 400
+    with pg.app_context():
+        assert app_module.db.session.get(app_module.Event, event_id).registered_participants == 1
@@ -0,0 +1,42 @@
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, 'API_KEY', 'test-key')
+    return app_module.create_app(components=[]).test_client()
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/event_registrations', {}),
+    ('/event_registrations/delete', {}),
+    ('/event_registrations/refresh', {'action': 'register'}),
+    ('/event_registrations/refresh', {'action': 'unregister'}),
+])
+@pytest.mark.parametrize('event_id', ['abc', '5.0', '', 5.0, None, True, [5]])
+def test_non_numeric_event_id_rejected(client, path, body, event_id):
+    # Запрос отклоняется до обращения к базе, поэтому база не нужна
+    response = client.post(path, json={**body, 'event_id': event_id, 'telegram_id': 1},
+                           headers={'X-API-KEY': 'test-key'})
+    assert response.status_code == 400
+    assert 'ID события' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('value, expected', [
+    (5, 5), ('5', 5), (' 7 ', 7), ('-1', -1),
+    ('abc', None), ('5.0', None), (5.5, None), (True, None), (None, None), ({}, None),
+])
+def test_parse_event_id(value, expected):
+    # Строковые id присылали прежние версии бота, они должны приниматься
+    assert app_module.parse_event_id(value) == expected
+
+
+def test_note_seat_changes_normalizes_keys():
+    flask_app = app_module.create_app(components=[])
+    with flask_app.app_context():
+        session = app_module.db.session()
+        app_module.note_seat_changes({'7': 1, 8: -1}, session)
+        app_module.note_seat_changes({7: 1}, session)
+        assert session.info.pop('seat_deltas') == {7: 2, 8: -1}
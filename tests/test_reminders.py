@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from outbox import OutboxStore
+from reminders import ReminderPump
+
+
+class ApiResponse:
+    def __init__(self, response):
+        self.response = response
+
+    def raise_for_status(self):
+        assert self.response.status_code < 400, self.response.get_json()
+
+    def json(self):
+        return self.response.get_json()
+
+
+class Api:
+    """Клиент API бота поверх тестового клиента Flask."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, path, params=None):
+        return ApiResponse(self.client.get(path, query_string=params))
+
+    def post(self, path, json=None):
+        return ApiResponse(self.client.post(path, json=json))
+
+
+@pytest.fixture
+def outbox():
+    return OutboxStore(':memory:')
+
+
+def add_due_reminder(flask_app, event_id, user_id, due_at):
+    """Запись и уже наступившее напоминание мимо API (например, пользователь из админки)."""
+    with flask_app.app_context():
+        registration = app_module.EventRegistration(event_id=event_id, user_id=user_id)
+        app_module.db.session.add(registration)
+        app_module.db.session.commit()
+        # Напоминание (если время ещё не прошло) ставит сама запись; сдвигаем его в прошлое
+        app_module.db.session.execute(app_module.db.text(
+            'INSERT INTO reminders (registration_id, due_at) VALUES (:id, :due_at) '
+            'ON CONFLICT (registration_id) DO UPDATE SET due_at = EXCLUDED.due_at'),
+            {'due_at': due_at, 'id': registration.id})
+        app_module.db.session.commit()
+
+
+def reminder_count(flask_app):
+    with flask_app.app_context():
+        return app_module.Reminder.query.count()
+
+
+def pending_chats(outbox):
+    return [chat_id for chat_id, in outbox._db.execute('SELECT chat_id FROM messages ORDER BY id')]
+
+
+def test_user_without_telegram_id_does_not_block_queue(pg, pg_client, factory, outbox):
+    event_id = factory.event(factory.office())
+    now = datetime.now()
+    # Самое раннее напоминание - пользователю без telegram_id
+    add_due_reminder(pg, event_id, factory.user(None), now - timedelta(minutes=2))
+    add_due_reminder(pg, event_id, factory.user(42), now - timedelta(minutes=1))
+
+    pump = ReminderPump(Api(pg_client), outbox, batch_size=10)
+    assert pump.drain() == 1
+    assert pending_chats(outbox) == [42]
+    assert (pump.unreachable, pump.expired) == (1, 0)
+    assert reminder_count(pg) == 0
+
+
+def reminder_due_at(flask_app, event_id):
+    with flask_app.app_context():
+        return [due_at for due_at, in app_module.db.session.query(app_module.Reminder.due_at).join(
+            app_module.EventRegistration).filter(app_module.EventRegistration.event_id == event_id)]
+
+
+def starts_at(flask_app, event_id):
+    with flask_app.app_context():
+        return app_module.db.session.get(app_module.Event, event_id).starts_at
+
+
+def test_registration_schedules_and_cancel_removes(pg, pg_client, factory):
+    event_id = factory.event(factory.office())
+    factory.user(1)
+
+    pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': 1})
+    assert reminder_due_at(pg, event_id) == [starts_at(pg, event_id) - app_module.REMINDER_LEAD]
+    pg_client.post('/event_registrations/delete', json={'event_id': event_id, 'telegram_id': 1})
+    assert reminder_due_at(pg, event_id) == []
+
+
+def test_late_registration_gets_no_reminder(pg, pg_client, factory):
+    soon = datetime.now() + app_module.REMINDER_LEAD / 2
+    event_id = factory.event(factory.office(), days=(soon.date() - datetime.now().date()).days,
+                             at=soon.time().replace(microsecond=0))
+    factory.user(1)
+
+    assert pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': 1}).status_code == 201
+    assert reminder_due_at(pg, event_id) == []
+
+
+def test_rescheduled_event_moves_reminder(pg, pg_client, factory):
+    event_id = factory.event(factory.office())
+    factory.user(1)
+    pg_client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': 1})
+
+    with pg.app_context():
+        event = app_module.db.session.get(app_module.Event, event_id)
+        event.date += timedelta(days=1)
+        app_module.db.session.commit()
+    assert reminder_due_at(pg, event_id) == [starts_at(pg, event_id) - app_module.REMINDER_LEAD]
+
+
+def test_due_and_ack(pg, pg_client, factory):
+    event_id = factory.event(factory.office())
+    due_at = datetime.now().replace(microsecond=0) - timedelta(minutes=1)
+    add_due_reminder(pg, event_id, factory.user(1), due_at)
+    factory.event(factory.office('Другой'))  # без записей - напоминаний нет
+
+    due = pg_client.get('/reminders/due').get_json()
+    assert [(r['telegram_id'], r['event_id'], r['due_at']) for r in due] == [(1, event_id, due_at.isoformat())]
+    # Напоминание, перенесённое после выдачи (другой due_at), подтверждение не удаляет
+    stale = {'registration_id': due[0]['registration_id'], 'due_at': (due_at - timedelta(hours=1)).isoformat()}
+    assert pg_client.post('/reminders/ack', json={'items': [stale]}).get_json() == {'deleted': 0}
+    assert pg_client.post('/reminders/ack', json={'items': [
+        {'registration_id': due[0]['registration_id'], 'due_at': due[0]['due_at']}]}).get_json() == {'deleted': 1}
+    assert pg_client.get('/reminders/due').get_json() == []
+    assert pg_client.post('/reminders/ack', json={'items': [{}]}).status_code == 400
+
+
+def test_drain_skips_started_events_and_survives_lost_ack(pg, pg_client, factory, outbox, monkeypatch):
+    office_id = factory.office()
+    started_id = factory.event(office_id, days=-1)
+    upcoming_id = factory.event(office_id)
+    now = datetime.now()
+    add_due_reminder(pg, started_id, factory.user(1), now - timedelta(days=1))
+    add_due_reminder(pg, upcoming_id, factory.user(2), now - timedelta(minutes=1))
+
+    api = Api(pg_client)
+    pump = ReminderPump(api, outbox, batch_size=10)
+    post = api.post
+
+    def lost_ack(path, json=None):
+        raise ConnectionError(path)
+
+    # Бот упал между постановкой в очередь и подтверждением
+    monkeypatch.setattr(api, 'post', lost_ack)
+    with pytest.raises(ConnectionError):
+        pump.drain()
+    monkeypatch.setattr(api, 'post', post)
+
+    assert pump.drain() == 0  # то же напоминание второй раз в очередь не встаёт
+    assert pending_chats(outbox) == [2]
+    assert pump.expired == 1
+    assert reminder_count(pg) == 0
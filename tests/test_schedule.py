@@ -0,0 +1,87 @@
+from datetime import date, time, timedelta
+
+import pytest
+
+import app as app_module
+import schedule
+
+
+def test_format_weekdays():
+    assert schedule.format_weekdays([4, 2]) == 'Вт/Чт'
+    assert schedule.format_weekdays(None) == ''
+
+
+@pytest.fixture
+def template(pg):
+    """Фабрика шаблонов; возвращает id."""
+    def make(office_id, coach_id, weekdays, at=time(12, 30), starts_on=None, ends_on=None):
+        with pg.app_context():
+            row = app_module.ScheduleTemplate(office_id=office_id, coach_id=coach_id, weekdays=weekdays, time=at,
+                                              max_participants=20, starts_on=starts_on or date.today(),
+                                              ends_on=ends_on)
+            app_module.db.session.add(row)
+            app_module.db.session.commit()
+            return row.id
+    return make
+
+
+def materialize(flask_app, date_from, date_to, template_ids=None):
+    with flask_app.app_context():
+        created = app_module.materialize_schedule(date_from, date_to, template_ids)
+        app_module.db.session.commit()
+        return created
+
+
+def events(flask_app):
+    with flask_app.app_context():
+        return app_module.db.session.query(
+            app_module.Event.office_id, app_module.Event.date, app_module.Event.time, app_module.Event.coach
+        ).order_by(app_module.Event.date, app_module.Event.office_id).all()
+
+
+def test_materialize_is_idempotent(pg, factory, template):
+    office_id = factory.office()
+    coach_id = factory.coach('Анна')
+    template(office_id, coach_id, [1, 3])
+    date_from = date.today() + timedelta(days=1)
+    date_to = date_from + timedelta(days=13)
+
+    assert materialize(pg, date_from, date_to) == 4
+    created = events(pg)
+    assert sorted(day.isoweekday() for _, day, _, _ in created) == [1, 1, 3, 3]
+    assert {(office, at, coach) for office, _, at, coach in created} == {(office_id, time(12, 30), 'Анна')}
+    assert materialize(pg, date_from, date_to) == 0
+    # Продление горизонта добавляет только новые дни
+    assert materialize(pg, date_from, date_to + timedelta(days=7)) == 2
+    assert len(events(pg)) == 6
+
+
+def test_materialize_skips_taken_slots_past_times_and_ended_templates(pg, factory, template):
+    office_id = factory.office()
+    coach_id = factory.coach()
+    today = date.today()
+    every_day = [1, 2, 3, 4, 5, 6, 7]
+    # Сегодняшнее занятие в 00:00 уже прошло
+    template(office_id, coach_id, every_day, at=time(0, 0), ends_on=today + timedelta(days=2))
+    # Слот уже занят событием, созданным вручную
+    factory.event(office_id, days=1, at=time(0, 0))
+
+    assert materialize(pg, today, today + timedelta(days=6)) == 1
+    assert [day for _, day, _, _ in events(pg)] == [today + timedelta(days=1), today + timedelta(days=2)]
+
+
+def test_materialize_selected_templates_and_rollup(pg, factory, template):
+    office_id = factory.office()
+    coach_id = factory.coach('Анна')
+    first = template(office_id, coach_id, [1, 2, 3, 4, 5, 6, 7], at=time(9))
+    template(office_id, coach_id, [1, 2, 3, 4, 5, 6, 7], at=time(19))
+    day = date.today() + timedelta(days=1)
+
+    assert materialize(pg, day, day, [first]) == 1
+    with pg.app_context():
+        row = app_module.db.session.get(app_module.AttendanceDaily, (office_id, 'Анна', day))
+        assert (row.events, row.capacity) == (1, 20)
+    assert materialize(pg, day, day) == 1
+    with pg.app_context():
+        row = app_module.db.session.get(app_module.AttendanceDaily, (office_id, 'Анна', day))
+        assert (row.events, row.capacity) == (2, 40)
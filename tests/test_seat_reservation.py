@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import app as app_module
+
+
+def register(client, event_id, telegram_id):
+    return client.post('/event_registrations', json={'event_id': event_id, 'telegram_id': telegram_id})
+
+
+def unregister(client, event_id, telegram_id):
+    return client.post('/event_registrations/delete', json={'event_id': event_id, 'telegram_id': telegram_id})
+
+
+def seats(flask_app, event_id):
+    """(счётчик в events, число записей)."""
+    with flask_app.app_context():
+        counter = app_module.db.session.get(app_module.Event, event_id).registered_participants
+        rows = app_module.EventRegistration.query.filter_by(event_id=event_id).count()
+        return counter, rows
+
+
+def test_register_and_cancel(pg, pg_client, factory):
+    event_id = factory.event(factory.office())
+    factory.user(1)
+
+    assert register(pg_client, event_id, 1).status_code == 201
+    assert seats(pg, event_id) == (1, 1)
+    assert unregister(pg_client, event_id, 1).status_code == 200
+    assert seats(pg, event_id) == (0, 0)
+    assert unregister(pg_client, event_id, 1).status_code == 404
+    assert seats(pg, event_id) == (0, 0)
+
+
+def test_numeric_string_event_id(pg, pg_client, factory):
+    event_id = factory.event(factory.office())
+    factory.user(1)
+
+    assert register(pg_client, str(event_id), 1).status_code == 201
+    assert seats(pg, event_id) == (1, 1)
+
+
+def test_repeat_registration_keeps_counter(pg, pg_client, factory):
+    event_id = factory.event(factory.office())
+    factory.user(1)
+
+    register(pg_client, event_id, 1)
+    response = register(pg_client, event_id, 1)
+    assert response.status_code == 400
+    assert 'уже зарегистрировался' in response.get_json()['error']
+    assert seats(pg, event_id) == (1, 1)
+
+
+def test_full_past_and_missing_events(pg, pg_client, factory):
+    office_id = factory.office()
+    full_id = factory.event(office_id, max_participants=1)
+    past_id = factory.event(office_id, days=-1)
+    factory.user(1)
+    factory.user(2)
+
+    assert register(pg_client, full_id, 1).status_code == 201
+    response = register(pg_client, full_id, 2)
+    assert response.status_code == 400 and 'места уже заняты' in response.get_json()['error']
+    response = register(pg_client, past_id, 2)
+    assert response.status_code == 400 and 'уже закончилось' in response.get_json()['error']
+    assert register(pg_client, past_id + 100, 2).status_code == 404
+    assert seats(pg, full_id) == (1, 1)
+    assert seats(pg, past_id) == (0, 0)
+
+
+def test_concurrent_registrations_do_not_oversell(pg, factory):
+    event_id = factory.event(factory.office(), max_participants=5)
+    clients = 40
+    for telegram_id in range(clients):
+        factory.user(telegram_id)
+
+    def attempt(telegram_id):
+        client = pg.test_client()
+        client.environ_base['HTTP_X_API_KEY'] = 'test-key'
+        return register(client, event_id, telegram_id).status_code
+
+    # Не больше потоков, чем соединений в пуле (WEB_THREADS, по умолчанию 8)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(attempt, range(clients)))
+
+    assert statuses.count(201) == 5
+    assert statuses.count(400) == clients - 5
+    assert seats(pg, event_id) == (5, 5)
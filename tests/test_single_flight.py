@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, count):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    release = threading.Event()
+    flight = SingleFlight(timeout=5)
+
+    def fn():
+        release.wait(5)
+        return 'готово'
+
+    threads, results, errors = run_concurrently(flight, 'key', fn, 5)
+    # Ждём, пока все пятеро войдут в do: один выполняет fn, остальные ждут его
+    while flight.stats()['calls'] < 5:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['готово'] * 5 and errors == []
+    stats = flight.stats()
+    assert (stats['executions'], stats['shared'], stats['in_flight']) == (1, 4, 0)
+
+
+def test_error_is_shared():
+    release = threading.Event()
+    flight = SingleFlight(timeout=5)
+
+    def fn():
+        release.wait(5)
+        raise RuntimeError('нет базы')
+
+    threads, results, errors = run_concurrently(flight, 'key', fn, 3)
+    while flight.stats()['calls'] < 3:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [] and len(errors) == 3
+    assert flight.stats()['executions'] == 1
+
+
+def test_sequential_calls_not_cached():
+    flight = SingleFlight()
+    counter = iter(range(10))
+    assert flight.do('key', lambda: next(counter)) == 0
+    assert flight.do('key', lambda: next(counter)) == 1
+
+
+def test_waiter_runs_fn_itself_after_timeout():
+    release = threading.Event()
+    flight = SingleFlight(timeout=5)
+    leader = threading.Thread(target=flight.do, args=('key', lambda: release.wait(5)))
+    leader.start()
+    while flight.stats()['in_flight'] == 0:
+        pass
+    assert flight.do('key', lambda: 'сам', timeout=0.01) == 'сам'
+    release.set()
+    leader.join()
+    assert flight.stats()['timeouts'] == 1
+
+
+def test_zero_timeout_disables_coalescing():
+    flight = SingleFlight(timeout=0)
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: int('x'))
+    assert flight.stats()['errors'] == 1
@@ -0,0 +1,37 @@
+import pytest
+from flask import Blueprint, Flask
+
+from swagger_spec import spec_drift
+
+
+def make_app():
+    app = Flask(__name__)
+    bp = Blueprint('api', __name__)
+    bp.add_url_rule('/users/<int:telegram_id>', 'get_user', lambda telegram_id: '', methods=['GET', 'DELETE'])
+    bp.add_url_rule('/events', 'events', lambda: '')
+    app.register_blueprint(bp)
+    app.add_url_rule('/health', 'health', lambda: '')  # чужие маршруты не проверяются
+    return app
+
+
+def test_no_drift():
+    spec = {'paths': {
+        '/users/{telegram_id}': {'parameters': [], 'get': {}, 'delete': {}},
+        '/events': {'get': {}},
+    }}
+    assert spec_drift(spec, make_app(), 'api') == []
+
+
+def test_reports_both_directions():
+    spec = {'paths': {'/users/{telegram_id}': {'get': {}}, '/events': {'get': {}, 'post': {}}}}
+    assert spec_drift(spec, make_app(), 'api') == [
+        'нет в спецификации: DELETE /users/{telegram_id}',
+        'нет маршрута: POST /events',
+    ]
+
+
+def test_swagger_matches_api_routes():
+    pytest.importorskip('flasgger')
+    from app import create_app
+    # init_swagger падает при расхождении swagger.py с маршрутами
+    create_app(components=['swagger'])
@@ -0,0 +1,44 @@
+import pytest
+
+from outbox import TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_starts_full_and_refills_at_rate():
+    clock = Clock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+    assert bucket.idle()
+    for _ in range(3):
+        assert bucket.wait_time() == 0
+        bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.5)
+    clock.now += 0.25
+    assert bucket.wait_time() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert bucket.wait_time() == 0
+    assert not bucket.idle()
+
+
+def test_capacity_caps_tokens():
+    clock = Clock()
+    bucket = TokenBucket(rate=10, capacity=1, clock=clock)
+    clock.now += 100
+    bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.1)
+
+
+def test_debt_after_take_without_token():
+    clock = Clock()
+    bucket = TokenBucket(rate=1, clock=clock)
+    bucket.take()
+    bucket.take()  # токена нет - следующий появится через 2 секунды
+    assert bucket.wait_time() == pytest.approx(2)
+    clock.now += 3
+    assert bucket.idle()
@@ -0,0 +1,72 @@
+from user_cache import UserCache, UserRef
+
+
+class Loader:
+    def __init__(self, known):
+        self.known = known
+        self.calls = []
+
+    def __call__(self, telegram_id):
+        self.calls.append(telegram_id)
+        return self.known.get(telegram_id)
+
+
+def test_hit_after_miss_and_key_normalized():
+    loader = Loader({1: UserRef(10, 'Офис', 'user')})
+    cache = UserCache()
+    assert cache.get(1, loader) == UserRef(10, 'Офис', 'user')
+    assert cache.get('1', loader) == UserRef(10, 'Офис', 'user')
+    assert loader.calls == [1]
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+
+
+def test_missing_user_not_cached():
+    loader = Loader({})
+    cache = UserCache()
+    assert cache.get(5, loader) is None
+    assert cache.get(5, loader) is None
+    assert loader.calls == [5, 5]
+
+
+def test_bad_key_skips_loader():
+    loader = Loader({})
+    assert UserCache().get('abc', loader) is None
+    assert UserCache().get(None, loader) is None
+    assert loader.calls == []
+
+
+def test_lru_eviction():
+    loader = Loader({i: UserRef(i, None, 'user') for i in range(3)})
+    cache = UserCache(maxsize=2)
+    cache.get(0, loader)
+    cache.get(1, loader)
+    cache.get(0, loader)  # 0 становится самым свежим
+    cache.get(2, loader)  # вытесняет 1
+    loader.calls.clear()
+    cache.get(0, loader)
+    cache.get(1, loader)
+    assert loader.calls == [1]
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('user_cache.time.monotonic', lambda: now[0])
+    loader = Loader({1: UserRef(1, None, 'user')})
+    cache = UserCache(ttl=10)
+    cache.get(1, loader)
+    now[0] += 9
+    cache.get(1, loader)
+    now[0] += 2
+    cache.get(1, loader)
+    assert loader.calls == [1, 1]
+
+
+def test_invalidate_and_clear():
+    loader = Loader({1: UserRef(1, None, 'user'), 2: UserRef(2, None, 'user')})
+    cache = UserCache()
+    cache.get(1, loader)
+    cache.get(2, loader)
+    cache.invalidate('1')
+    assert cache.stats()['size'] == 1
+    cache.clear()
+    assert cache.stats()['size'] == 0
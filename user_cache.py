@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Всё, что горячим эндпоинтам нужно знать о пользователе, без тяжёлого поля info
+UserRef = namedtuple('UserRef', ['id', 'office', 'role'])
+
+
+class UserCache:
+    """LRU-кэш telegram_id -> UserRef с ограниченным временем жизни записи.
+
+    Кэш живёт в памяти процесса: изменения, сделанные другим воркером, становятся видны
+    не позже чем через ttl секунд. Отсутствующих пользователей не кэшируем, чтобы
+    только что зарегистрированный пользователь сразу находился.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # telegram_id -> (expires_at, UserRef)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(telegram_id):
+        try:
+            return int(telegram_id)
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, telegram_id, loader):
+        """Возвращает UserRef из кэша или из loader(telegram_id); None, если пользователя нет."""
+        key = self._key(telegram_id)
+        if key is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Загружаем без блокировки, чтобы медленный запрос не останавливал остальные потоки
+        ref = loader(key)
+        if ref is not None:
+            self.put(key, ref)
+        return ref
+
+    def put(self, telegram_id, ref):
+        key = self._key(telegram_id)
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, ref)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id):
+        key = self._key(telegram_id)
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }